@@ -0,0 +1,47 @@
+"""Benchmarks for pylox.
+
+Run one from the repo root, e.g.::
+
+    $ python -m benchmarks.bench_scanner
+"""
+import time
+import glob
+import contextlib
+
+def best_of(func, repeat=3):
+  """run func repeat times, return (best seconds, last result)
+  """
+  best = None
+  result = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best, result
+
+def example_source(copies=1):
+  """concatenate the interpreter example scripts `copies` times
+  """
+  sources = []
+  for path in sorted(glob.glob("tests/data/interpreter/*.lox")):
+    with open(path) as f:
+      sources.append(f.read())
+  return "\n".join(sources) * copies
+
+@contextlib.contextmanager
+def counting_frames():
+  """count the `Frame`s allocated in the block, in the list it yields
+  """
+  from pylox.environment import Frame
+  counts = [0]
+  init = Frame.__init__
+  def counted(self, *args):
+    counts[0] += 1
+    init(self, *args)
+  Frame.__init__ = counted
+  try:
+    yield counts
+  finally:
+    Frame.__init__ = init
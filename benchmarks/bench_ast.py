@@ -0,0 +1,49 @@
+"""time and memory to build a 1M node ast, nodes built through Signature.bind
+and setattr as before vs the generated __slots__ classes.
+"""
+import sys
+import tracemalloc
+from inspect import Parameter, Signature
+
+from benchmarks import best_of
+from pylox.expr import Binary, Literal
+from pylox.token import Token, TokenType
+
+class BoundNode:
+  """the previous node construction
+  """
+  __signature__ = Signature([])
+
+  def __init__(self, *args, **kwargs):
+    bound = self.__signature__.bind(*args, **kwargs)
+    for name, val in bound.arguments.items():
+      setattr(self, name, val)
+
+def bound_class(*names):
+  return type("Bound", (BoundNode,), {"__signature__": Signature(
+    Parameter(name, Parameter.POSITIONAL_OR_KEYWORD) for name in names)})
+
+BoundBinary = bound_class("left", "operator", "right")
+BoundLiteral = bound_class("value")
+
+def build(binary, literal, nodes):
+  """a left leaning `1 + 1 + ...` chain of `nodes` nodes
+  """
+  plus = Token(TokenType.PLUS, "+", None, 1)
+  expr = literal(1.0)
+  for _ in range(nodes // 2):
+    expr = binary(expr, plus, literal(1.0))
+  return expr
+
+def main(nodes=1000000):
+  for name, binary, literal in (("bind", BoundBinary, BoundLiteral), ("slots", Binary, Literal)):
+    seconds, _ = best_of(lambda: build(binary, literal, nodes), repeat=1)
+    tracemalloc.start()
+    tree = build(binary, literal, nodes)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tree
+    print(f"{name:>5}: {seconds:5.2f}s, {size / 1e6:6.1f} MB, {size / nodes:5.1f} bytes/node")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
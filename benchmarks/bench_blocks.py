@@ -0,0 +1,58 @@
+"""loops whose bodies are blocks: frames allocated and time per iteration, on
+both evaluators. frames are counted by wrapping `Frame.__init__`.
+"""
+import io
+import sys
+import contextlib
+
+from benchmarks import best_of, counting_frames
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.flat_ast import FlatInterpreter
+
+cases = {
+  "while": """
+    var i = 0;
+    while (i < %d) { i = i + 1; }
+  """,
+  "for": """
+    var sum = 0;
+    for (var i = 0; i < %d; i = i + 1) { sum = sum + i; }
+  """,
+  "nested": """
+    var sum = 0;
+    for (var i = 0; i < %d; i = i + 1) {
+      var j = i;
+      { var k = j; { sum = sum + k; } }
+    }
+  """,
+}
+
+source = """
+fun run() {
+  %s
+}
+run();
+"""
+
+def run(engine, code):
+  interpreter = engine()
+  stmts = Parser(Scanner(source % code).scan_tokens()).parse()
+  Resolver().resolve(stmts)
+  with contextlib.redirect_stdout(io.StringIO()):
+    interpreter.interprete(stmts)
+
+def main(iterations=20000):
+  for name, engine in (("tree", Interpreter), ("flat", FlatInterpreter)):
+    for case, code in cases.items():
+      code = code % iterations
+      with counting_frames() as counts:
+        run(engine, code)
+      seconds, _ = best_of(lambda: run(engine, code), repeat=5)
+      print(f"{name} {case:>6}: {counts[0] / iterations:5.2f} frames/iteration, "
+            f"{seconds * 1e6 / iterations:6.2f}us/iteration")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
@@ -0,0 +1,27 @@
+"""parse and resolve time of deeply nested code, which should grow linearly
+with the nesting depth.
+"""
+import sys
+
+from benchmarks import best_of
+from pylox.scanner import RegexScanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+
+def nested_source(depth):
+  blocks = "{ var a = 1; if (a) " * depth + "print a;" + "}" * depth
+  chain = "print " + " + ".join(["a"] * depth) + ";"
+  return blocks + chain
+
+def main(max_depth=80000):
+  depth = max_depth // 8
+  while depth <= max_depth:
+    tokens = RegexScanner(nested_source(depth)).scan_tokens()
+    parse_seconds, stmts = best_of(lambda: Parser(tokens).parse(), repeat=1)
+    resolve_seconds, _ = best_of(lambda: Resolver().resolve(stmts), repeat=1)
+    print(f"depth {depth:>7,}: parse {parse_seconds:6.2f}s, resolve {resolve_seconds:6.2f}s, "
+          f"{(parse_seconds + resolve_seconds) / depth * 1e6:5.1f} us per level")
+    depth *= 2
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
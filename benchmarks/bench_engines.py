@@ -0,0 +1,49 @@
+"""the evaluators on a recursive and a loop heavy program, to pick one for a
+workload.
+"""
+import io
+import sys
+import contextlib
+
+from benchmarks import best_of
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.cli import engines
+
+programs = {
+  "fib": """
+    fun fib(n) {
+      if (n < 2) return n;
+      return fib(n - 2) + fib(n - 1);
+    }
+    print fib(%d);
+  """,
+  "loop": """
+    fun loop(n) {
+      var sum = 0;
+      for (var i = 0; i < n; i = i + 1) {
+        if (i / 2 > sum) sum = sum + 1; else sum = sum - 1;
+      }
+      return sum;
+    }
+    print loop(%d * 2000);
+  """,
+}
+
+def run(engine, stmts):
+  with contextlib.redirect_stdout(io.StringIO()):
+    engine().interprete(stmts)
+
+def main(n=18):
+  for program, source in programs.items():
+    stmts = Parser(Scanner(source % n).scan_tokens()).parse()
+    Resolver().resolve(stmts)
+    baseline = None
+    for name, engine in engines.items():
+      seconds, _ = best_of(lambda: run(engine, stmts), repeat=3)
+      baseline = baseline or seconds
+      print(f"{program:>4} {name:>7}: {seconds:6.3f}s {baseline / seconds:5.1f}x")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
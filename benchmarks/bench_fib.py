@@ -0,0 +1,30 @@
+"""recursive fib(n) on the tree-walking interpreter.
+"""
+import sys
+
+from benchmarks import best_of
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+
+source = """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+print fib(%d);
+"""
+
+def run(n):
+  interpreter = Interpreter()
+  stmts = Parser(Scanner(source % n).scan_tokens()).parse()
+  Resolver().resolve(stmts)
+  interpreter.interprete(stmts)
+
+def main(n=25):
+  seconds, _ = best_of(lambda: run(n), repeat=1)
+  print(f"fib({n}): {seconds:.2f}s")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
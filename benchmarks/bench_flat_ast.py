@@ -0,0 +1,54 @@
+"""memory of a large program as resolved object ast vs FlatAst,
+and fib(20) time on both evaluators.
+"""
+import io
+import sys
+import tracemalloc
+import contextlib
+
+from benchmarks import best_of, example_source
+from benchmarks.bench_fib import source as fib_source
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.flat_ast import FlatInterpreter
+
+def compile(interpreter, source):
+  tokens = Scanner(source).scan_tokens()
+  stmts = Parser(tokens).parse()
+  Resolver().resolve(stmts)
+  return stmts
+
+def measure(load):
+  """bytes allocated by what load returns
+  """
+  tracemalloc.start()
+  result = load()
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return size, result
+
+def main(copies=100):
+  source = example_source(copies)
+  size, _ = measure(lambda: compile(Interpreter(), source))
+  flat = FlatInterpreter()
+  flat_stmts = compile(flat, source)
+  flat_size, program = measure(lambda: flat.load(flat_stmts))
+  del flat_stmts
+  nodes = len(flat.ast)
+  print(f"{nodes} nodes")
+  # the object tree is measured with its tokens and resolved depths
+  print(f"  tree: {size / 1e6:6.1f} MB, {size / nodes:5.1f} bytes/node (with tokens)")
+  print(f"  flat: {flat_size / 1e6:6.1f} MB, {flat_size / nodes:5.1f} bytes/node")
+  for name, engine in (("tree", Interpreter), ("flat", FlatInterpreter)):
+    def run():
+      interpreter = engine()
+      stmts = compile(interpreter, fib_source % 20)
+      with contextlib.redirect_stdout(io.StringIO()):
+        interpreter.interprete(stmts)
+    seconds, _ = best_of(run, repeat=1)
+    print(f"  fib(20) {name}: {seconds:.2f}s")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""recursive calls: frames allocated per call, bytes per level of recursion
+measured with tracemalloc, and time per call, on both evaluators.
+"""
+import io
+import contextlib
+import tracemalloc
+
+from benchmarks import best_of, counting_frames
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.flat_ast import FlatInterpreter
+
+cases = {
+  # (source, calls made, deepest recursion)
+  "fib": ("""
+    fun fib(n) {
+      if (n < 2) return n;
+      return fib(n - 2) + fib(n - 1);
+    }
+    fib(18);
+  """, 8361, 18),
+  "method": ("""
+    class Tree {
+      init(depth) { this.depth = depth; }
+      walk(n) {
+        if (n == 0) return 0;
+        var left = this.walk(n - 1);
+        return left + 1;
+      }
+    }
+    var tree = Tree(0);
+    for (var i = 0; i < 100; i = i + 1) tree.walk(80);
+  """, 8101, 81),
+}
+
+def run(engine, stmts):
+  interpreter = engine()
+  with contextlib.redirect_stdout(io.StringIO()):
+    interpreter.interprete(stmts)
+
+def main():
+  for name, engine in (("tree", Interpreter), ("flat", FlatInterpreter)):
+    for case, (source, calls, depth) in cases.items():
+      stmts = Parser(Scanner(source).scan_tokens()).parse()
+      Resolver().resolve(stmts)
+      with counting_frames() as counts:
+        run(engine, stmts)
+      tracemalloc.start()
+      try:
+        run(engine, stmts)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        tracemalloc.stop()
+        tracemalloc.start()
+        # the same run without recursion gives what is not per level
+        run(engine, Parser(Scanner("1;").scan_tokens()).parse())
+        _, base = tracemalloc.get_traced_memory()
+      finally:
+        tracemalloc.stop()
+      seconds, _ = best_of(lambda: run(engine, stmts), repeat=5)
+      print(f"{name} {case:>6}: {counts[0] / calls:5.2f} frames/call, "
+            f"{(peak - base) / depth:7.0f} bytes/level, {seconds * 1e6 / calls:6.2f}us/call")
+
+if __name__ == "__main__":
+  main()
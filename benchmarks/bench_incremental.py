@@ -0,0 +1,28 @@
+"""analyze a 20k line file, then time single char edits in the middle of it
+against analyzing the whole file again.
+"""
+import sys
+import time
+
+from benchmarks import best_of, example_source
+from pylox.incremental import Document
+
+def main(lines=20000):
+  source = example_source(1)
+  source = source * (lines // source.count("\n") + 1)
+  seconds, document = best_of(lambda: Document(source), repeat=1)
+  print(f"{source.count(chr(10))} lines, {len(document.segments)} declarations")
+  print(f"    full: {seconds * 1000:8.1f}ms")
+  # type a char into an expression in the middle of the file and delete it again
+  position = source.index("i + 1", len(source) // 2) + 1
+  edits = 1000
+  start = time.perf_counter()
+  for _ in range(edits // 2):
+    document.edit(position, position, " ")
+    document.edit(position, position + 1, "")
+  elapsed = (time.perf_counter() - start) / edits
+  print(f"    edit: {elapsed * 1000:8.3f}ms")
+  assert document.source == source
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""startup of a 50k line library of functions and classes of which one
+function is called, with eager and with lazy function bodies. scanning is the
+same for both and timed on its own.
+"""
+import io
+import sys
+import contextlib
+
+from benchmarks import best_of
+from pylox.scanner import RegexScanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+
+function = """
+fun f%d(a, b) {
+  var total = 0;
+  for (var i = 0; i < a; i = i + 1) {
+    if (i / 2 == b) {
+      total = total + i * b;
+    } else {
+      total = total - 1;
+    }
+  }
+  return total;
+}
+"""
+
+klass = """
+class C%d {
+  init(x) {
+    this.x = x;
+  }
+  get() {
+    return this.x + 1;
+  }
+}
+"""
+
+def library_source(lines):
+  parts = []
+  count = 0
+  index = 0
+  while count < lines:
+    part = (function if index % 2 else klass) % index
+    parts.append(part)
+    count += part.count("\n")
+    index += 1
+  return "".join(parts) + "print f1(10, 2);\n"
+
+def start(tokens, lazy):
+  """parse, resolve and run a scanned program
+  """
+  interpreter = Interpreter()
+  stmts = Parser(tokens, lazy=lazy).parse()
+  Resolver().resolve(stmts)
+  with contextlib.redirect_stdout(io.StringIO()):
+    interpreter.interprete(stmts)
+
+def main(lines=50000):
+  source = library_source(lines)
+  seconds, tokens = best_of(lambda: RegexScanner(source).scan_tokens(), repeat=3)
+  print(f" scan: {seconds:.2f}s")
+  for lazy in (False, True):
+    seconds, _ = best_of(lambda: start(tokens, lazy), repeat=3)
+    print(f"{'lazy' if lazy else 'eager':>5}: {seconds:.2f}s to parse, resolve and run")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
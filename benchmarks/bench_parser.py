@@ -0,0 +1,36 @@
+"""parse throughput of the precedence chain and pratt expression parsers on an
+expression heavy script.
+"""
+import sys
+import random
+
+from benchmarks import best_of
+from pylox.scanner import RegexScanner
+from pylox.parser import Parser
+
+def expression(rng, depth=0):
+  """a random expression using every precedence level
+  """
+  if depth > 3 or rng.random() < 0.3:
+    return rng.choice(["a", "b.c", "f(1, x)", "12.5", '"s"', "true", "nil"])
+  left = expression(rng, depth + 1)
+  right = expression(rng, depth + 1)
+  operator = rng.choice(["+", "-", "*", "/", "<", ">=", "==", "!=", "and", "or"])
+  if rng.random() < 0.2:
+    return f"-({left} {operator} {right})"
+  return f"{left} {operator} {right}"
+
+def expression_source(lines, seed=0):
+  rng = random.Random(seed)
+  return "\n".join(f"x = {expression(rng)};" for _ in range(lines))
+
+def main(lines=20000):
+  source = expression_source(lines)
+  tokens = RegexScanner(source).scan_tokens()
+  print(f"source: {len(source) / 1e6:.1f} MB, {len(tokens):,} tokens")
+  for name, pratt in (("descent", False), ("pratt", True)):
+    seconds, _ = best_of(lambda: Parser(tokens, pratt=pratt).parse())
+    print(f"{name:>8}: {len(tokens) / seconds:10,.0f} tokens/s  ({seconds:.3f}s)")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
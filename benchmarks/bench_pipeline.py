@@ -0,0 +1,39 @@
+"""time to the first line of output of a script, run whole vs pipelined, for
+growing script lengths.
+"""
+import io
+import sys
+import time
+import contextlib
+
+from pylox import cli
+from pylox.interpreter import Interpreter
+
+class FirstWrite(io.StringIO):
+  """stdout remembering when it was first written to
+  """
+  first = None
+
+  def write(self, text):
+    if self.first is None:
+      self.first = time.perf_counter()
+    return super().write(text)
+
+def first_output(source, pipeline):
+  cli.interpreter = Interpreter()
+  cli.options["pipeline"] = pipeline
+  output = FirstWrite()
+  start = time.perf_counter()
+  with contextlib.redirect_stdout(output):
+    cli.run(io.BytesIO(source.encode("utf-8")))
+  return output.first - start
+
+def main():
+  for lines in (1000, 10000, 100000):
+    source = "print 0;\n" + "var a = 1;\n{ var b = a + 1; print b; }\n" * (lines // 2)
+    whole = first_output(source, False)
+    pipelined = first_output(source, True)
+    print(f"{lines:>7} lines: whole {whole * 1000:8.1f}ms, pipelined {pipelined * 1000:5.2f}ms")
+
+if __name__ == "__main__":
+  main()
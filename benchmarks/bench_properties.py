@@ -0,0 +1,48 @@
+"""property-heavy loop with and without interning names through a SymbolTable.
+"""
+import sys
+
+from benchmarks import best_of
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.symbol_table import SymbolTable
+
+source = """
+class Point {
+  init(x, y) {
+    this.x = x;
+    this.y = y;
+  }
+  move(dx, dy) {
+    this.x = this.x + dx;
+    this.y = this.y + dy;
+    this.distance = this.x * this.x + this.y * this.y;
+  }
+}
+var p = Point(0, 0);
+var i = 0;
+while (i < %d) {
+  p.move(1, 2);
+  i = i + 1;
+}
+"""
+
+class NoInterning(SymbolTable):
+  def intern(self, text):
+    return text
+
+def run(symbols, iterations):
+  interpreter = Interpreter()
+  stmts = Parser(Scanner(source % iterations, symbols).scan_tokens()).parse()
+  Resolver().resolve(stmts)
+  interpreter.interprete(stmts)
+
+def main(iterations=20000):
+  for name, symbols in (("plain", NoInterning), ("interned", SymbolTable)):
+    seconds, _ = best_of(lambda: run(symbols(), iterations))
+    print(f"{name:>8}: {seconds:.3f}s")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
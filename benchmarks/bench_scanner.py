@@ -0,0 +1,19 @@
+"""tokens/second of the lexer engines on a few MB of generated source.
+"""
+import io
+import sys
+from contextlib import redirect_stdout
+
+from benchmarks import best_of, example_source
+from pylox.scanner import scanners
+
+def main(copies=1000):
+  source = example_source(copies)
+  print(f"source: {len(source) / 1e6:.1f} MB")
+  for name, scanner in scanners.items():
+    with redirect_stdout(io.StringIO()):
+      seconds, tokens = best_of(lambda: scanner(source).scan_tokens())
+    print(f"{name:>6}: {len(tokens) / seconds:12,.0f} tokens/s  ({seconds:.3f}s)")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
@@ -0,0 +1,32 @@
+"""memory of ~1M tokens as a Token list vs a TokenBuffer, and parse time on both.
+"""
+import sys
+import tracemalloc
+
+from benchmarks import best_of, example_source
+from pylox.scanner import RegexScanner
+from pylox.parser import Parser
+
+def traced_peak(func):
+  """peak memory in bytes allocated while running func, and its result
+  """
+  tracemalloc.start()
+  result = func()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak, result
+
+def main(copies=1000):
+  source = example_source(copies)
+  tokens = {
+    "list": lambda: RegexScanner(source).scan_tokens(),
+    "buffer": lambda: RegexScanner(source).scan_token_buffer(),
+  }
+  for name, scan in tokens.items():
+    peak, result = traced_peak(scan)
+    seconds, _ = best_of(lambda: Parser(result).parse(), repeat=1)
+    print(f"{name:>6}: {len(result):,} tokens, {peak / len(result):6.1f} bytes/token, parsed in {seconds:.2f}s")
+    del result
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
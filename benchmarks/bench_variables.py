@@ -0,0 +1,59 @@
+"""variable reads and writes: locals in the innermost scope and a few scopes
+out, and globals, on both evaluators.
+"""
+import io
+import sys
+import contextlib
+
+from benchmarks import best_of
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.flat_ast import FlatInterpreter
+
+cases = {
+  # the loop counter alone
+  "loop": "",
+  "read": "b = a; b = a; b = a; b = a;",
+  "write": "a = 1; a = 2; a = 3; a = 4;",
+  "outer read": "{ { { b = o; b = o; b = o; b = o; } } }",
+  "outer write": "{ { { o = 1; o = 2; o = 3; o = 4; } } }",
+  "global read": "b = g; b = g; b = g; b = g;",
+  "global write": "g = 1; g = 2; g = 3; g = 4;",
+  "global call": "f(); f(); f(); f();",
+}
+
+source = """
+var g = 0;
+fun f() {}
+fun run() {
+  var o = 0;
+  {
+    var a = 1;
+    var b = 0;
+    var i = 0;
+    while (i < %d) {
+      %s
+      i = i + 1;
+    }
+  }
+}
+run();
+"""
+
+def run(engine, code):
+  interpreter = engine()
+  stmts = Parser(Scanner(source % code).scan_tokens()).parse()
+  Resolver().resolve(stmts)
+  with contextlib.redirect_stdout(io.StringIO()):
+    interpreter.interprete(stmts)
+
+def main(iterations=20000):
+  for name, engine in (("tree", Interpreter), ("flat", FlatInterpreter)):
+    for case, code in cases.items():
+      seconds, _ = best_of(lambda: run(engine, (iterations, code)), repeat=7)
+      print(f"{name} {case:>12}: {seconds * 1e6 / iterations:6.2f}us/iteration")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
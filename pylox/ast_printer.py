@@ -1,108 +1,262 @@
-from pylox.expr import Expr
-from pylox.token import Token
+import io
+from typing import TextIO
+from pylox.expr import Expr, Literal, Variable, This
+from pylox.stmt import Stmt, Block
 from pylox.expr import ExprVisitor
 from pylox.stmt import StmtVisitor
 
+class Separator(str):
+  """text between two parts of a node. an indented printer replaces it with a
+  line break when the part after it is a node that is not a leaf.
+  """
+  __slots__ = ()
+
+space = Separator(" ")
+glue = Separator("")
+
 class AstPrinter(ExprVisitor, StmtVisitor):
-  """print the ast tree.
+  """print the ast tree as s-expressions.
   implement ExprVisitor and StmtVisitor visitor interface.
+
+  visit methods return the text of a node, like `print`. the private
+  `_<node>_expr` and `_<node>_stmt` helpers return the text of a leaf, or a
+  generator of the parts of a node: text, separators and child nodes. `write`
+  walks them with an explicit stack and streams the text to a file, so trees of
+  any depth and size are printed without recursion and without building the
+  whole string.
   """
-  def print(self, expr: Expr):
-    return expr.accept(self)
+  # nodes printed as one word, never broken onto their own line
+  leaves = (Literal, Variable, This)
 
-  def parenthesize(self, name, *exprs):
-    expr_str = " ".join([expr.accept(self) for expr in exprs])
-    return f"({name} {expr_str})"
+  def __init__(self, indent: str = None, buffer_size: int = 4096):
+    """
+    :param indent: None prints a node on one line, a str puts the nodes
+      inside it on their own lines, indented by that str per level
+    :param buffer_size: parts collected before a write to the file
+    """
+    self.indent = indent
+    self.buffer_size = buffer_size
 
-  def parenthesize2(self, name, *parts):
-    def inner(part):
-      if isinstance(part, Expr):
-        return part.accept(self)
-      elif isinstance(part, Token):
-        return part.lexeme
-      else:
-        return str(part)
-    expr_str = " ".join(inner(part) for part in parts)
-    return f"({name} {expr_str})"
+  def print(self, node) -> str:
+    out = io.StringIO()
+    self.write(node, out)
+    return out.getvalue()
 
+  def dump(self, stmts, out: TextIO):
+    """write statements one per line
+    """
+    for stmt in stmts:
+      self.write(stmt, out)
+      out.write("\n")
+
+  def write(self, node, out: TextIO):
+    indent, leaves = self.indent, self.leaves
+    buffer_size = self.buffer_size
+    buffer = []
+    stack = []
+    separator = None
+    part = node
+    while True:
+      if separator is not None:
+        if indent is not None and isinstance(part, (Expr, Stmt)) and not isinstance(part, leaves):
+          buffer.append("\n" + indent * len(stack))
+        else:
+          buffer.append(separator)
+        separator = None
+      if isinstance(part, Separator):
+        separator = part
+      elif isinstance(part, str):
+        buffer.append(part)
+      elif part is not None:
+        parts = self.parts(part)
+        if isinstance(parts, str):
+          buffer.append(parts)
+        else:
+          stack.append(parts)
+      if len(buffer) >= buffer_size:
+        out.write("".join(buffer))
+        buffer.clear()
+      part = stack
+      while part is stack and stack:
+        part = next(stack[-1], stack)
+        if part is stack:
+          stack.pop()
+      if part is stack:
+        break
+    out.write("".join(buffer))
 
   def visit_assign_expr(self, expr):
-    return self.parenthesize2("=", expr.name.lexeme, expr.value)
+    return self.print(expr)
 
   def visit_binary_expr(self, expr):
-    return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+    return self.print(expr)
 
   def visit_call_expr(self, expr):
-    return self.parenthesize2("call", expr.callee, expr.arguments)
+    return self.print(expr)
 
   def visit_get_expr(self, expr):
-    return self.parenthesize2(".", expr.object, expr.name.lexeme)
+    return self.print(expr)
 
   def visit_grouping_expr(self, expr):
-    return self.parenthesize("group", expr.expression)
+    return self.print(expr)
 
   def visit_literal_expr(self, expr):
-    if expr.value is None: return "nil"
-    return str(expr.value)
+    return self.print(expr)
 
   def visit_logical_expr(self, expr):
-    return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+    return self.print(expr)
 
   def visit_set_expr(self, expr):
-    return self.parenthesize2("=",
-        expr.object, expr.name.lexeme, expr.value)
+    return self.print(expr)
 
   def visit_super_expr(self, expr):
-    return self.parenthesize2("super", expr.method)
+    return self.print(expr)
 
   def visit_this_expr(self, expr):
-    return 'this'
+    return self.print(expr)
 
   def visit_unary_expr(self, expr):
-    return self.parenthesize(expr.operator.lexeme, expr.right)
+    return self.print(expr)
 
   def visit_variable_expr(self, expr):
-    return expr.name.lexeme
+    return self.print(expr)
 
   def visit_block_stmt(self, stmt):
-    stmts = "".join([stmt.accept(self) for stmt in stmt.statements])
-    return f"(block {stmts})"
+    return self.print(stmt)
 
   def visit_class_stmt(self, stmt):
-    name = f"(class {stmt.name.lexeme}"
-    if stmt.superclass:
-      name += f" < {stmt.superclass.accept(self)}"
-    methods = " ".join([method.accept(self) for method in stmt.methods])
-    return f"{name} {methods})"
+    return self.print(stmt)
 
   def visit_expression_stmt(self, stmt):
-    return self.parenthesize(";", stmt.expression)
+    return self.print(stmt)
 
   def visit_function_stmt(self, stmt):
-    name = f"(func {stmt.name.lexeme}("
-    tokens = " ".join([param.name.lexeme for param in stmt.params])
-    body = "".join([s.accept(self) for s in stmt.body.statements])
-    return f"{name}{tokens}){body})"
+    return self.print(stmt)
 
   def visit_if_stmt(self, stmt):
+    return self.print(stmt)
+
+  def visit_print_stmt(self, stmt):
+    return self.print(stmt)
+
+  def visit_return_stmt(self, stmt):
+    return self.print(stmt)
+
+  def visit_var_stmt(self, stmt):
+    return self.print(stmt)
+
+  def visit_while_stmt(self, stmt):
+    return self.print(stmt)
+
+  def parts(self, node):
+    """the text of a leaf node, or a generator of the parts of a node
+    """
+    return getattr(self, "_" + node.visit_name[len("visit_"):])(node)
+
+  def parenthesize(self, name, *parts):
+    yield "(" + name
+    for part in parts:
+      yield space
+      yield part
+    yield ")"
+
+  def _assign_expr(self, expr):
+    return self.parenthesize("=", expr.name.lexeme, expr.value)
+
+  def _binary_expr(self, expr):
+    return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+
+  def _call_expr(self, expr):
+    yield "(call"
+    yield space
+    yield expr.callee
+    yield " ["
+    for i, argument in enumerate(expr.arguments):
+      if i: yield space
+      yield argument
+    yield "])"
+
+  def _get_expr(self, expr):
+    return self.parenthesize(".", expr.object, expr.name.lexeme)
+
+  def _grouping_expr(self, expr):
+    return self.parenthesize("group", expr.expression)
+
+  def _literal_expr(self, expr):
+    if expr.value is None: return "nil"
+    return str(expr.value)
+
+  def _logical_expr(self, expr):
+    return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+
+  def _set_expr(self, expr):
+    return self.parenthesize("=", expr.object, expr.name.lexeme, expr.value)
+
+  def _super_expr(self, expr):
+    return self.parenthesize("super", expr.method.lexeme)
+
+  def _this_expr(self, expr):
+    return 'this'
+
+  def _unary_expr(self, expr):
+    return self.parenthesize(expr.operator.lexeme, expr.right)
+
+  def _variable_expr(self, expr):
+    return expr.name.lexeme
+
+  def _block_stmt(self, stmt):
+    yield "(block"
+    if not stmt.statements:
+      yield " "
+    for i, s in enumerate(stmt.statements):
+      yield glue if i else space
+      yield s
+    yield ")"
+
+  def _class_stmt(self, stmt):
+    yield f"(class {stmt.name.lexeme}"
+    if stmt.superclass:
+      yield " < "
+      yield stmt.superclass
+    if not stmt.methods:
+      yield " "
+    for method in stmt.methods:
+      yield space
+      yield method
+    yield ")"
+
+  def _expression_stmt(self, stmt):
+    return self.parenthesize(";", stmt.expression)
+
+  def _function_stmt(self, stmt):
+    params = " ".join([param.name.lexeme for param in stmt.params])
+    yield f"(func {stmt.name.lexeme}({params})"
+    if isinstance(stmt.body, Block):
+      for s in stmt.body.statements:
+        yield glue
+        yield s
+    else:
+      # a LazyBody not parsed yet
+      yield "{...}"
+    yield ")"
+
+  def _if_stmt(self, stmt):
     if stmt.elseBranch:
-      return self.parenthesize2("if-else", stmt.condition, stmt.thenBranch, stmt.elseBranch)
+      return self.parenthesize("if-else", stmt.condition, stmt.thenBranch, stmt.elseBranch)
     return self.parenthesize("if", stmt.condition, stmt.thenBranch)
 
-  def visit_print_stmt(self, stmt):
+  def _print_stmt(self, stmt):
     return self.parenthesize("print", stmt.expression)
 
-  def visit_return_stmt(self, stmt):
+  def _return_stmt(self, stmt):
     if stmt.value:
       return self.parenthesize("return", stmt.value)
     return "(return)"
 
-  def visit_var_stmt(self, stmt):
+  def _var_stmt(self, stmt):
     if stmt.initializer:
-      return self.parenthesize2("var", stmt.name, "=", stmt.initializer)
-    return self.parenthesize2("var", stmt.name)
-
-  def visit_while_stmt(self, stmt):
-    return self.parenthesize2("while", stmt.condition, stmt.body)
-
+      return self.parenthesize("var", stmt.name.lexeme, "=", stmt.initializer)
+    return self.parenthesize("var", stmt.name.lexeme)
 
+  def _while_stmt(self, stmt):
+    return self.parenthesize("while", stmt.condition, stmt.body)
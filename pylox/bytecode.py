@@ -0,0 +1,505 @@
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+from pylox.expr import ExprVisitor, Expr
+from pylox.stmt import StmtVisitor, Class, Function, Var
+from pylox.token import Token, TokenType
+from pylox.error import RuntimeError
+from pylox.environment import UPVALUE
+from pylox.parser import LazyBody
+from pylox.resolver import Resolver
+
+class OpCode(IntEnum):
+  """instructions of a Chunk. an instruction is its opcode word followed by
+  its operand words, see `operands`.
+  """
+  CONSTANT = 0
+  NIL = 1
+  TRUE = 2
+  FALSE = 3
+  POP = 4
+  # locals of the current frame, by slot
+  GET_LOCAL = 5
+  SET_LOCAL = 6
+  # a local kept in a Cell
+  GET_CELL = 7
+  SET_CELL = 8
+  # locals of an enclosing frame, by depth and slot
+  GET_LOCAL_AT = 9
+  SET_LOCAL_AT = 10
+  GET_CELL_AT = 11
+  SET_CELL_AT = 12
+  # variables of enclosing functions, by index in the upvalues
+  GET_UPVALUE = 13
+  GET_UPVALUE_CELL = 14
+  SET_UPVALUE_CELL = 15
+  # globals, the constant is their Cell
+  GET_GLOBAL = 16
+  SET_GLOBAL = 17
+  DEFINE_GLOBAL = 18
+  # append the value to the frame, as is or in a Cell named by the constant
+  DEFINE_LOCAL = 19
+  DEFINE_LOCAL_CELL = 20
+  # append an empty Cell named by the constant to the frame and push it
+  NEW_CELL = 21
+  # pop a value and the Cell under it, put the value in the Cell
+  FILL_CELL = 22
+  # drop the variables of a block from the frame
+  TRUNCATE = 23
+  # run a block in a frame of its own
+  PUSH_FRAME = 24
+  POP_FRAME = 25
+  GET_PROPERTY = 26
+  # fail unless the value to set a field of is an instance
+  CHECK_FIELDS = 27
+  SET_PROPERTY = 28
+  GET_SUPER = 29
+  EQUAL = 30
+  NOT_EQUAL = 31
+  GREATER = 32
+  GREATER_EQUAL = 33
+  LESS = 34
+  LESS_EQUAL = 35
+  ADD = 36
+  SUBTRACT = 37
+  MULTIPLY = 38
+  DIVIDE = 39
+  NOT = 40
+  NEGATE = 41
+  PRINT = 42
+  # jumps to the absolute offset of the operand
+  JUMP = 43
+  # pop the condition
+  JUMP_IF_FALSE = 44
+  # jump if the condition decides and/or, keeping it, otherwise pop it
+  JUMP_IF_FALSE_OR_POP = 45
+  JUMP_IF_TRUE_OR_POP = 46
+  CALL = 47
+  # create a function from the FunctionProto constant
+  FUNCTION = 48
+  # create a class from the ClassProto constant, popping the superclass first
+  CLASS = 49
+  RETURN = 50
+
+# operand count of each opcode, the ones not here have none
+operands = {
+  OpCode.CONSTANT: 1,
+  OpCode.GET_LOCAL: 1, OpCode.SET_LOCAL: 1, OpCode.GET_CELL: 1, OpCode.SET_CELL: 1,
+  OpCode.GET_LOCAL_AT: 2, OpCode.SET_LOCAL_AT: 2, OpCode.GET_CELL_AT: 2, OpCode.SET_CELL_AT: 2,
+  OpCode.GET_UPVALUE: 1, OpCode.GET_UPVALUE_CELL: 1, OpCode.SET_UPVALUE_CELL: 1,
+  OpCode.GET_GLOBAL: 1, OpCode.SET_GLOBAL: 1, OpCode.DEFINE_GLOBAL: 1,
+  OpCode.DEFINE_LOCAL_CELL: 1, OpCode.NEW_CELL: 1, OpCode.TRUNCATE: 1,
+  OpCode.GET_PROPERTY: 1, OpCode.CHECK_FIELDS: 1, OpCode.SET_PROPERTY: 1, OpCode.GET_SUPER: 1,
+  OpCode.JUMP: 1, OpCode.JUMP_IF_FALSE: 1, OpCode.JUMP_IF_FALSE_OR_POP: 1, OpCode.JUMP_IF_TRUE_OR_POP: 1,
+  # argument count and the paren token
+  OpCode.CALL: 2,
+  OpCode.FUNCTION: 1, OpCode.CLASS: 1,
+}
+
+# opcodes whose operand is a constant
+constant_operands = {
+  OpCode.CONSTANT, OpCode.GET_GLOBAL, OpCode.SET_GLOBAL, OpCode.DEFINE_GLOBAL, OpCode.DEFINE_LOCAL_CELL,
+  OpCode.NEW_CELL, OpCode.GET_PROPERTY, OpCode.CHECK_FIELDS, OpCode.SET_PROPERTY, OpCode.GET_SUPER,
+  OpCode.FUNCTION, OpCode.CLASS,
+}
+
+class Chunk(object):
+  """compiled code: 32 bit words of opcodes and operands, the constants they
+  refer to, and a line table of (offset, line) pairs, one for every offset
+  the line changes at.
+  """
+
+  def __init__(self, name: str):
+    self.name = name
+    self.code = array("I")
+    self.constants = []
+    self.lines = array("I")
+    self.constant_indices = {}
+
+  def emit(self, line: int, *words) -> int:
+    """append an instruction, return its offset
+    """
+    offset = len(self.code)
+    if line is not None and (not self.lines or self.lines[-1] != line):
+      self.lines.append(offset)
+      self.lines.append(line)
+    self.code.extend(words)
+    return offset
+
+  def add_constant(self, value) -> int:
+    # 1.0 == True, keep them apart. tokens, cells and protos by identity
+    key = (type(value), value) if isinstance(value, (str, float)) else (type(value), id(value))
+    index = self.constant_indices.get(key)
+    if index is None:
+      index = self.constant_indices[key] = len(self.constants)
+      self.constants.append(value)
+    return index
+
+  def line_at(self, offset: int) -> int:
+    index = bisect_right(self.lines[0::2], offset)
+    return self.lines[2 * index - 1] if index else 0
+
+class FunctionProto(object):
+  """a function declaration compiled once, shared by every function created
+  from it. the body of a lazily parsed function is compiled on its first call.
+  """
+
+  def __init__(self, compiler, declaration, is_initializer: bool):
+    self.compiler = compiler
+    self.declaration = declaration
+    self.name = declaration.name.lexeme
+    self.arity = len(declaration.params)
+    self.is_initializer = is_initializer
+    self.upvalues = declaration.upvalues
+    # index and name of the params kept in a Cell
+    self.cells = ()
+    self.chunk = None
+    if not isinstance(declaration.body, LazyBody):
+      self.compile()
+
+  def compile(self):
+    declaration = self.declaration
+    if isinstance(declaration.body, LazyBody):
+      if Resolver.materialize(declaration) is None:
+        raise RuntimeError(declaration.name, "Function body has errors.")
+    self.cells = tuple((i, param.name.lexeme) for i, param in enumerate(declaration.params) if param.cell)
+    self.chunk = self.compiler.compile_function(self.name, declaration)
+
+  def __repr__(self):
+    return f"<fn {self.name}>"
+
+class ClassProto(object):
+  """what a class declaration creates its class from
+  """
+
+  def __init__(self, name: Token, superclass: Token, methods):
+    self.name = name.lexeme
+    # the superclass variable, for the error if it is no class
+    self.superclass = superclass
+    # FunctionProto of each method
+    self.methods = methods
+
+  def __repr__(self):
+    return f"<class {self.name}>"
+
+class Compiler(ExprVisitor, StmtVisitor):
+  """compile resolved statements into Chunks, one for each top level
+  statement and one for the body of each function.
+  """
+
+  def __init__(self, interpreter):
+    self.interpreter = interpreter
+    self.globals = interpreter.globals
+    self.chunk = None
+    # line of the node being compiled
+    self.line = 0
+    # compiling the statements of a block or function, not global ones
+    self.local = False
+
+  def compile_statement(self, stmt) -> Chunk:
+    """compile a top level statement
+    """
+    chunk, self.chunk = self.chunk, Chunk("script")
+    try:
+      self.statement(stmt)
+      self.emit(OpCode.NIL)
+      self.emit(OpCode.RETURN)
+      return self.chunk
+    finally:
+      self.chunk = chunk
+
+  def compile_function(self, name: str, declaration) -> Chunk:
+    chunk, self.chunk = self.chunk, Chunk(name)
+    local, self.local = self.local, True
+    line, self.line = self.line, declaration.name.line
+    try:
+      for stmt in declaration.body.statements:
+        self.statement(stmt)
+      self.emit(OpCode.NIL)
+      self.emit(OpCode.RETURN)
+      return self.chunk
+    finally:
+      self.chunk, self.local, self.line = chunk, local, line
+
+  def emit(self, *words) -> int:
+    return self.chunk.emit(self.line, *words)
+
+  def constant(self, value) -> int:
+    return self.chunk.add_constant(value)
+
+  def jump(self, opcode: OpCode) -> int:
+    """emit a jump to patch, return the offset of its operand
+    """
+    return self.emit(opcode, 0) + 1
+
+  def patch(self, operand: int):
+    """make a jump go to the end of the code
+    """
+    self.chunk.code[operand] = len(self.chunk.code)
+
+  def mark(self, token: Token):
+    if token is not None:
+      self.line = token.line
+
+  def expression(self, expr):
+    self.dispatch[expr.__class__](self, expr)
+
+  def statement(self, stmt):
+    if isinstance(stmt, Expr):
+      # the increment of a desugared for loop
+      self.expression(stmt)
+      self.emit(OpCode.POP)
+      return
+    self.dispatch[stmt.__class__](self, stmt)
+
+  def scope(self, stmts):
+    local, self.local = self.local, True
+    try:
+      for stmt in stmts:
+        self.statement(stmt)
+    finally:
+      self.local = local
+
+  def load(self, expr, name: str):
+    depth, slot = expr.depth, expr.slot
+    if depth is None:
+      self.emit(OpCode.GET_GLOBAL, self.constant(self.globals.cell(name)))
+    elif depth == UPVALUE:
+      self.emit(OpCode.GET_UPVALUE_CELL if expr.cell else OpCode.GET_UPVALUE, slot)
+    elif depth == 0:
+      self.emit(OpCode.GET_CELL if expr.cell else OpCode.GET_LOCAL, slot)
+    else:
+      self.emit(OpCode.GET_CELL_AT if expr.cell else OpCode.GET_LOCAL_AT, depth, slot)
+
+  def define(self, name: str, boxed: bool):
+    if not self.local:
+      self.emit(OpCode.DEFINE_GLOBAL, self.constant(self.globals.cell(name)))
+    elif boxed:
+      self.emit(OpCode.DEFINE_LOCAL_CELL, self.constant(name))
+    else:
+      self.emit(OpCode.DEFINE_LOCAL)
+
+  def visit_assign_expr(self, expr):
+    self.expression(expr.value)
+    self.mark(expr.name)
+    depth, slot = expr.depth, expr.slot
+    if depth is None:
+      self.emit(OpCode.SET_GLOBAL, self.constant(self.globals.cell(expr.name.lexeme)))
+    elif depth == UPVALUE:
+      self.emit(OpCode.SET_UPVALUE_CELL, slot)
+    elif depth == 0:
+      self.emit(OpCode.SET_CELL if expr.cell else OpCode.SET_LOCAL, slot)
+    else:
+      self.emit(OpCode.SET_CELL_AT if expr.cell else OpCode.SET_LOCAL_AT, depth, slot)
+
+  def visit_binary_expr(self, expr):
+    self.expression(expr.left)
+    self.expression(expr.right)
+    self.mark(expr.operator)
+    self.emit(binary_opcodes[expr.operator.type])
+
+  def visit_call_expr(self, expr):
+    self.expression(expr.callee)
+    for argument in expr.arguments:
+      self.expression(argument)
+    self.mark(expr.paren)
+    self.emit(OpCode.CALL, len(expr.arguments), self.constant(expr.paren))
+
+  def visit_get_expr(self, expr):
+    self.expression(expr.object)
+    self.mark(expr.name)
+    self.emit(OpCode.GET_PROPERTY, self.constant(expr.name))
+
+  def visit_grouping_expr(self, expr):
+    self.expression(expr.expression)
+
+  def visit_literal_expr(self, expr):
+    value = expr.value
+    if value is None:
+      self.emit(OpCode.NIL)
+    elif value is True:
+      self.emit(OpCode.TRUE)
+    elif value is False:
+      self.emit(OpCode.FALSE)
+    else:
+      self.emit(OpCode.CONSTANT, self.constant(value))
+
+  def visit_logical_expr(self, expr):
+    self.expression(expr.left)
+    self.mark(expr.operator)
+    if expr.operator.type == TokenType.OR:
+      end = self.jump(OpCode.JUMP_IF_TRUE_OR_POP)
+    else:
+      end = self.jump(OpCode.JUMP_IF_FALSE_OR_POP)
+    self.expression(expr.right)
+    self.patch(end)
+
+  def visit_set_expr(self, expr):
+    self.expression(expr.object)
+    self.mark(expr.name)
+    name = self.constant(expr.name)
+    self.emit(OpCode.CHECK_FIELDS, name)
+    self.expression(expr.value)
+    self.emit(OpCode.SET_PROPERTY, name)
+
+  def visit_super_expr(self, expr):
+    self.mark(expr.keyword)
+    self.load(expr, "super")
+    self.load(expr.this, "this")
+    self.emit(OpCode.GET_SUPER, self.constant(expr.method))
+
+  def visit_this_expr(self, expr):
+    self.mark(expr.keyword)
+    self.load(expr, "this")
+
+  def visit_unary_expr(self, expr):
+    self.expression(expr.right)
+    self.mark(expr.operator)
+    self.emit(OpCode.NOT if expr.operator.type == TokenType.BANG else OpCode.NEGATE)
+
+  def visit_variable_expr(self, expr):
+    self.mark(expr.name)
+    self.load(expr, expr.name.lexeme)
+
+  def visit_block_stmt(self, stmt):
+    if stmt.base is None:
+      self.emit(OpCode.PUSH_FRAME)
+      self.scope(stmt.statements)
+      self.emit(OpCode.POP_FRAME)
+      return
+    self.scope(stmt.statements)
+    if any(isinstance(s, (Var, Function, Class)) for s in stmt.statements):
+      self.emit(OpCode.TRUNCATE, stmt.base)
+
+  def visit_class_stmt(self, stmt):
+    self.mark(stmt.name)
+    boxed = self.local and stmt.cell
+    if boxed:
+      # methods capture the cell before the class is in it
+      self.emit(OpCode.NEW_CELL, self.constant(stmt.name.lexeme))
+    superclass = None
+    if stmt.superclass:
+      self.expression(stmt.superclass)
+      superclass = stmt.superclass.name
+    methods = [FunctionProto(self, method, method.name.lexeme == "init") for method in stmt.methods]
+    self.mark(stmt.name)
+    self.emit(OpCode.CLASS, self.constant(ClassProto(stmt.name, superclass, methods)))
+    if boxed:
+      self.emit(OpCode.FILL_CELL)
+    else:
+      self.define(stmt.name.lexeme, False)
+
+  def visit_expression_stmt(self, stmt):
+    self.expression(stmt.expression)
+    self.emit(OpCode.POP)
+
+  def visit_function_stmt(self, stmt):
+    self.mark(stmt.name)
+    boxed = self.local and stmt.cell
+    if boxed:
+      # the function can call itself through the cell
+      self.emit(OpCode.NEW_CELL, self.constant(stmt.name.lexeme))
+    proto = FunctionProto(self, stmt, False)
+    self.mark(stmt.name)
+    self.emit(OpCode.FUNCTION, self.constant(proto))
+    if boxed:
+      self.emit(OpCode.FILL_CELL)
+    else:
+      self.define(stmt.name.lexeme, False)
+
+  def visit_if_stmt(self, stmt):
+    self.expression(stmt.condition)
+    else_branch = self.jump(OpCode.JUMP_IF_FALSE)
+    self.statement(stmt.thenBranch)
+    if stmt.elseBranch:
+      end = self.jump(OpCode.JUMP)
+      self.patch(else_branch)
+      self.statement(stmt.elseBranch)
+      self.patch(end)
+    else:
+      self.patch(else_branch)
+
+  def visit_print_stmt(self, stmt):
+    self.expression(stmt.expression)
+    self.emit(OpCode.PRINT)
+
+  def visit_return_stmt(self, stmt):
+    self.mark(stmt.keyword)
+    if stmt.value:
+      self.expression(stmt.value)
+    else:
+      self.emit(OpCode.NIL)
+    self.emit(OpCode.RETURN)
+
+  def visit_var_stmt(self, stmt):
+    if stmt.initializer:
+      self.expression(stmt.initializer)
+    else:
+      self.emit(OpCode.NIL)
+    self.mark(stmt.name)
+    self.define(stmt.name.lexeme, stmt.cell)
+
+  def visit_while_stmt(self, stmt):
+    start = len(self.chunk.code)
+    self.expression(stmt.condition)
+    end = self.jump(OpCode.JUMP_IF_FALSE)
+    self.statement(stmt.body)
+    self.emit(OpCode.JUMP, start)
+    self.patch(end)
+
+# opcode of each binary operator
+binary_opcodes = {
+  TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+  TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+  TokenType.GREATER: OpCode.GREATER,
+  TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+  TokenType.LESS: OpCode.LESS,
+  TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+  TokenType.PLUS: OpCode.ADD,
+  TokenType.MINUS: OpCode.SUBTRACT,
+  TokenType.STAR: OpCode.MULTIPLY,
+  TokenType.SLASH: OpCode.DIVIDE,
+}
+
+def describe(value) -> str:
+  """a constant as the disassembler shows it
+  """
+  if isinstance(value, Token):
+    return value.lexeme
+  if isinstance(value, str):
+    return repr(value)
+  if hasattr(value, "name") and not isinstance(value, (FunctionProto, ClassProto)):
+    # a Cell of a global
+    return value.name
+  return str(value)
+
+def disassemble(chunk: Chunk) -> str:
+  """a listing of the chunk and of the functions declared in it, one
+  instruction per line: offset, line (| if the same as before), opcode,
+  operands and the constant the operand refers to.
+  """
+  out = []
+  pending = [chunk]
+  while pending:
+    chunk = pending.pop(0)
+    out.append(f"== {chunk.name} ==")
+    code, offset, last_line = chunk.code, 0, None
+    while offset < len(code):
+      opcode = OpCode(code[offset])
+      words = list(code[offset + 1:offset + 1 + operands.get(opcode, 0)])
+      line = chunk.line_at(offset)
+      text = f"{offset:04d} {'   |' if line == last_line else f'{line:4d}'} {opcode.name:<20}"
+      last_line = line
+      if words:
+        text += " " + " ".join(str(word) for word in words)
+      if opcode in constant_operands:
+        constant = chunk.constants[words[0]]
+        text += f" '{describe(constant)}'"
+        protos = [constant] if isinstance(constant, FunctionProto) else \
+          constant.methods if isinstance(constant, ClassProto) else []
+        pending.extend(proto.chunk for proto in protos if proto.chunk is not None)
+      elif opcode == OpCode.CALL:
+        text += f" '{describe(chunk.constants[words[1]])}'"
+      out.append(text.rstrip())
+      offset += 1 + len(words)
+  return "\n".join(out) + "\n"
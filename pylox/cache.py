@@ -0,0 +1,111 @@
+import os
+import pickle
+import hashlib
+import tempfile
+from pylox.meta import NodeMeta
+from pylox.token import Token
+from pylox.expr import Expr, Binary
+from pylox.stmt import Stmt
+from pylox.quickening import site_indices
+
+# bump when the layout of a cache entry changes
+FORMAT_VERSION = 2
+
+suffix = ".loxc"
+
+def default_cache_dir() -> str:
+  base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+  return os.path.join(base, "pylox")
+
+def schema_fingerprint() -> bytes:
+  """digest of everything a cached tree depends on: the cache format and the
+  fields of tokens and ast nodes. entries written by a pylox with other node
+  classes get other keys, so they are never loaded.
+  """
+  schema = [FORMAT_VERSION, Token.__slots__]
+  for node_cls in NodeMeta.node_classes:
+    if node_cls.__module__ in ("pylox.expr", "pylox.stmt"):
+      schema.append((node_cls.__qualname__, node_cls._fields, node_cls._attributes))
+  return hashlib.sha256(repr(schema).encode("utf-8")).digest()
+
+def renumber_sites(stmts):
+  """give the Binary nodes of a loaded program site indices of this process,
+  the stored ones may be taken by the trees resolved here
+  """
+  stack = list(stmts)
+  while stack:
+    node = stack.pop()
+    if isinstance(node, list):
+      stack.extend(node)
+    elif isinstance(node, (Expr, Stmt)):
+      if node.__class__ is Binary:
+        node.site = next(site_indices)
+      stack.extend(getattr(node, field) for field in node._fields)
+
+class Cache(object):
+  """resolved programs stored in a directory, keyed by source content.
+  an entry holds the statements, with the resolver's depths on their nodes.
+  entries are pickles, so the directory must only be writable by its owner.
+  """
+
+  def __init__(self, directory: str = None):
+    self.directory = directory or default_cache_dir()
+    self.fingerprint = schema_fingerprint()
+
+  def key(self, source, variant: str = "") -> str:
+    """
+    :param source: source code str, or bytes-like e.g. mmap
+    :param variant: options the compiled program depends on
+    """
+    if isinstance(source, str):
+      source = source.encode("utf-8")
+    digest = hashlib.sha256(self.fingerprint)
+    digest.update(variant.encode("utf-8") + b"\0")
+    digest.update(source)
+    return digest.hexdigest()
+
+  def path(self, key: str) -> str:
+    return os.path.join(self.directory, key + suffix)
+
+  def load(self, key: str):
+    """statements stored under key, None if missing or unreadable
+    """
+    try:
+      with open(self.path(key), "rb") as f:
+        stmts = pickle.load(f)
+    except Exception:
+      # missing, truncated or otherwise broken entry, compile again instead
+      return None
+    renumber_sites(stmts)
+    return stmts
+
+  def store(self, key: str, stmts) -> bool:
+    """store a program, atomically so a concurrent reader never sees half an
+    entry. trees too deep to be pickled are not stored.
+    """
+    try:
+      data = pickle.dumps(stmts, pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+      return False
+    os.makedirs(self.directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(data)
+      os.replace(tmp, self.path(key))
+    except OSError:
+      os.unlink(tmp)
+      return False
+    return True
+
+  def prune(self) -> int:
+    """remove every entry, return how many were removed
+    """
+    removed = 0
+    if not os.path.isdir(self.directory):
+      return removed
+    for name in os.listdir(self.directory):
+      if name.endswith(suffix) or name.endswith(".tmp"):
+        os.unlink(os.path.join(self.directory, name))
+        removed += 1
+    return removed
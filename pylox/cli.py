@@ -1,24 +1,127 @@
 # -*- coding: utf-8 -*-
 
 """Console script for pylox."""
+import os
 import sys
+import mmap
 import click
 
 from pylox.error import error_handler
-from pylox.scanner import Scanner
-from pylox.parser import Parser
+from pylox.scanner import scanners
+from pylox.parser import Parser, lazy_functions
 from pylox.interpreter import Interpreter
+from pylox.flat_ast import FlatInterpreter
+from pylox.closure_compiler import ClosureInterpreter
+from pylox.vm import VM
+from pylox.tiering import TieredInterpreter
+from pylox.transpiler import PyInterpreter, Transpiler
+from pylox.bytecode import disassemble
 from pylox.resolver import Resolver
+from pylox.cache import Cache, default_cache_dir
 
-@click.command()
-@click.argument('file', type=click.Path(exists=True), required=False)
-def main(file=None):
+# evaluators selectable by name
+engines = {
+  "tree": Interpreter,
+  "flat": FlatInterpreter,
+  "closure": ClosureInterpreter,
+  "vm": VM,
+  "py": PyInterpreter,
+  "tiered": TieredInterpreter,
+}
+# engines running lazily parsed function bodies
+lazy_engines = ("tree", "closure", "vm", "tiered")
+
+class Main(click.Group):
+  """pylox commands, `run` being the default one: `pylox [OPTIONS] [FILE]`
+  runs a script as `pylox run [OPTIONS] [FILE]` does.
+  """
+
+  def parse_args(self, ctx, args):
+    if not args or (args[0] not in self.commands and args[0] != "--help"):
+      args = ["run"] + list(args)
+    return super().parse_args(ctx, args)
+
+@click.group(cls=Main)
+def main():
   """Console script for pylox."""
+
+@main.command("run")
+@click.argument('file', type=click.Path(exists=True, allow_dash=True), required=False)
+@click.option('--lexer', type=click.Choice(sorted(scanners)), default="regex",
+              help="lexer engine used to scan the source.")
+@click.option('--parser', type=click.Choice(["descent", "pratt"]), default="pratt",
+              help="expression parser, precedence chain descent or pratt.")
+@click.option('--engine', type=click.Choice(sorted(engines)), default="tree",
+              help="evaluator, over the object ast, a flat array ast, compiled to closures, to bytecode, to python or tiered.")
+@click.option('--lazy', is_flag=True,
+              help="parse and resolve function bodies on their first call.")
+@click.option('--disassemble', is_flag=True,
+              help="print the bytecode of the vm engine instead of running the program.")
+@click.option('--stats', is_flag=True,
+              help="print how the tree or tiered engine specialized the program after running.")
+@click.option('--pipeline', is_flag=True,
+              help="run each top level declaration as soon as it is parsed.")
+@click.option('--cache/--no-cache', default=False, envvar="PYLOX_CACHE",
+              help="reuse the resolved program of an unchanged file.")
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=default_cache_dir,
+              help="directory of cached programs.")
+@click.option('--prune-cache', is_flag=True,
+              help="remove every cached program first.")
+def run_script(file=None, lexer="regex", parser="pratt", engine="tree", lazy=False, disassemble=False, stats=False, pipeline=False, cache=False, cache_dir=None, prune_cache=False):
+  """run a script, or the repl without FILE."""
+  global interpreter
+  options["lexer"] = lexer
+  options["parser"] = parser
+  if lazy and engine not in lazy_engines:
+    names = ", ".join(lazy_engines[:-1]) + " or " + lazy_engines[-1]
+    raise click.UsageError(f"--lazy needs the {names} engine.")
+  if disassemble:
+    engine = "vm"
+  if stats and engine not in ("tree", "tiered"):
+    raise click.UsageError("--stats needs the tree or tiered engine.")
+  options["lazy"] = lazy
+  options["disassemble"] = disassemble
+  options["pipeline"] = pipeline
+  if interpreter.__class__ is not engines[engine]:
+    interpreter = engines[engine]()
+  options["cache"] = Cache(cache_dir) if cache else None
+  if prune_cache:
+    removed = Cache(cache_dir).prune()
+    if not file:
+      click.echo(f"removed {removed} cached programs")
+      return 0
   if not file:
       run_repl()
   run_file(file)
+  if stats:
+    click.echo(interpreter.stats(), nl=False, err=True)
   return 0
 
+@main.command()
+@click.argument('file', type=click.Path(exists=True, allow_dash=True))
+@click.option('-o', '--output', type=click.File('w'), default="-",
+              help="file to write the module to, stdout by default.")
+def transpile(file, output):
+  """write the python module the py engine runs FILE as."""
+  with click.open_file(file, encoding="utf-8") as f:
+    source = f.read()
+  stmts = Parser(scanners["regex"](source).iter_tokens()).parse()
+  if not error_handler.had_error:
+    Resolver().resolve(stmts)
+  if error_handler.had_error:
+    raise click.exceptions.Exit(65)
+  output.write(Transpiler().module(stmts))
+
+# pipeline options chosen on the command line
+options = {
+  "lexer": "regex",
+  "parser": "pratt",
+  "lazy": False,
+  "disassemble": False,
+  "pipeline": False,
+  # Cache of resolved programs, None when caching is off
+  "cache": None,
+}
 
 def run_repl():
   """repl mode.
@@ -38,21 +141,92 @@ def run_repl():
 
 
 def run_file(file):
-  """interpret a file
+  """interpret a file, or stdin if file is `-`. the regex lexer streams it from
+  a read-only mmap (or the pipe) instead of reading it into one str.
   """
-  with open(file) as f:
-      run(f.read())
+  if file == "-":
+    source = sys.stdin.buffer
+    if options["lexer"] != "regex":
+      source = source.read().decode("utf-8")
+    run(source)
+    return
+  with open(file, "rb") as f:
+    if options["lexer"] == "regex" and os.fstat(f.fileno()).st_size:
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        run(source, cached=True)
+    else:
+      run(f.read().decode("utf-8"), cached=True)
 
 interpreter = Interpreter()
-def run(source: str):
+def run(source, cached=False):
   """interpret source code
+  :param source: source code str, or a file object / mmap for the regex lexer
+  :param cached: look the resolved program up in `options["cache"]` first, and
+      store it there after compiling
   """
-  tokens = Scanner(source).scan_tokens()
-  stmts = Parser(tokens).parse()
-  if error_handler.had_error: return
-  Resolver(interpreter).resolve(stmts)
+  if options["pipeline"]:
+    run_pipeline(source)
+    return
+  cache = options["cache"] if cached else None
+  if cache:
+    # lazy and eager programs differ, a lazy one defers the body diagnostics
+    key = cache.key(source, "lazy" if options["lazy"] else "")
+    stmts = cache.load(key)
+    if stmts is not None:
+      execute(stmts)
+      check_bodies(stmts)
+      return
+  tokens = scanners[options["lexer"]](source).iter_tokens()
+  stmts = Parser(tokens, pratt=options["parser"] == "pratt", lazy=options["lazy"]).parse()
   if error_handler.had_error: return
-  interpreter.interprete(stmts)
+  Resolver().resolve(stmts)
+  if not error_handler.had_error:
+    if cache:
+      cache.store(key, stmts)
+    execute(stmts)
+  check_bodies(stmts)
+
+def run_pipeline(source):
+  """interpret source one top level declaration at a time: each is scanned,
+  parsed, resolved and run before the next one is read. after an error the rest
+  is still parsed and resolved for diagnostics, but not run.
+  """
+  tokens = scanners[options["lexer"]](source).iter_tokens()
+  parser = Parser(tokens, pratt=options["parser"] == "pratt", lazy=options["lazy"])
+  resolver = Resolver()
+  failed = error_handler.had_error
+  # the lazily parsed functions, to check once the program ended
+  functions = []
+  for stmt in parser.iter_parse():
+    if stmt is None:
+      failed = True
+      continue
+    resolver.resolve([stmt])
+    if options["lazy"]:
+      functions.extend(lazy_functions([stmt]))
+    if failed or error_handler.had_error:
+      failed = True
+      continue
+    failed = not execute([stmt])
+  check_bodies(functions)
+
+def check_bodies(stmts):
+  """report the errors of the lazy function bodies no call parsed
+  """
+  if options["lazy"]:
+    Resolver.check_bodies(stmts)
+
+def execute(stmts) -> bool:
+  """interpret resolved statements
+  """
+  if isinstance(interpreter, FlatInterpreter):
+    # the object ast is not needed once it is flattened
+    stmts = interpreter.load(stmts)
+  if options["disassemble"]:
+    for chunk in interpreter.compile(stmts):
+      click.echo(disassemble(chunk), nl=False)
+    return True
+  return interpreter.interprete(stmts)
 
 
 if __name__ == "__main__":
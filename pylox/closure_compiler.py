@@ -0,0 +1,497 @@
+import operator
+from functools import partial
+from pylox.expr import ExprVisitor, Expr, Literal
+from pylox.stmt import StmtVisitor, Class, Function, Var
+from pylox.token import TokenType
+from pylox.error import RuntimeError
+from pylox.environment import Environment, Frame, Cell, UPVALUE, undefined, capture, new_frame, free_frame
+from pylox.lox_callable import LoxCallable, Clock
+from pylox.lox_class import LoxClass, LoxInstance
+from pylox.parser import LazyBody
+from pylox.resolver import Resolver
+from pylox.runtime import binary_operators, unary_operators
+
+# what a return statement without a value, or returning nil, results in.
+# statements result in None to go on with the next statement
+returned_nil = object()
+
+# number operators applied once both operands are checked to be numbers
+number_operators = {
+  TokenType.MINUS: operator.sub,
+  TokenType.SLASH: operator.truediv,
+  TokenType.STAR: operator.mul,
+  TokenType.GREATER: operator.gt,
+  TokenType.GREATER_EQUAL: operator.ge,
+  TokenType.LESS: operator.lt,
+  TokenType.LESS_EQUAL: operator.le,
+}
+
+class FunctionCode(object):
+  """a function declaration compiled once, shared by every closure created
+  from it. the body of a lazily parsed function is compiled on its first call.
+  """
+
+  def __init__(self, compiler, declaration, is_initializer: bool):
+    self.compiler = compiler
+    self.declaration = declaration
+    self.name = declaration.name.lexeme
+    self.arity = len(declaration.params)
+    self.is_initializer = is_initializer
+    # function(frame) running the statements of the body
+    self.body = None
+    # index and name of the params kept in a Cell
+    self.cells = ()
+    if not isinstance(declaration.body, LazyBody):
+      self.compile_body()
+
+  def compile_body(self):
+    declaration = self.declaration
+    if isinstance(declaration.body, LazyBody):
+      if Resolver.materialize(declaration) is None:
+        raise RuntimeError(declaration.name, "Function body has errors.")
+    self.cells = tuple((i, param.name.lexeme) for i, param in enumerate(declaration.params) if param.cell)
+    self.body = self.compiler.compile_scope(declaration.body.statements)
+
+class CompiledFunction(LoxCallable):
+  """a closure over FunctionCode
+  """
+
+  def __init__(self, code: FunctionCode, closure, upvalues):
+    self.code = code
+    # the frame holding this for a bound method
+    self.closure = closure
+    self.upvalues = upvalues
+
+  def call(self, interpreter, arguments):
+    return self.invoke(list(arguments))
+
+  def invoke(self, arguments: list):
+    """call with arguments, a list the call owns and keeps as its frame
+    """
+    code = self.code
+    if code.body is None:
+      code.compile_body()
+    for i, name in code.cells:
+      arguments[i] = Cell(name, arguments[i])
+    frame = new_frame(self.closure, self.upvalues)
+    frame.values = arguments
+    result = code.body(frame)
+    free_frame(frame)
+    if code.is_initializer:
+      return self.closure.values[0]
+    if result is returned_nil:
+      return None
+    return result
+
+  def bind(self, instance):
+    frame = Frame(None)
+    frame.values.append(instance)
+    return CompiledFunction(self.code, frame, self.upvalues)
+
+  def arity(self):
+    return self.code.arity
+
+  def __repr__(self):
+    return f"<fn {self.code.name}>"
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+  """compile resolved statements into python closures, one per node.
+
+  an expression becomes a function(frame) returning its value, a statement a
+  function(frame) returning None, or what a return statement in it returned.
+  operators, variable slots and the cells of globals are picked once, when
+  compiling, instead of on every evaluation.
+  """
+
+  def __init__(self, interpreter):
+    self.interpreter = interpreter
+    self.globals = interpreter.globals
+    # compiling the statements of a block or function, not global ones
+    self.local = False
+
+  def compile(self, node):
+    return self.dispatch[node.__class__](self, node)
+
+  def compile_scope(self, stmts):
+    """compile the statements of a function body or block
+    """
+    local, self.local = self.local, True
+    try:
+      return self.sequence([self.compile_stmt(stmt) for stmt in stmts])
+    finally:
+      self.local = local
+
+  def compile_stmt(self, stmt):
+    if isinstance(stmt, Expr):
+      # the increment of a desugared for loop
+      expression = self.compile(stmt)
+      def increment(frame):
+        expression(frame)
+      return increment
+    return self.compile(stmt)
+
+  @staticmethod
+  def sequence(stmts):
+    if len(stmts) == 1:
+      return stmts[0]
+    def run_sequence(frame):
+      for stmt in stmts:
+        result = stmt(frame)
+        if result is not None:
+          return result
+    return run_sequence
+
+  def load(self, expr, name: str):
+    """a function(frame) reading the variable expr resolved to
+    """
+    depth, slot = expr.depth, expr.slot
+    if depth is None:
+      cell = self.globals.cell(name)
+      def load_global(frame):
+        value = cell.value
+        if value is undefined:
+          raise RuntimeError(f'Undefined variable: {name}')
+        return value
+      return load_global
+    if expr.cell:
+      if depth == UPVALUE:
+        return lambda frame: frame.upvalues[slot].value
+      if depth == 0:
+        return lambda frame: frame.values[slot].value
+      return lambda frame: frame.get_at(depth, slot).value
+    if depth == UPVALUE:
+      return lambda frame: frame.upvalues[slot]
+    if depth == 0:
+      return lambda frame: frame.values[slot]
+    if depth == 1:
+      return lambda frame: frame.enclosing.values[slot]
+    return lambda frame: frame.get_at(depth, slot)
+
+  def define(self, name: str, boxed: bool):
+    """a function(frame, value) declaring a variable
+    """
+    if not self.local:
+      cell = self.globals.cell(name)
+      def define_global(frame, value):
+        cell.value = value
+      return define_global
+    if boxed:
+      return lambda frame, value: frame.values.append(Cell(name, value))
+    return lambda frame, value: frame.values.append(value)
+
+  def visit_assign_expr(self, expr):
+    value = self.compile(expr.value)
+    depth, slot, name = expr.depth, expr.slot, expr.name.lexeme
+    if depth is None:
+      cell = self.globals.cell(name)
+      def assign_global(frame):
+        result = value(frame)
+        if cell.value is undefined:
+          raise RuntimeError(f'Undefined variable: {name}')
+        cell.value = result
+        return result
+      return assign_global
+    if depth == UPVALUE:
+      def assign_upvalue(frame):
+        result = frame.upvalues[slot].value = value(frame)
+        return result
+      return assign_upvalue
+    if expr.cell:
+      def assign_cell(frame):
+        result = frame.get_at(depth, slot).value = value(frame)
+        return result
+      return assign_cell
+    if depth == 0:
+      def assign_local(frame):
+        result = frame.values[slot] = value(frame)
+        return result
+      return assign_local
+    def assign(frame):
+      result = value(frame)
+      frame.assign_at(depth, slot, result)
+      return result
+    return assign
+
+  def visit_binary_expr(self, expr):
+    operator_type = expr.operator.type
+    left = self.compile(expr.left)
+    if operator_type == TokenType.EQUAL_EQUAL:
+      right = self.compile(expr.right)
+      return lambda frame: left(frame) == right(frame)
+    if operator_type == TokenType.BANG_EQUAL:
+      right = self.compile(expr.right)
+      return lambda frame: not left(frame) == right(frame)
+    generic = binary_operators[operator_type]
+    if operator_type == TokenType.PLUS:
+      function = operator.add
+    else:
+      function = number_operators[operator_type]
+    if isinstance(expr.right, Literal) and expr.right.value.__class__ is float:
+      # e.g. n - 1, i < 10
+      constant = expr.right.value
+      def binary_constant(frame):
+        value = left(frame)
+        if value.__class__ is float:
+          return function(value, constant)
+        return generic(value, constant)
+      return binary_constant
+    right = self.compile(expr.right)
+    def binary(frame):
+      left_value = left(frame)
+      right_value = right(frame)
+      if left_value.__class__ is float and right_value.__class__ is float:
+        return function(left_value, right_value)
+      return generic(left_value, right_value)
+    return binary
+
+  def visit_call_expr(self, expr):
+    callee = self.compile(expr.callee)
+    arguments = [self.compile(argument) for argument in expr.arguments]
+    paren, count = expr.paren, len(arguments)
+    interpreter = self.interpreter
+    def call(frame):
+      function = callee(frame)
+      values = [argument(frame) for argument in arguments]
+      if function.__class__ is CompiledFunction:
+        if function.code.arity != count:
+          raise RuntimeError(paren, f"Expected {function.code.arity} arguments but got {count}.")
+        return function.invoke(values)
+      if not isinstance(function, LoxCallable):
+        raise RuntimeError(paren, "Can only call functions and classes.")
+      if count != function.arity():
+        raise RuntimeError(paren, f"Expected {function.arity()} arguments but got {count}.")
+      return function.call(interpreter, values)
+    return call
+
+  def visit_get_expr(self, expr):
+    obj, name = self.compile(expr.object), expr.name
+    def get(frame):
+      instance = obj(frame)
+      if isinstance(instance, LoxInstance):
+        return instance.get(name)
+      raise RuntimeError(name, "Only instances have properties.")
+    return get
+
+  def visit_grouping_expr(self, expr):
+    return self.compile(expr.expression)
+
+  def visit_literal_expr(self, expr):
+    value = expr.value
+    return lambda frame: value
+
+  def visit_logical_expr(self, expr):
+    left, right = self.compile(expr.left), self.compile(expr.right)
+    if expr.operator.type == TokenType.OR:
+      def logical_or(frame):
+        value = left(frame)
+        if value is None or value is False:
+          return right(frame)
+        return value
+      return logical_or
+    def logical_and(frame):
+      value = left(frame)
+      if value is None or value is False:
+        return value
+      return right(frame)
+    return logical_and
+
+  def visit_set_expr(self, expr):
+    obj, value, name = self.compile(expr.object), self.compile(expr.value), expr.name
+    lexeme = name.lexeme
+    def set_field(frame):
+      instance = obj(frame)
+      if isinstance(instance, LoxInstance):
+        result = value(frame)
+        instance.set(lexeme, result)
+        return result
+      raise RuntimeError(name, "Only instances have fields.")
+    return set_field
+
+  def visit_super_expr(self, expr):
+    superclass, this = self.load(expr, "super"), self.compile(expr.this)
+    method = expr.method
+    def super_method(frame):
+      bound = superclass(frame).find_method(this(frame), method.lexeme)
+      if not bound:
+        raise RuntimeError(method, f"Undefined property '{method.lexeme}'.")
+      return bound
+    return super_method
+
+  def visit_this_expr(self, expr):
+    return self.load(expr, "this")
+
+  def visit_unary_expr(self, expr):
+    right = self.compile(expr.right)
+    if expr.operator.type == TokenType.BANG:
+      def bang(frame):
+        value = right(frame)
+        return value is None or value is False
+      return bang
+    generic = unary_operators[expr.operator.type]
+    def negate(frame):
+      value = right(frame)
+      if value.__class__ is float:
+        return -value
+      return generic(value)
+    return negate
+
+  def visit_variable_expr(self, expr):
+    return self.load(expr, expr.name.lexeme)
+
+  def visit_block_stmt(self, stmt):
+    body = self.compile_scope(stmt.statements)
+    base = stmt.base
+    if base is None:
+      def block_frame(frame):
+        block_frame = new_frame(frame, frame.upvalues)
+        result = body(block_frame)
+        free_frame(block_frame)
+        return result
+      return block_frame
+    if not any(isinstance(s, (Var, Function, Class)) for s in stmt.statements):
+      return body
+    def block(frame):
+      result = body(frame)
+      # the next run of the block defines its variables in the same slots
+      del frame.values[base:]
+      return result
+    return block
+
+  def visit_class_stmt(self, stmt):
+    name = stmt.name.lexeme
+    superclass = self.compile(stmt.superclass) if stmt.superclass else None
+    superclass_name = stmt.superclass.name if stmt.superclass else None
+    methods = [(method.name.lexeme, self.function_factory(method, method.name.lexeme == "init"), method.upvalues)
+               for method in stmt.methods]
+    boxed = self.local and stmt.cell
+    define = self.define(name, False)
+    def declare_class(frame):
+      parent = None
+      if superclass is not None:
+        parent = superclass(frame)
+        if not isinstance(parent, LoxClass):
+          raise RuntimeError(superclass_name, "Superclass must be a class.")
+      environment = frame
+      if boxed:
+        cell = Cell(name)
+        define(frame, cell)
+      if parent is not None:
+        environment = Frame(frame, frame.upvalues)
+        environment.values.append(parent)
+      functions = {}
+      for method_name, factory, upvalues in methods:
+        functions[method_name] = factory(capture(upvalues, environment))
+      klass = LoxClass(name, parent, functions)
+      if boxed:
+        cell.value = klass
+      else:
+        define(frame, klass)
+    return declare_class
+
+  def visit_expression_stmt(self, stmt):
+    expression = self.compile(stmt.expression)
+    def expression_stmt(frame):
+      expression(frame)
+    return expression_stmt
+
+  def function_factory(self, declaration, is_initializer: bool):
+    """what creates the functions of a declaration from their captured upvalues
+    """
+    return partial(CompiledFunction, FunctionCode(self, declaration, is_initializer), None)
+
+  def visit_function_stmt(self, stmt):
+    factory = self.function_factory(stmt, False)
+    name, upvalues = stmt.name.lexeme, stmt.upvalues
+    define = self.define(name, False)
+    if self.local and stmt.cell:
+      # the function can call itself through the cell
+      def declare_boxed_function(frame):
+        cell = Cell(name)
+        define(frame, cell)
+        cell.value = factory(capture(upvalues, frame))
+      return declare_boxed_function
+    def declare_function(frame):
+      define(frame, factory(capture(upvalues, frame)))
+    return declare_function
+
+  def visit_if_stmt(self, stmt):
+    condition, then_branch = self.compile(stmt.condition), self.compile(stmt.thenBranch)
+    else_branch = self.compile(stmt.elseBranch) if stmt.elseBranch else None
+    if else_branch is None:
+      def if_then(frame):
+        value = condition(frame)
+        if not (value is None or value is False):
+          return then_branch(frame)
+      return if_then
+    def if_else(frame):
+      value = condition(frame)
+      if value is None or value is False:
+        return else_branch(frame)
+      return then_branch(frame)
+    return if_else
+
+  def visit_print_stmt(self, stmt):
+    expression = self.compile(stmt.expression)
+    def print_stmt(frame):
+      print(expression(frame))
+    return print_stmt
+
+  def visit_return_stmt(self, stmt):
+    if not stmt.value:
+      return lambda frame: returned_nil
+    value = self.compile(stmt.value)
+    def return_stmt(frame):
+      result = value(frame)
+      if result is None:
+        return returned_nil
+      return result
+    return return_stmt
+
+  def visit_var_stmt(self, stmt):
+    define = self.define(stmt.name.lexeme, stmt.cell)
+    if not stmt.initializer:
+      return lambda frame: define(frame, None)
+    initializer = self.compile(stmt.initializer)
+    def var(frame):
+      define(frame, initializer(frame))
+    return var
+
+  def visit_while_stmt(self, stmt):
+    condition, body = self.compile(stmt.condition), self.compile(stmt.body)
+    def while_stmt(frame):
+      while True:
+        value = condition(frame)
+        if value is None or value is False:
+          return
+        result = body(frame)
+        if result is not None:
+          return result
+    return while_stmt
+
+class ClosureInterpreter(object):
+  """compile resolved programs with `ClosureCompiler` and run them, with the
+  same semantics as `Interpreter`.
+  """
+
+  def __init__(self):
+    self.globals = Environment()
+    self.globals.define("clock", Clock())
+    self.compiler = ClosureCompiler(self)
+
+  def compile(self, stmts) -> list:
+    return [self.compiler.compile(stmt) for stmt in stmts]
+
+  def interprete(self, program):
+    """
+    :param program: resolved statements, or a list `compile` returned
+    """
+    if program and not callable(program[0]):
+      program = self.compile(program)
+    frame = self.globals
+    try:
+      for stmt in program:
+        stmt(frame)
+    except RuntimeError as e:
+      print(e)
+      return False
+    return True
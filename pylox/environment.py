@@ -1,48 +1,143 @@
 from pylox.error import RuntimeError
 from pylox.token import Token
 
+# value of a global declared nowhere yet
+undefined = object()
+
+# depth of a variable of an enclosing function, found in the upvalues of the
+# function using it. -1 is taken, it stands for no depth in a FlatAst
+UPVALUE = -2
+
+class Cell(object):
+  """a global variable. code compiled for one interpreter keeps the cells of
+  the globals it references, so reading or writing one is an attribute access.
+  a local captured by a closure and assigned after that lives in a cell too,
+  shared by its frame and the closures.
+  """
+  __slots__ = ("name", "value")
+
+  def __init__(self, name: str, value=undefined):
+    self.name = name
+    self.value = value
+
 class Environment:
-  def __init__(self, enclosing = None):
+  """the global scope, a cell by name for every global referenced or defined.
+  local scopes are `Frame`s, the resolver tells where their variables are.
+  """
+  __slots__ = ("values",)
+  # code at the top level is in no function, it captures nothing
+  upvalues = ()
+
+  def __init__(self):
     self.values = {}
-    self.enclosing: Environment = enclosing
+
+  def cell(self, name: str) -> Cell:
+    """the cell of a global, undefined until the global is defined
+    """
+    cell = self.values.get(name)
+    if cell is None:
+      cell = self.values[name] = Cell(name)
+    return cell
 
   def define(self, name: str, value):
-    self.values[name] = value
+    self.cell(name).value = value
 
   def assign(self, name: str, value):
-    """assign value to a variable in this environment or parent environment
-    """
-    if self.values.__contains__(name):
-      self.values[name] = value
-      return
-    if self.enclosing:
-      return self.enclosing.assign(name, value)
-    raise RuntimeError(f'Undefined variable: {name}')
+    self.assign_cell(self.cell(name), value)
 
   def get(self, token: Token):
-    """value can be in this environment or enclosing environment
-    """
-    if self.values.__contains__(token.lexeme):
-      return self.values[token.lexeme]
-    if self.enclosing:
-      return self.enclosing.get(token)
-    raise RuntimeError(f'Undefined variable: {token.lexeme}')
-
-  def get_at(self, distance, token: Token):
-    """use distance(hops count) to get variable's value.
-    """
-    return self.__ancestor(distance).values.get(token)
+    return self.get_cell(self.cell(token.lexeme))
+
+  @staticmethod
+  def assign_cell(cell: Cell, value):
+    if cell.value is undefined:
+      raise RuntimeError(f'Undefined variable: {cell.name}')
+    cell.value = value
 
-  def assign_at(self, distance, name: str, value):
-    """assign a value to a variable in the specific antecedent environment by distance(hops count)
+  @staticmethod
+  def get_cell(cell: Cell):
+    value = cell.value
+    if value is undefined:
+      raise RuntimeError(f'Undefined variable: {cell.name}')
+    return value
+
+class Frame:
+  """variables of a local scope in a list, by slot.
+  the resolver numbers the variables of a scope in declaration order, which is
+  the order they are defined in at runtime, so define appends.
+  frames of a function call end at the call, the variables of enclosing
+  functions its code uses are in `upvalues`, captured when the function was
+  created.
+
+  closures copy their upvalues out of the frames, so no frame outlives the
+  call or block it was made for, except the frame a bound method keeps this
+  in. `new_frame` and `free_frame` recycle them.
+  """
+  __slots__ = ("values", "enclosing", "upvalues")
+
+  def __init__(self, enclosing, upvalues=()):
+    self.values = []
+    self.enclosing = enclosing
+    self.upvalues = upvalues
+
+  def define(self, name: str, value):
+    self.values.append(value)
+
+  def get_at(self, distance: int, slot: int):
+    """use distance(hops count) and slot to get variable's value.
     """
-    self.__ancestor(distance).values[name] = value
+    frame = self
+    while distance:
+      frame = frame.enclosing
+      distance -= 1
+    return frame.values[slot]
 
-  def __ancestor(self, distance):
-    """get the specific antecedent environment by distance(hops count)
+  def assign_at(self, distance: int, slot: int, value):
+    """assign a value to a variable in the specific antecedent frame by distance(hops count)
     """
-    environment = self
-    for _ in range(0, distance):
-      environment = environment.enclosing
-    return environment
+    frame = self
+    while distance:
+      frame = frame.enclosing
+      distance -= 1
+    frame.values[slot] = value
+
+# frames of calls and blocks that ended, reused by the next ones
+free_frames = []
+# frames kept on the freelist, the ones a deep recursion returns beyond it are
+# left to be freed
+max_free_frames = 256
+
+def new_frame(enclosing, upvalues) -> Frame:
+  """a frame from the freelist, or a new one if it is empty
+  """
+  if free_frames:
+    frame = free_frames.pop()
+    frame.enclosing = enclosing
+    frame.upvalues = upvalues
+    return frame
+  return Frame(enclosing, upvalues)
+
+def free_frame(frame: Frame):
+  """put the frame of an ended call or block on the freelist. nothing may
+  refer to it any more.
+  """
+  if len(free_frames) < max_free_frames:
+    # keep no value alive through the freelist
+    frame.values.clear()
+    frame.enclosing = None
+    frame.upvalues = ()
+    free_frames.append(frame)
+
+def capture(upvalues, frame) -> tuple:
+  """the upvalues of a function created in frame, the value of each variable
+  it uses from enclosing functions, or its Cell if it is assigned.
 
+  :param upvalues: (depth, slot) of each variable, from the Function node
+  """
+  captured = []
+  for depth, slot in upvalues:
+    if depth == UPVALUE:
+      captured.append(frame.upvalues[slot])
+    else:
+      captured.append(frame.get_at(depth, slot))
+  return tuple(captured)
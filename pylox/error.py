@@ -1,12 +1,48 @@
+from contextlib import contextmanager
 from pylox.token import Token, TokenType
+
+class Diagnostic(object):
+  """an error reported to the ErrorHandler
+  """
+  __slots__ = ("line", "where", "message")
+
+  def __init__(self, line: int, where: str, message: str):
+    self.line = line
+    self.where = where
+    self.message = message
+
+  def __str__(self):
+    return f"[line{self.line}] Error. {self.where}: {self.message}"
+
+  def __repr__(self):
+    return f"Diagnostic({self.line!r}, {self.where!r}, {self.message!r})"
+
 class ErrorHandler(object):
   def __init__(self):
     self.had_error = False
+    # errors are collected here instead of printed while capturing
+    self.diagnostics = None
 
   def error(self, line: int, where: str = None, message: str = None):
-    print(f"[line{line}] Error. {where}: {message}")
+    if self.diagnostics is not None:
+      self.diagnostics.append(Diagnostic(line, where, message))
+    else:
+      print(f"[line{line}] Error. {where}: {message}")
     self.had_error = True
 
+  @contextmanager
+  def capture(self):
+    """collect the errors reported in the with block into the list it yields
+    instead of printing them. `had_error` is restored afterwards.
+    """
+    diagnostics, had_error = self.diagnostics, self.had_error
+    self.diagnostics = []
+    self.had_error = False
+    try:
+      yield self.diagnostics
+    finally:
+      self.diagnostics, self.had_error = diagnostics, had_error
+
   def parse_error(self, token: Token, message: str):
     if token.type == TokenType.EOF:
       self.error(token.line, " at end", message)
@@ -1,64 +1,58 @@
-from pylox.meta import ExprMeta, make_signature, add_signature
+from pylox.meta import ExprMeta, Visitor
 
 class Expr(metaclass=ExprMeta):
-  __signature__ = make_signature([])
+  _fields = ()
 
-  def __init__(self, *args, **kwargs):
-    bound = self.__signature__.bind(*args, **kwargs)
-    for name, val in bound.arguments.items():
-      setattr(self, name, val)
-
-@add_signature('name', 'value')
 class Assign(Expr):
-  pass
+  _fields = ('name', 'value')
+  # scopes between the use and the declaration, None for a global or UPVALUE
+  # for a variable of an enclosing function. slot is the index of the variable
+  # in the scope's frame or the function's upvalues, None for a global. cell
+  # tells a captured local is kept in a Cell
+  _attributes = ('depth', 'slot', 'cell')
 
-@add_signature('left', 'operator', 'right')
 class Binary(Expr):
-  pass
+  _fields = ('left', 'operator', 'right')
+  # index of the quickening Site of the node in `Interpreter.sites`
+  _attributes = ('site',)
 
-@add_signature('callee', 'paren', 'arguments')
 class Call(Expr):
-  pass
+  _fields = ('callee', 'paren', 'arguments')
 
-@add_signature('object', 'name')
 class Get(Expr):
-  pass
+  _fields = ('object', 'name')
 
-@add_signature('expression')
 class Grouping(Expr):
-  pass
+  _fields = ('expression',)
 
-@add_signature('value')
 class Literal(Expr):
-  pass
+  _fields = ('value',)
 
-@add_signature('left', 'operator', 'right')
 class Logical(Expr):
-  pass
+  _fields = ('left', 'operator', 'right')
 
-@add_signature('keyword', 'method')
 class Super(Expr):
-  pass
+  _fields = ('keyword', 'method')
+  # this is a This node resolved where the super expression is
+  _attributes = ('depth', 'slot', 'cell', 'this')
 
-@add_signature('object', 'name', 'value')
 class Set(Expr):
-  pass
+  _fields = ('object', 'name', 'value')
 
-@add_signature('keyword')
 class This(Expr):
-  pass
+  _fields = ('keyword',)
+  _attributes = ('depth', 'slot', 'cell')
 
-@add_signature('operator', 'right')
 class Unary(Expr):
-  pass
+  _fields = ('operator', 'right')
 
-@add_signature('name')
 class Variable(Expr):
-  pass
+  _fields = ('name',)
+  _attributes = ('depth', 'slot', 'cell')
 
 from abc import abstractmethod
 
-class ExprVisitor:
+class ExprVisitor(Visitor):
   @abstractmethod
   def visit_assign_expr(self, expr):
     raise NotImplementedError()
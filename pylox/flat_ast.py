@@ -0,0 +1,557 @@
+from array import array
+from pylox.expr import ExprVisitor, Assign, Binary, Call, Get, Grouping, Literal, Logical, Set, Super, This, Unary, Variable
+from pylox.stmt import StmtVisitor, Block, Class, Expression, Function, If, Print, Return, Var, While
+from pylox.token import Token, TokenType, token_types, token_type_codes
+from pylox.error import RuntimeError, ReturnValue
+from pylox.environment import Environment, Frame, Cell, UPVALUE, undefined, capture, new_frame, free_frame
+from pylox.lox_callable import LoxCallable, Clock
+from pylox.lox_class import LoxClass, LoxInstance
+from pylox.runtime import is_truthy, binary_operators, unary_operators
+
+# node class of each kind code
+node_kinds = (Assign, Binary, Call, Get, Grouping, Literal, Logical, Set, Super, This, Unary, Variable,
+              Block, Class, Expression, Function, If, Print, Return, Var, While)
+kind_codes = { node_cls: code for code, node_cls in enumerate(node_kinds) }
+
+# no node / token / resolved depth
+NONE = -1
+
+class FlatAst(object):
+  """an ast stored in typed arrays instead of one object per node.
+
+  a node is an index into the per node arrays: its kind code, its token and
+  up to three operands `a`, `b`, `c`. an operand is a child node, a token, a
+  constant or a list, depending on the kind (see `Flattener`). a list is an
+  index into `lists` holding the item count followed by the items. the depth
+  and slot the resolver found for a variable are kept in `depth` and `slot`,
+  the slot of a global is its name in `strings`. `cell` tells a declaration or
+  variable is kept in a Cell.
+
+  tokens are stored the same way, their lexemes as indices into `strings`.
+  only strings and literal constants are python objects, so a program costs a
+  few dozen bytes per node, and forked workers reading the arrays share their
+  pages instead of touching a refcount per node.
+  """
+
+  def __init__(self):
+    self.kind = array("B")
+    self.token = array("i")
+    self.a = array("i")
+    self.b = array("i")
+    self.c = array("i")
+    self.depth = array("i")
+    self.slot = array("i")
+    self.cell = array("B")
+    self.lists = array("i")
+    self.token_type = array("B")
+    self.token_lexeme = array("I")
+    self.token_line = array("I")
+    self.strings = []
+    self.constants = []
+    self.string_indices = {}
+    self.constant_indices = {}
+
+  def flatten(self, stmts) -> int:
+    """append a program, return the list of its statements
+    """
+    return Flattener(self).flatten(stmts)
+
+  def add_node(self, kind: int, depth: int = NONE, slot: int = NONE) -> int:
+    self.kind.append(kind)
+    self.token.append(NONE)
+    self.a.append(NONE)
+    self.b.append(NONE)
+    self.c.append(NONE)
+    self.depth.append(depth)
+    self.slot.append(slot)
+    self.cell.append(0)
+    return len(self.kind) - 1
+
+  def add_token(self, token: Token) -> int:
+    self.token_type.append(token_type_codes[token.type])
+    self.token_lexeme.append(self.add_string(token.lexeme))
+    self.token_line.append(token.line)
+    return len(self.token_type) - 1
+
+  def add_string(self, text: str) -> int:
+    index = self.string_indices.get(text)
+    if index is None:
+      index = self.string_indices[text] = len(self.strings)
+      self.strings.append(text)
+    return index
+
+  def add_constant(self, value) -> int:
+    # 1.0 == True, keep them apart
+    key = (type(value), value)
+    index = self.constant_indices.get(key)
+    if index is None:
+      index = self.constant_indices[key] = len(self.constants)
+      self.constants.append(value)
+    return index
+
+  def items(self, ref: int) -> range:
+    """indices into `lists` of the items of a list
+    """
+    return range(ref + 1, ref + 1 + self.lists[ref])
+
+  def name(self, token: int) -> str:
+    return self.strings[self.token_lexeme[token]]
+
+  def token_at(self, index: int) -> Token:
+    """materialize a token, for error messages and property access
+    """
+    token_type = token_types[self.token_type[index]]
+    lexeme = self.name(index)
+    literal = None
+    if token_type == TokenType.NUMBER:
+      literal = float(lexeme)
+    elif token_type == TokenType.STRING:
+      literal = lexeme[1:-1]
+    return Token(token_type, lexeme, literal, self.token_line[index])
+
+  def __len__(self):
+    return len(self.kind)
+
+class Flattener(ExprVisitor, StmtVisitor):
+  """append an object ast to a FlatAst.
+  nodes are numbered when first seen and filled in from a work list, so deep
+  trees need no recursion. operands of each kind:
+
+  * Assign: token name, a value
+  * Binary, Logical: token operator, a left, b right
+  * Call: token paren, a callee, b arguments list
+  * Get: token name, a object
+  * Grouping, Expression, Print: a expression
+  * Literal: a constant
+  * Set: token name, a object, b value
+  * Super: token keyword, a method token, b this
+  * This: token keyword
+  * Unary: token operator, a right
+  * Variable: token name
+  * Block: a statements list, b slot of its first variable in the frame around
+    it, NONE if it needs a frame of its own
+  * Class: token name, a superclass, b methods list
+  * Function: token name, a params list, b body statements list, c upvalues
+    list of depth, slot pairs
+  * If: a condition, b then branch, c else branch
+  * Return: token keyword, a value
+  * Var: token name, a initializer
+  * While: a condition, b body
+  """
+
+  def __init__(self, ast: FlatAst):
+    self.ast = ast
+    self.pending = []
+    self.index = NONE
+    # token object id to its index, tokens shared by nodes are stored once
+    self.tokens = {}
+
+  def flatten(self, stmts) -> int:
+    program = self.list(stmts)
+    dispatch = self.dispatch
+    while self.pending:
+      self.index, node = self.pending.pop()
+      dispatch[node.__class__](self, node)
+    return program
+
+  def node(self, node) -> int:
+    if node is None:
+      return NONE
+    depth = getattr(node, "depth", NONE)
+    if depth is None and isinstance(node, (Variable, Assign)):
+      index = self.ast.add_node(kind_codes[node.__class__], NONE, self.ast.add_string(node.name.lexeme))
+    elif depth is None or depth == NONE:
+      index = self.ast.add_node(kind_codes[node.__class__])
+    else:
+      index = self.ast.add_node(kind_codes[node.__class__], depth, node.slot)
+    if getattr(node, "cell", None):
+      self.ast.cell[index] = 1
+    self.pending.append((index, node))
+    return index
+
+  def list(self, nodes) -> int:
+    lists = self.ast.lists
+    ref = len(lists)
+    lists.append(len(nodes))
+    for node in nodes:
+      lists.append(self.node(node))
+    return ref
+
+  def ints(self, values) -> int:
+    lists = self.ast.lists
+    ref = len(lists)
+    lists.append(len(values))
+    lists.extend(values)
+    return ref
+
+  def token(self, token: Token) -> int:
+    index = self.tokens.get(id(token))
+    if index is None:
+      index = self.tokens[id(token)] = self.ast.add_token(token)
+    return index
+
+  def fill(self, token=NONE, a=NONE, b=NONE, c=NONE):
+    ast, index = self.ast, self.index
+    ast.token[index] = token
+    ast.a[index] = a
+    ast.b[index] = b
+    ast.c[index] = c
+
+  def visit_assign_expr(self, expr):
+    self.fill(self.token(expr.name), self.node(expr.value))
+
+  def visit_binary_expr(self, expr):
+    self.fill(self.token(expr.operator), self.node(expr.left), self.node(expr.right))
+
+  def visit_call_expr(self, expr):
+    self.fill(self.token(expr.paren), self.node(expr.callee), self.list(expr.arguments))
+
+  def visit_get_expr(self, expr):
+    self.fill(self.token(expr.name), self.node(expr.object))
+
+  def visit_grouping_expr(self, expr):
+    self.fill(a=self.node(expr.expression))
+
+  def visit_literal_expr(self, expr):
+    self.fill(a=self.ast.add_constant(expr.value))
+
+  def visit_logical_expr(self, expr):
+    self.fill(self.token(expr.operator), self.node(expr.left), self.node(expr.right))
+
+  def visit_set_expr(self, expr):
+    self.fill(self.token(expr.name), self.node(expr.object), self.node(expr.value))
+
+  def visit_super_expr(self, expr):
+    self.fill(self.token(expr.keyword), self.token(expr.method), self.node(expr.this))
+
+  def visit_this_expr(self, expr):
+    self.fill(self.token(expr.keyword))
+
+  def visit_unary_expr(self, expr):
+    self.fill(self.token(expr.operator), self.node(expr.right))
+
+  def visit_variable_expr(self, expr):
+    self.fill(self.token(expr.name))
+
+  def visit_block_stmt(self, stmt):
+    base = NONE if stmt.base is None else stmt.base
+    self.fill(a=self.list(stmt.statements), b=base)
+
+  def visit_class_stmt(self, stmt):
+    self.fill(self.token(stmt.name), self.node(stmt.superclass), self.list(stmt.methods))
+
+  def visit_expression_stmt(self, stmt):
+    self.fill(a=self.node(stmt.expression))
+
+  def visit_function_stmt(self, stmt):
+    upvalues = [n for upvalue in stmt.upvalues for n in upvalue]
+    self.fill(self.token(stmt.name), self.list(stmt.params), self.list(stmt.body.statements), self.ints(upvalues))
+
+  def visit_if_stmt(self, stmt):
+    self.fill(a=self.node(stmt.condition), b=self.node(stmt.thenBranch), c=self.node(stmt.elseBranch))
+
+  def visit_print_stmt(self, stmt):
+    self.fill(a=self.node(stmt.expression))
+
+  def visit_return_stmt(self, stmt):
+    self.fill(self.token(stmt.keyword), self.node(stmt.value))
+
+  def visit_var_stmt(self, stmt):
+    self.fill(self.token(stmt.name), self.node(stmt.initializer))
+
+  def visit_while_stmt(self, stmt):
+    self.fill(a=self.node(stmt.condition), b=self.node(stmt.body))
+
+class FlatFunction(LoxCallable):
+  """a function whose declaration is a Function node of a FlatAst
+  """
+
+  def __init__(self, ast: FlatAst, declaration: int, closure, is_initializer, upvalues=()):
+    self.ast = ast
+    self.declaration = declaration
+    self.closure = closure
+    self.is_initializer = is_initializer
+    self.upvalues = upvalues
+
+  def call(self, interpreter, arguments):
+    ast = self.ast
+    environment = new_frame(self.closure, self.upvalues)
+    for item, argument in zip(ast.items(ast.a[self.declaration]), arguments):
+      param = ast.lists[item]
+      if ast.cell[param]:
+        argument = Cell(ast.name(ast.token[param]), argument)
+      environment.define(ast.name(ast.token[param]), argument)
+    try:
+      interpreter.execute_block(ast.b[self.declaration], environment)
+    except ReturnValue as r:
+      free_frame(environment)
+      # initializer always return this
+      if self.is_initializer:
+        return self.closure.get_at(0, 0)
+      return r.value
+    free_frame(environment)
+    if self.is_initializer:
+      return self.closure.get_at(0, 0)
+
+  def bind(self, instance):
+    environment = Frame(None)
+    environment.define("this", instance)
+    return FlatFunction(self.ast, self.declaration, environment, self.is_initializer, self.upvalues)
+
+  def arity(self):
+    return self.ast.lists[self.ast.a[self.declaration]]
+
+  def __repr__(self):
+    return f"<fn {self.ast.name(self.ast.token[self.declaration])}>"
+
+class FlatInterpreter(object):
+  """interpret programs stored in a FlatAst, with the same semantics as
+  `Interpreter`. the resolver's depths are copied from the nodes into the ast
+  when a program is loaded.
+  """
+
+  def __init__(self):
+    self.globals = Environment()
+    self.environment = self.globals
+    self.globals.define("clock", Clock())
+    self.ast = FlatAst()
+    # cell of the global named by each of `ast.strings`, looked up on first use
+    self.cells = []
+    # kind code to the method evaluating or executing nodes of that kind
+    self.handlers = [getattr(self, node_cls.visit_name) for node_cls in node_kinds]
+
+  def load(self, stmts) -> int:
+    """flatten resolved statements into `self.ast`, return the program
+    """
+    program = self.ast.flatten(stmts)
+    self.cells.extend([None] * (len(self.ast.strings) - len(self.cells)))
+    return program
+
+  def interprete(self, program):
+    """
+    :param program: a program returned by `load`, or resolved statements
+    """
+    if not isinstance(program, int):
+      program = self.load(program)
+    try:
+      for item in self.ast.items(program):
+        self.execute(self.ast.lists[item])
+    except RuntimeError as e:
+      print(e)
+      return False
+    return True
+
+  def execute(self, node: int):
+    self.handlers[self.ast.kind[node]](node)
+
+  def evaluate(self, node: int):
+    return self.handlers[self.ast.kind[node]](node)
+
+  def execute_block(self, stmts: int, environment):
+    previous = self.environment
+    lists = self.ast.lists
+    try:
+      self.environment = environment
+      for item in self.ast.items(stmts):
+        self.execute(lists[item])
+    finally:
+      self.environment = previous
+
+  def visit_assign_expr(self, node):
+    ast = self.ast
+    value = self.evaluate(ast.a[node])
+    distance = ast.depth[node]
+    if distance == NONE:
+      self.globals.assign_cell(self.__global_cell(node), value)
+    elif distance == UPVALUE:
+      self.environment.upvalues[ast.slot[node]].value = value
+    elif ast.cell[node]:
+      self.environment.get_at(distance, ast.slot[node]).value = value
+    else:
+      self.environment.assign_at(distance, ast.slot[node], value)
+    return value
+
+  def visit_binary_expr(self, node):
+    ast = self.ast
+    left = self.evaluate(ast.a[node])
+    right = self.evaluate(ast.b[node])
+    return binary_operators[token_types[ast.token_type[ast.token[node]]]](left, right)
+
+  def visit_call_expr(self, node):
+    ast = self.ast
+    callee = self.evaluate(ast.a[node])
+    lists = ast.lists
+    arguments = [self.evaluate(lists[item]) for item in ast.items(ast.b[node])]
+    if not isinstance(callee, LoxCallable):
+      raise RuntimeError(ast.token_at(ast.token[node]), "Can only call functions and classes.")
+    if len(arguments) != callee.arity():
+      raise RuntimeError(ast.token_at(ast.token[node]), f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+    return callee.call(self, arguments)
+
+  def visit_get_expr(self, node):
+    ast = self.ast
+    obj = self.evaluate(ast.a[node])
+    if isinstance(obj, LoxInstance):
+      return obj.get(ast.token_at(ast.token[node]))
+    raise RuntimeError(ast.token_at(ast.token[node]), "Only instances have properties.")
+
+  def visit_grouping_expr(self, node):
+    return self.evaluate(self.ast.a[node])
+
+  def visit_literal_expr(self, node):
+    return self.ast.constants[self.ast.a[node]]
+
+  def visit_logical_expr(self, node):
+    ast = self.ast
+    left_value = self.evaluate(ast.a[node])
+    if token_types[ast.token_type[ast.token[node]]] == TokenType.OR:
+      if is_truthy(left_value):
+        return left_value
+    else:
+      if not is_truthy(left_value):
+        return left_value
+    return self.evaluate(ast.b[node])
+
+  def visit_set_expr(self, node):
+    ast = self.ast
+    obj = self.evaluate(ast.a[node])
+    if isinstance(obj, LoxInstance):
+      value = self.evaluate(ast.b[node])
+      obj.set(ast.name(ast.token[node]), value)
+      return value
+    raise RuntimeError(ast.token_at(ast.token[node]), "Only instances have fields.")
+
+  def visit_super_expr(self, node):
+    ast = self.ast
+    superclass = self.__lookup_variable(node)
+    instance = self.evaluate(ast.b[node])
+    method = superclass.find_method(instance, ast.name(ast.a[node]))
+    if not method:
+      raise RuntimeError(ast.token_at(ast.a[node]), f"Undefined property '{ast.name(ast.a[node])}'.")
+    return method
+
+  def visit_this_expr(self, node):
+    return self.__lookup_variable(node)
+
+  def visit_unary_expr(self, node):
+    ast = self.ast
+    right = self.evaluate(ast.a[node])
+    return unary_operators[token_types[ast.token_type[ast.token[node]]]](right)
+
+  def visit_variable_expr(self, node):
+    return self.__lookup_variable(node)
+
+  def __lookup_variable(self, node):
+    ast = self.ast
+    distance = ast.depth[node]
+    if distance != NONE:
+      if distance == UPVALUE:
+        value = self.environment.upvalues[ast.slot[node]]
+      else:
+        value = self.environment.get_at(distance, ast.slot[node])
+      if ast.cell[node]:
+        return value.value
+      return value
+    cell = self.cells[ast.slot[node]]
+    if cell is None:
+      cell = self.__global_cell(node)
+    value = cell.value
+    if value is undefined:
+      raise RuntimeError(f'Undefined variable: {cell.name}')
+    return value
+
+  def __global_cell(self, node: int):
+    name = self.ast.slot[node]
+    cell = self.cells[name]
+    if cell is None:
+      cell = self.cells[name] = self.globals.cell(self.ast.strings[name])
+    return cell
+
+  def __capture(self, function: int, environment) -> tuple:
+    ast = self.ast
+    upvalues = [ast.lists[item] for item in ast.items(ast.c[function])]
+    return capture(zip(upvalues[::2], upvalues[1::2]), environment)
+
+  def visit_block_stmt(self, node):
+    ast = self.ast
+    base = ast.b[node]
+    if base == NONE:
+      environment = new_frame(self.environment, self.environment.upvalues)
+      self.execute_block(ast.a[node], environment)
+      free_frame(environment)
+      return
+    lists = ast.lists
+    for item in ast.items(ast.a[node]):
+      self.execute(lists[item])
+    del self.environment.values[base:]
+
+  def visit_class_stmt(self, node):
+    ast = self.ast
+    superclass = None
+    if ast.a[node] != NONE:
+      superclass = self.evaluate(ast.a[node])
+      if not isinstance(superclass, LoxClass):
+        raise RuntimeError(ast.token_at(ast.token[ast.a[node]]), "Superclass must be a class.")
+    name = ast.name(ast.token[node])
+    environment = self.environment
+    if ast.cell[node]:
+      cell = Cell(name)
+      environment.define(name, cell)
+    if superclass is not None:
+      environment = Frame(environment, environment.upvalues)
+      environment.define("super", superclass)
+    methods = {}
+    for item in ast.items(ast.b[node]):
+      method = ast.lists[item]
+      method_name = ast.name(ast.token[method])
+      methods[method_name] = FlatFunction(ast, method, None, method_name == "init",
+                                          self.__capture(method, environment))
+    klass = LoxClass(name, superclass, methods)
+    if ast.cell[node]:
+      cell.value = klass
+    else:
+      self.environment.define(name, klass)
+
+  def visit_expression_stmt(self, node):
+    self.evaluate(self.ast.a[node])
+
+  def visit_function_stmt(self, node):
+    environment = self.environment
+    name = self.ast.name(self.ast.token[node])
+    if self.ast.cell[node]:
+      cell = Cell(name)
+      environment.define(name, cell)
+      cell.value = FlatFunction(self.ast, node, None, False, self.__capture(node, environment))
+    else:
+      func = FlatFunction(self.ast, node, None, False, self.__capture(node, environment))
+      environment.define(name, func)
+
+  def visit_if_stmt(self, node):
+    ast = self.ast
+    if is_truthy(self.evaluate(ast.a[node])):
+      self.execute(ast.b[node])
+    elif ast.c[node] != NONE:
+      self.execute(ast.c[node])
+
+  def visit_print_stmt(self, node):
+    print(self.evaluate(self.ast.a[node]))
+
+  def visit_return_stmt(self, node):
+    value = None
+    if self.ast.a[node] != NONE:
+      value = self.evaluate(self.ast.a[node])
+    raise ReturnValue(value)
+
+  def visit_var_stmt(self, node):
+    ast = self.ast
+    value = None
+    if ast.a[node] != NONE:
+      value = self.evaluate(ast.a[node])
+    if ast.cell[node]:
+      value = Cell(ast.name(ast.token[node]), value)
+    self.environment.define(ast.name(ast.token[node]), value)
+
+  def visit_while_stmt(self, node):
+    ast = self.ast
+    while is_truthy(self.evaluate(ast.a[node])):
+      self.execute(ast.b[node])
@@ -0,0 +1,197 @@
+from bisect import bisect_right
+from typing import List
+from pylox.token import TokenType
+from pylox.error import Diagnostic, error_handler
+from pylox.scanner import RegexScanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+
+class Segment(object):
+  """one top level declaration of a Document, with the source from its first
+  token up to the first token of the next one.
+
+  lines in its diagnostics are relative to the line the segment starts at, its
+  tokens have the lines of a segment starting at `base`. so a segment is reused
+  as is when an edit before it adds or removes lines, the lines of its tokens
+  are only shifted when its statement is handed out.
+  """
+  __slots__ = ("head", "stmt", "diagnostics", "tokens", "base")
+
+  def __init__(self):
+    # chars from the segment start to the end of its first token
+    self.head = 0
+    # the declaration, None if it has a parse error
+    self.stmt = None
+    self.diagnostics: List[Diagnostic] = []
+    self.tokens = []
+    # the line the segment started at when the lines of its tokens were set
+    self.base = 0
+
+  def move_to(self, line: int):
+    """give the tokens the lines of the segment starting at line
+    """
+    delta = line - self.base
+    if delta:
+      for token in self.tokens:
+        token.line += delta
+      self.base = line
+
+class Document(object):
+  """a source file analyzed for tooling, kept up to date under edits.
+
+  the source is split into top level declarations. globals are not resolved
+  statically, so a top level declaration resolves the same wherever it is,
+  and an edit only re-lexes, re-parses and re-resolves the declarations it
+  touches. parsing goes on past them until a declaration ends where an old
+  one started, from there on the old segments are reused.
+  """
+
+  def __init__(self, source: str, pratt: bool = True):
+    self.source = source
+    self.pratt = pratt
+    self.segments: List[Segment] = []
+    # offset and line each segment starts at. like the gap of a gap buffer,
+    # the ones from index __gap on are still to be shifted by __gap_chars and
+    # __gap_lines, so an edit only shifts the segments between it and the
+    # edit before instead of every segment after it
+    self.__starts: List[int] = []
+    self.__lines: List[int] = []
+    self.__gap = 0
+    self.__gap_chars = 0
+    self.__gap_lines = 0
+    self.__analyze(0, 0, 1, 0, 0)
+
+  @property
+  def starts(self) -> List[int]:
+    """offset each segment starts at
+    """
+    self.__move_gap(len(self.segments))
+    return self.__starts
+
+  @property
+  def lines(self) -> List[int]:
+    """line each segment starts at
+    """
+    self.__move_gap(len(self.segments))
+    return self.__lines
+
+  @property
+  def statements(self):
+    """the declarations, their tokens with absolute lines
+    """
+    for segment, line in zip(self.segments, self.lines):
+      segment.move_to(line)
+    return [segment.stmt for segment in self.segments]
+
+  @property
+  def diagnostics(self) -> List[Diagnostic]:
+    """errors of the whole document, with absolute lines
+    """
+    return [Diagnostic(line + diagnostic.line, diagnostic.where, diagnostic.message)
+            for segment, line in zip(self.segments, self.lines)
+            for diagnostic in segment.diagnostics]
+
+  def edit(self, start: int, end: int, text: str) -> range:
+    """replace source[start:end] with text.
+    return the indices of the segments analyzed again, the others are reused.
+    """
+    self.source = self.source[:start] + text + self.source[end:]
+    delta = len(text) - (end - start)
+    if not self.segments:
+      return self.__analyze(0, 0, 1, end, delta)
+    # the segment ending right before the edit is analyzed again too, in case
+    # the edit continues its last token
+    starts, gap = self.__starts, self.__gap
+    first = bisect_right(starts, start - 1, 0, gap) - 1
+    if first == gap - 1:
+      first = bisect_right(starts, start - 1 - self.__gap_chars, gap) - 1
+    first = max(first, 0)
+    self.__move_gap(first + 1)
+    if first > 0 and start <= starts[first] + self.segments[first].head:
+      # where the declaration before ends depends on the first token of this one
+      first -= 1
+    self.__move_gap(first)
+    return self.__analyze(first, starts[first] + self.__gap_chars,
+                          self.__lines[first] + self.__gap_lines, end, delta)
+
+  def __move_gap(self, index: int):
+    """shift the segments between the gap and index, so the ones before index
+    are up to date and the ones from index on are not
+    """
+    gap, chars, lines = self.__gap, self.__gap_chars, self.__gap_lines
+    if index > gap:
+      self.__starts[gap:index] = [start + chars for start in self.__starts[gap:index]]
+      self.__lines[gap:index] = [line + lines for line in self.__lines[gap:index]]
+    elif index < gap:
+      self.__starts[index:gap] = [start - chars for start in self.__starts[index:gap]]
+      self.__lines[index:gap] = [line - lines for line in self.__lines[index:gap]]
+    self.__gap = index
+
+  def __analyze(self, first: int, start: int, line: int, old_end: int, delta: int) -> range:
+    """analyze the source from segment `first`, the gap, on, which starts at
+    offset start on line. old segments starting at or after old_end, shifted by
+    delta, are reused once a new segment starts where one of them did.
+    """
+    old, old_starts, old_lines = self.segments, self.__starts, self.__lines
+    # old segments are behind by these, see __move_gap
+    chars, lines = self.__gap_chars, self.__gap_lines
+    reused = len(old)
+    new, new_starts, new_lines = [], [], []
+    scanner = RegexScanner(self.source)
+    scanner.line = line
+    # every token scanned and its offset, parser.current indexes them too
+    tokens = []
+    starts = []
+    def spans():
+      for token, offset in scanner.iter_token_spans(start):
+        tokens.append(token)
+        starts.append(offset)
+        yield token
+    parser = Parser(spans(), self.pratt)
+    declarations = parser.iter_parse()
+    with error_handler.capture() as diagnostics:
+      segment, line = Segment(), line
+      while parser.tokens[parser.current].type != TokenType.EOF:
+        first_token, reported = parser.current, len(diagnostics)
+        segment.head = starts[first_token] + len(tokens[first_token].lexeme) - start
+        segment.stmt = next(declarations)
+        # scan up to the next declaration, errors in between are this one's
+        next_token = parser.tokens[parser.current]
+        if segment.stmt is not None and len(diagnostics) == reported:
+          # a tree with parse errors can have holes the resolver trips on
+          Resolver().resolve([segment.stmt])
+        segment.tokens = tokens[first_token:parser.current]
+        segment.base = line
+        for diagnostic in diagnostics[reported:]:
+          diagnostic.line -= line
+          segment.diagnostics.append(diagnostic)
+        new.append(segment)
+        new_starts.append(start)
+        new_lines.append(line)
+        offset = starts[parser.current]
+        # a string token has the line it ends on
+        next_line = next_token.line - next_token.lexeme.count("\n")
+        if offset >= old_end + delta:
+          index = bisect_right(old_starts, offset - delta - chars, first) - 1
+          if index >= first and old_starts[index] + chars == offset - delta:
+            reused = index
+            # the reused segments are behind by these now, see __move_gap
+            chars += delta
+            lines = next_line - old_lines[index]
+            break
+        segment, start, line = Segment(), offset, next_line
+      else:
+        if not new and diagnostics:
+          # errors in a document of blanks and comments only
+          for diagnostic in diagnostics:
+            diagnostic.line -= line
+          segment.diagnostics = diagnostics[:]
+          new.append(segment)
+          new_starts.append(start)
+          new_lines.append(line)
+    self.segments[first:reused] = new
+    old_starts[first:reused] = new_starts
+    old_lines[first:reused] = new_lines
+    self.__gap = first + len(new)
+    self.__gap_chars, self.__gap_lines = chars, lines
+    return range(first, first + len(new))
@@ -2,21 +2,27 @@ from pylox.expr import ExprVisitor
 from pylox.stmt import StmtVisitor
 from pylox.token import Token, TokenType
 from pylox.error import RuntimeError, ReturnValue
-from pylox.environment import Environment
+from pylox.environment import Environment, Frame, Cell, UPVALUE, undefined, capture, new_frame, free_frame
 from pylox.lox_callable import LoxCallable, Clock
 from pylox.lox_function import LoxFunction
 from pylox.lox_class import LoxClass, LoxInstance
+from pylox.quickening import Site, report
 
 class Interpreter(ExprVisitor, StmtVisitor):
   """interpret the ast tree.
   it implement ExprVisitor and StmtVisitor visitor interface.
   """
 
+  # class of the functions and methods declarations create
+  function_class = LoxFunction
+
   def __init__(self):
     self.globals = Environment()
     self.environment = self.globals
     self.globals.define("clock", Clock())
-    self.locals = {}
+    # quickening Site of each Binary node evaluated, at the index the resolver
+    # gave the node, see `pylox.quickening`. None for the others
+    self.sites = []
 
   def interprete(self, stmts):
     try:
@@ -24,61 +30,50 @@ class Interpreter(ExprVisitor, StmtVisitor):
         self.execute(stmt)
     except RuntimeError as e:
       print(e)
+      return False
+    return True
 
-  def execute(self, stmt):
-    stmt.accept(self)
+  def stats(self) -> str:
+    """how the binary operators evaluated so far specialized
+    """
+    return report(site for site in self.sites if site is not None)
 
-  def resolve(self, expr, depth:int):
-    self.locals[expr] = depth
+  def execute(self, stmt):
+    self.dispatch[stmt.__class__](self, stmt)
 
   def evaluate(self, expr):
-    return expr.accept(self)
+    return self.dispatch[expr.__class__](self, expr)
 
   def visit_assign_expr(self, expr):
     value = self.evaluate(expr.value)
-    distance = self.locals.get(expr)
-    if distance:
-      self.environment.assign_at(distance, expr.name.lexeme, value)
-    else:
+    distance = expr.depth
+    if distance is None:
       self.globals.assign(expr.name.lexeme, value)
+    elif distance == UPVALUE:
+      self.environment.upvalues[expr.slot].value = value
+    elif expr.cell:
+      self.environment.get_at(distance, expr.slot).value = value
+    else:
+      self.environment.assign_at(distance, expr.slot, value)
     return value
 
   def visit_binary_expr(self, expr):
     left = self.evaluate(expr.left)
     right = self.evaluate(expr.right)
-    operator_type = expr.operator.type
-    if operator_type == TokenType.MINUS:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) - float(right)
-    elif operator_type == TokenType.SLASH:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) / float(right)
-    elif operator_type == TokenType.STAR:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) * float(right)
-    elif operator_type == TokenType.PLUS:
-      if isinstance(left, float) and isinstance(right, float):
-        return float(left) + float(right)
-      if (isinstance(left, str) or isinstance(left, float)) and (isinstance(right, str), isinstance(right, float)):
-        return str(left)+str(right)
-      raise RuntimeError("Operand must be number or string")
-    elif operator_type == TokenType.GREATER:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) > float(right)
-    elif operator_type == TokenType.GREATER_EQUAL:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) >= float(right)
-    elif operator_type == TokenType.LESS:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) < float(right)
-    elif operator_type == TokenType.LESS_EQUAL:
-      self.__check_number_operands(expr.operator, left, right)
-      return float(left) <= float(right)
-    elif operator_type == TokenType.BANG_EQUAL:
-      return not left == right
-    elif operator_type == TokenType.EQUAL_EQUAL:
-      return left == right
-    return None
+    try:
+      site = self.sites[expr.site]
+    except IndexError:
+      site = None
+    if site is None:
+      site = self.new_site(expr)
+    return site.apply(left, right)
+
+  def new_site(self, expr) -> Site:
+    sites = self.sites
+    if len(sites) <= expr.site:
+      sites.extend([None] * (expr.site + 1 - len(sites)))
+    site = sites[expr.site] = Site(expr.operator)
+    return site
 
   def visit_call_expr(self, expr):
     callee = self.evaluate(expr.callee)
@@ -121,9 +116,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
     raise RuntimeError(expr.name, "Only instances have fields.")
 
   def visit_super_expr(self, expr):
-    distance = self.locals.get(expr)
-    superclass: LoxClass = self.environment.get_at(distance, "super")
-    instance: LoxInstance = self.environment.get_at(distance - 1, "this")
+    superclass: LoxClass = self.__lookup_variable(expr.keyword, expr)
+    instance: LoxInstance = self.evaluate(expr.this)
     method = superclass.find_method(instance, expr.method.lexeme)
     if not method:
       raise RuntimeError(expr.method, f"Undefined property '{expr.method.lexeme}'.")
@@ -145,11 +139,20 @@ class Interpreter(ExprVisitor, StmtVisitor):
     return self.__lookup_variable(expr.name, expr)
 
   def __lookup_variable(self, token, expr):
-    distance = self.locals.get(expr)
+    distance = expr.depth
     if distance is not None:
-      return self.environment.get_at(distance, token.lexeme)
-    else:
-      return self.globals.get(token)
+      if distance == UPVALUE:
+        value = self.environment.upvalues[expr.slot]
+      else:
+        value = self.environment.get_at(distance, expr.slot)
+      if expr.cell:
+        return value.value
+      return value
+    # globals are looked up by name, a tree can be run by several interpreters
+    cell = self.globals.values.get(token.lexeme)
+    if cell is None or cell.value is undefined:
+      raise RuntimeError(f'Undefined variable: {token.lexeme}')
+    return cell.value
 
   def visit_print_stmt(self, stmt):
     value = self.evaluate(stmt.expression)
@@ -165,8 +168,16 @@ class Interpreter(ExprVisitor, StmtVisitor):
       self.environment = previous
 
   def visit_block_stmt(self, stmt):
-    block_environment = Environment(enclosing=self.environment)
-    self.execute_block(stmt.statements, block_environment)
+    base = stmt.base
+    if base is None:
+      block_environment = new_frame(self.environment, self.environment.upvalues)
+      self.execute_block(stmt.statements, block_environment)
+      free_frame(block_environment)
+      return
+    for s in stmt.statements:
+      self.execute(s)
+    # the next run of the block defines its variables in the same slots
+    del self.environment.values[base:]
 
   def visit_class_stmt(self, stmt):
     superclass = None
@@ -175,25 +186,37 @@ class Interpreter(ExprVisitor, StmtVisitor):
       if not isinstance(superclass, LoxClass):
         raise RuntimeError(stmt.superclass.name, "Superclass must be a class.")
     lexeme = stmt.name.lexeme
-    self.environment.define(lexeme, None)
+    environment = self.environment
+    if stmt.cell:
+      # methods capture the cell before the class is in it
+      cell = Cell(lexeme)
+      environment.define(lexeme, cell)
     if stmt.superclass:
-      self.environment = Environment(self.environment)
-      self.environment.define("super", superclass)
+      environment = Frame(environment, environment.upvalues)
+      environment.define("super", superclass)
     methods = {}
     for method in stmt.methods:
-      function = LoxFunction(method, self.environment, method.name.lexeme == "init")
+      function = self.function_class(method, None, method.name.lexeme == "init", capture(method.upvalues, environment))
       methods[method.name.lexeme] = function
     klass = LoxClass(lexeme, superclass, methods)
-    if stmt.superclass:
-      self.environment = self.environment.enclosing
-    self.environment.assign(lexeme, klass)
+    if stmt.cell:
+      cell.value = klass
+    else:
+      self.environment.define(lexeme, klass)
 
   def visit_expression_stmt(self, stmt):
     self.evaluate(stmt.expression)
 
   def visit_function_stmt(self, stmt):
-    func = LoxFunction(stmt, self.environment, False)
-    self.environment.define(stmt.name.lexeme, func)
+    environment = self.environment
+    if stmt.cell:
+      # the function can call itself through the cell
+      cell = Cell(stmt.name.lexeme)
+      environment.define(stmt.name.lexeme, cell)
+      cell.value = self.function_class(stmt, None, False, capture(stmt.upvalues, environment))
+    else:
+      func = self.function_class(stmt, None, False, capture(stmt.upvalues, environment))
+      environment.define(stmt.name.lexeme, func)
 
   def visit_if_stmt(self, stmt):
     c = self.evaluate(stmt.condition)
@@ -216,6 +239,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
     value = None
     if stmt.initializer:
       value = self.evaluate(stmt.initializer)
+    if stmt.cell:
+      value = Cell(stmt.name.lexeme, value)
     self.environment.define(stmt.name.lexeme, value)
 
   def __is_truthy(self, obj):
@@ -28,14 +28,18 @@ class LoxClass(LoxCallable):
   def find_method(self, instance, name: str):
     """method can be in this class or super class.
     """
-    if self.methods.__contains__(name):
-      return self.methods[name].bind(instance)
+    method = self.methods.get(name)
+    if method is not None:
+      return method.bind(instance)
     if self.superclass:
       return self.superclass.find_method(instance, name)
 
   def __repr__(self):
     return self.name
 
+# marks a field lookup miss, fields can hold None (nil)
+missing = object()
+
 class LoxInstance:
 
   def __init__(self, klass):
@@ -45,8 +49,9 @@ class LoxInstance:
   def get(self, token: Token):
     """get field or method
     """
-    if self.fields.__contains__(token.lexeme):
-      return self.fields[token.lexeme]
+    value = self.fields.get(token.lexeme, missing)
+    if value is not missing:
+      return value
     method = self.klass.find_method(self, token.lexeme)
     if method: return method
     raise RuntimeError(f'Undefined property: {token.lexeme}')
@@ -1,37 +1,53 @@
 from pylox.lox_callable import LoxCallable
-from pylox.environment import Environment
-from pylox.error import ReturnValue
+from pylox.environment import Frame, Cell, new_frame, free_frame
+from pylox.error import RuntimeError, ReturnValue
+from pylox.parser import LazyBody
+from pylox.resolver import Resolver
 
 class LoxFunction(LoxCallable):
 
-  def __init__(self, func_declaration, closure, is_initializer):
+  def __init__(self, func_declaration, closure, is_initializer, upvalues=()):
+    """
+    :param closure: frame holding this for a bound method, None otherwise
+    :param upvalues: variables of enclosing functions it uses, see `environment.capture`
+    """
     self.declaration = func_declaration
     self.closure = closure
     self.is_initializer = is_initializer
+    self.upvalues = upvalues
 
   def call(self, interpreter, arguments):
     """create environment dynamicly for each function call.
     """
-    environment = Environment(self.closure)
+    body = self.declaration.body
+    if isinstance(body, LazyBody):
+      body = Resolver.materialize(self.declaration)
+      if body is None:
+        raise RuntimeError(self.declaration.name, "Function body has errors.")
+    environment = new_frame(self.closure, self.upvalues)
     for param, argument in zip(self.declaration.params, arguments):
+      if param.cell:
+        argument = Cell(param.name.lexeme, argument)
       environment.define(param.name.lexeme, argument)
     try:
-      interpreter.execute_block(self.declaration.body.statements, environment)
+      interpreter.execute_block(body.statements, environment)
     except ReturnValue as r:
+      free_frame(environment)
       # initializer always return this
       if self.is_initializer:
-        return self.closure.get_at(0, "this")
+        return self.closure.get_at(0, 0)
       return r.value
+    free_frame(environment)
     if self.is_initializer:
-      return self.closure.get_at(0, "this")
+      return self.closure.get_at(0, 0)
 
   def bind(self, instance):
     """bind current function to a specific instance.
     define this keyword in parent environment.
     """
-    environment = Environment(self.closure)
+    environment = Frame(None)
     environment.define("this", instance)
-    return LoxFunction(self.declaration, environment, self.is_initializer)
+    return self.__class__(self.declaration, environment, self.is_initializer, self.upvalues)
 
   def arity(self):
     """function's arguments count.
@@ -7,32 +7,100 @@ def make_signature(names):
     for name in names
   )
 
+def make_init(names, attributes=()):
+  """generate a plain `__init__` assigning its positional (or keyword) arguments
+  to the fields of the same names, and None to the attributes
+  """
+  params = "".join(f", {name}" for name in names)
+  body = "".join(f"\n  self.{name} = {name}" for name in names)
+  body += "".join(f"\n  self.{name} = None" for name in attributes)
+  body = body or "\n  pass"
+  namespace = {}
+  exec(f"def __init__(self{params}):{body}\n", namespace)
+  return namespace["__init__"]
+
 def add_signature(*names):
-  """decorator for adding parameter signature for class
+  """decorator for adding parameter signature for class.
+  slots can only be declared when a class is created, so the class is created
+  again with `_fields = names`, prefer declaring `_fields` in the class body.
   """
   def decorate(cls):
-    cls.__signature__ = make_signature(names)
-    return cls
+    clsdict = {key: value for key, value in cls.__dict__.items()
+               if key not in ("__dict__", "__weakref__")}
+    clsdict["_fields"] = names
+    return type(cls)(cls.__name__, cls.__bases__, clsdict)
   return decorate
 
-class ExprMeta(type):
-  """metaclass for expr classes
+class NodeMeta(type):
+  """metaclass for ast node classes.
+  a class declaring `_fields` gets them as `__slots__` (so nodes have no
+  `__dict__`), a generated positional `__init__` and a matching `__signature__`.
+  `_attributes` are slots too, for data later passes attach to a node, e.g. the
+  resolver's depth. they are not in the signature and start as None.
   """
+  # every node class with a `visit_name`, in creation order
+  node_classes = []
+
   def __new__(cls, name, bases, clsdict):
+    fields = clsdict.get("_fields")
+    if fields is not None:
+      fields = tuple(fields)
+      attributes = tuple(clsdict.setdefault("_attributes", ()))
+      clsdict["__slots__"] = fields + attributes
+      clsdict["__signature__"] = make_signature(fields)
+      clsdict["__init__"] = make_init(fields, attributes)
     clsobj = super().__new__(cls, name, bases, clsdict)
-    def accept(self, vistor):
-      visit_callable = getattr(vistor, f"visit_{name.lower()}_expr")
-      return visit_callable(self)
-    setattr(clsobj, "accept", accept)
+    if "visit_name" in clsdict:
+      NodeMeta.node_classes.append(clsobj)
     return clsobj
 
-class StmtMeta(type):
+def accept(self, visitor):
+  """visit this node, also works for visitors not derived from `Visitor`
+  """
+  return getattr(visitor, self.visit_name)(self)
+
+class ExprMeta(NodeMeta):
+  """metaclass for expr classes
+  """
+  def __new__(cls, name, bases, clsdict):
+    clsdict.setdefault("visit_name", f"visit_{name.lower()}_expr")
+    clsdict.setdefault("accept", accept)
+    return super().__new__(cls, name, bases, clsdict)
+
+class StmtMeta(NodeMeta):
   """metaclass for stmt classes
   """
   def __new__(cls, name, bases, clsdict):
-    clsobj = super().__new__(cls, name, bases, clsdict)
-    def accept(self, vistor):
-      visit_callable = getattr(vistor, f"visit_{name.lower()}_stmt")
-      return visit_callable(self)
-    setattr(clsobj, "accept", accept)
-    return clsobj
\ No newline at end of file
+    clsdict.setdefault("visit_name", f"visit_{name.lower()}_stmt")
+    clsdict.setdefault("accept", accept)
+    return super().__new__(cls, name, bases, clsdict)
+
+class DispatchTable(dict):
+  """node class -> unbound visit method of one visitor class.
+  node classes created after the visitor class are looked up on first use, a
+  node class without a visit method of its own is visited as its base class.
+  """
+  def __init__(self, visitor_cls):
+    super().__init__()
+    self.visitor_cls = visitor_cls
+
+  def __missing__(self, node_cls):
+    for base in node_cls.__mro__:
+      visit = getattr(self.visitor_cls, getattr(base, "visit_name", ""), None)
+      if visit is not None:
+        self[node_cls] = visit
+        return visit
+    raise AttributeError(f"{self.visitor_cls.__name__} has no {node_cls.visit_name}")
+
+class Visitor:
+  """base class of ast visitors.
+  every visitor class gets its own `dispatch` table, built once when the class
+  is created, so visiting a node is one dict lookup plus a call:
+  `self.dispatch[node.__class__](self, node)`.
+  """
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+    cls.dispatch = DispatchTable(cls)
+    for node_cls in NodeMeta.node_classes:
+      if hasattr(cls, node_cls.visit_name):
+        cls.dispatch[node_cls]
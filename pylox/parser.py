@@ -1,26 +1,106 @@
 from typing import List
-from pylox.token import Token, TokenType
+from enum import IntEnum
+from pylox.token import Token, TokenType, TokenStream
 from pylox.expr import Expr, Binary, Unary, Literal, Grouping, Variable, Assign, Logical, Call, Get, Set, This, Super
-from pylox.stmt import Print, Expression, Var, Block, If, While, Function, Return, Class
+from pylox.stmt import Stmt, Print, Expression, Var, Block, If, While, Function, Return, Class
 from pylox.error import ParseError, error_handler
 
+class Precedence(IntEnum):
+  """binding power of infix operators, for the pratt expression parser
+  """
+  NONE = 0
+  ASSIGNMENT = 1
+  OR = 2
+  AND = 3
+  EQUALITY = 4
+  COMPARISON = 5
+  ADDITION = 6
+  MULTIPLICATION = 7
+  UNARY = 8
+  CALL = 9
+
+class Pending(IntEnum):
+  """operators of the pratt expression parser, pending while their right hand
+  side operand is parsed
+  """
+  UNARY = 0
+  GROUPING = 1
+  BINARY = 2
+  LOGICAL = 3
+  ASSIGNMENT = 4
+  CALL = 5
+  GET = 6
+
 class Parser:
-  """A recursive descent parser for lox lang
+  """A recursive descent parser for lox lang.
+  it does not recurse on the python stack though, so arbitrarily deep code can
+  be parsed: statement rules are generators which yield the nested rules they
+  need, driven by an explicit stack in `__run`, and the pratt expression parser
+  keeps its pending operators on an explicit stack. only the precedence chain
+  expression parser (`pratt=False`) still recurses.
   """
 
-  def __init__(self, tokens: List[Token]):
+  def __init__(self, tokens, pratt: bool = True, lazy: bool = False):
+    """
+    :param tokens: a token list or TokenBuffer, or any token iterator (e.g.
+        Scanner.iter_tokens()) which is consumed lazily with two tokens of lookahead.
+    :param pratt: parse expressions with the table driven pratt parser instead
+        of descending the precedence chain. both build the same trees.
+    :param lazy: only brace match function bodies, see `LazyBody`.
+    """
     self.current = 0
+    self.pratt = pratt
+    self.lazy = lazy
+    if not hasattr(tokens, "__getitem__"):
+      tokens = TokenStream(tokens)
     self.tokens: List[Token] = tokens
-    self.token_count = len(tokens)
 
   def parse(self):
     """
     program        → declaration* EOF ;
     """
-    stmts = []
+    return list(self.iter_parse())
+
+  def iter_parse(self):
+    """parse lazily, yield each top level declaration as soon as it is parsed.
+    nothing after it is read before the next one is asked for. a declaration
+    with a parse error is yielded as None.
+    """
     while not self.__is_at_end():
-      stmts.append(self.__declaration())
-    return stmts
+      yield self.__run(self.__declaration())
+
+  def parse_block(self) -> Block:
+    """parse a single block, e.g. the tokens of a LazyBody
+    """
+    return self.__run(self.__block())
+
+  def __run(self, rule):
+    """run a statement rule generator to its result. a nested rule it yields is
+    pushed and run, its result (or ParseError) is sent back to the yielder.
+    """
+    stack = [rule]
+    value = None
+    error = None
+    while True:
+      try:
+        if error is None:
+          nested = stack[-1].send(value)
+        else:
+          nested = stack[-1].throw(error)
+      except StopIteration as stop:
+        stack.pop()
+        value, error = stop.value, None
+        if not stack:
+          return value
+        continue
+      except ParseError as e:
+        stack.pop()
+        value, error = None, e
+        if not stack:
+          raise
+        continue
+      stack.append(nested)
+      value, error = None, None
 
   def __declaration(self):
     """
@@ -31,9 +111,9 @@ class Parser:
     """
     try:
       if self.__match(TokenType.VAR): return self.__var_declaration()
-      if self.__match(TokenType.FUN): return self.__fun_declaration()
-      if self.__match(TokenType.CLASS): return self.__class_declaration()
-      return self.__stmt()
+      if self.__match(TokenType.FUN): return (yield self.__fun_declaration())
+      if self.__match(TokenType.CLASS): return (yield self.__class_declaration())
+      return (yield self.__stmt())
     except ParseError:
       self.__synchronize()
 
@@ -51,7 +131,7 @@ class Parser:
     self.__consume(TokenType.LEFT_BRACE, "Expect '{' before class body.")
     methods = []
     while not self.__match_then_advance(TokenType.RIGHT_BRACE) and not self.__is_at_end():
-      methods.append(self.__function("method"))
+      methods.append((yield self.__function("method")))
     return Class(name, superclass=superclass, methods=methods)
 
   def __fun_declaration(self):
@@ -59,7 +139,7 @@ class Parser:
     funDecl        → "fun" function ;
     """
     self.__advance()
-    return self.__function("function")
+    return (yield self.__function("function"))
 
   def __function(self, kind: str):
     """
@@ -77,9 +157,36 @@ class Parser:
           error_handler.parse_error(self.__peek(), "Cannot have more than 8 parameters.")
         params.append(self.__primary())
     self.__consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters")
-    body = self.__block()
+    if self.lazy and self.__match(TokenType.LEFT_BRACE):
+      return Function(name, params, self.__skip_block())
+    body = yield self.__block()
     return Function(name, params, body)
 
+  def __skip_block(self):
+    """brace match a block without parsing it, keep its tokens in a LazyBody
+    """
+    tokens = self.tokens
+    current = self.current
+    body = []
+    depth = 0
+    while True:
+      token = tokens[current]
+      if token.type == TokenType.EOF:
+        self.current = current
+        error_handler.parse_error(token, "Expect '}' after block.")
+        raise ParseError("Expect '}' after block.")
+      body.append(token)
+      current += 1
+      if token.type == TokenType.LEFT_BRACE:
+        depth += 1
+      elif token.type == TokenType.RIGHT_BRACE:
+        depth -= 1
+        if depth == 0:
+          break
+    self.current = current
+    body.append(Token(TokenType.EOF, "", None, token.line))
+    return LazyBody(body, self.pratt)
+
   def __var_declaration(self):
     """
     varDecl        → "var" IDENTIFIER ( "=" expression )? ";" ;
@@ -102,12 +209,12 @@ class Parser:
                   | whileStmt
                   | block ;
     """
-    if self.__match(TokenType.LEFT_BRACE): return self.__block()
-    if self.__match(TokenType.FOR): return self.__for_stmt()
-    if self.__match(TokenType.IF): return self.__if_stmt()
+    if self.__match(TokenType.LEFT_BRACE): return (yield self.__block())
+    if self.__match(TokenType.FOR): return (yield self.__for_stmt())
+    if self.__match(TokenType.IF): return (yield self.__if_stmt())
     if self.__match(TokenType.PRINT): return self.__print_stmt()
     if self.__match(TokenType.RETURN): return self.__return_stmt()
-    if self.__match(TokenType.WHILE): return self.__while_stmt()
+    if self.__match(TokenType.WHILE): return (yield self.__while_stmt())
     return self.__expr_stmt()
 
   def __block(self):
@@ -117,7 +224,7 @@ class Parser:
     self.__advance()
     stmts = []
     while not self.__match(TokenType.RIGHT_BRACE) and not self.__is_at_end():
-      stmts.append(self.__declaration())
+      stmts.append((yield self.__declaration()))
     self.__consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
     return Block(statements=stmts)
 
@@ -140,7 +247,7 @@ class Parser:
     self.__consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
     initializer = None
     if self.__match(TokenType.VAR):
-      initializer = self.__declaration()
+      initializer = yield self.__declaration()
     elif not self.__match_then_advance(TokenType.SEMICOLON):
       self.__expr_stmt()
       self.__advance()
@@ -152,7 +259,7 @@ class Parser:
     if not self.__match_then_advance(TokenType.RIGHT_PAREN):
       increment = self.__expression()
       self.__advance()
-    body = self.__stmt()
+    body = yield self.__stmt()
     if increment:
       body = Block(statements=[body, increment])
     if not condition:
@@ -170,10 +277,10 @@ class Parser:
     self.__consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
     condition = self.__expression()
     self.__consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
-    then_branch = self.__stmt()
+    then_branch = yield self.__stmt()
     else_branch = None
     if self.__match_then_advance(TokenType.ELSE):
-      else_branch = self.__stmt()
+      else_branch = yield self.__stmt()
     return If(condition, then_branch, else_branch)
 
   def __print_stmt(self):
@@ -193,7 +300,7 @@ class Parser:
     self.__advance()
     return_value = None
     if self.__match_then_advance(TokenType.SEMICOLON):
-      return return_value
+      return Return(keyword, return_value)
     else:
       return_value = self.__expression()
       self.__consume(TokenType.SEMICOLON, "Expect ';' after return value.")
@@ -207,13 +314,15 @@ class Parser:
     self.__consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
     condition = self.__expression()
     self.__consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
-    body = self.__stmt()
+    body = yield self.__stmt()
     return While(condition, body)
 
   def __expression(self) -> Expr:
     """
     expression     → assignment ;
     """
+    if self.pratt:
+      return self.__pratt_expression(Precedence.ASSIGNMENT)
     return self.__assignment()
 
   def __assignment(self) -> Expr:
@@ -379,6 +488,165 @@ class Parser:
       variable = self.__peek()
       self.__advance()
       return Variable(name=variable)
+    error_handler.parse_error(self.__peek(), "Expect expression.")
+    raise ParseError("Expect expression.")
+
+  def __pratt_expression(self, precedence: Precedence) -> Expr:
+    """parse an expression whose infix operators bind at least as tight as
+    precedence: a prefix rule, then infix rules looked up by token type.
+    an operator whose operand is still to be parsed is pushed on `pending` with
+    the precedence to resume at, and popped once the operand is complete.
+    """
+    tokens = self.tokens
+    prefix_rules = self.__prefix_rules
+    prefix_operators = self.__prefix_operators
+    infix_rules = self.__infix_rules
+    pending = []
+    while True:
+      # an operand, starting with a prefix
+      token = tokens[self.current]
+      operator = prefix_operators.get(token.type)
+      if operator is not None:
+        self.current += 1
+        pending.append((operator, token, precedence))
+        precedence = Precedence.UNARY if operator is Pending.UNARY else Precedence.ASSIGNMENT
+        continue
+      rule = prefix_rules.get(token.type)
+      if rule is None:
+        error_handler.parse_error(token, "Expect expression.")
+        raise ParseError("Expect expression.")
+      left = rule(self)
+      # then the infix operators continuing it, finishing pending operators
+      # whose operand it is on the way
+      while True:
+        token = tokens[self.current]
+        rule = infix_rules.get(token.type)
+        if rule is not None and rule[0] >= precedence:
+          operator = rule[1]
+          self.current += 1
+          if operator is Pending.GET:
+            name = self.__consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+            left = Get(left, name)
+            continue
+          if operator is Pending.CALL:
+            if self.__match(TokenType.RIGHT_PAREN):
+              left = Call(left, self.__consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments."), [])
+              continue
+            pending.append((Pending.CALL, (left, []), precedence))
+            precedence = Precedence.ASSIGNMENT
+          elif operator is Pending.ASSIGNMENT:
+            # right associative
+            pending.append((operator, (left, token), precedence))
+            precedence = Precedence.ASSIGNMENT
+          else:
+            pending.append((operator, (left, token), precedence))
+            precedence = rule[0] + 1
+          break
+        if not pending:
+          return left
+        operator, operand, precedence = pending.pop()
+        if operator is Pending.BINARY:
+          left = Binary(operand[0], operand[1], left)
+        elif operator is Pending.LOGICAL:
+          left = Logical(operand[0], operand[1], left)
+        elif operator is Pending.UNARY:
+          left = Unary(operand, left)
+        elif operator is Pending.GROUPING:
+          self.__consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+          left = Grouping(left)
+        elif operator is Pending.ASSIGNMENT:
+          left = self.__assignment_target(operand[0], operand[1], left)
+        elif operator is Pending.CALL:
+          callee, arguments = operand
+          arguments.append(left)
+          if self.__match_then_advance(TokenType.COMMA):
+            if len(arguments) >= 8:
+              error_handler.parse_error(self.__peek(), "Cannot have more than 8 arguments.")
+            pending.append((Pending.CALL, operand, precedence))
+            precedence = Precedence.ASSIGNMENT
+            break
+          paren = self.__consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
+          left = Call(callee, paren, arguments)
+
+  def __assignment_target(self, target: Expr, equals: Token, value: Expr) -> Expr:
+    if isinstance(target, Variable):
+      return Assign(target.name, value)
+    elif isinstance(target, Get):
+      return Set(object=target.object, name=target.name, value=value)
+    error_handler.parse_error(equals, "Invalid assignment target.")
+    return target
+
+  def __literal(self) -> Expr:
+    token = self.tokens[self.current]
+    self.current += 1
+    return Literal(token.literal)
+
+  def __true(self) -> Expr:
+    self.current += 1
+    return Literal(True)
+
+  def __false(self) -> Expr:
+    self.current += 1
+    return Literal(False)
+
+  def __nil(self) -> Expr:
+    self.current += 1
+    return Literal(None)
+
+  def __variable(self) -> Expr:
+    token = self.tokens[self.current]
+    self.current += 1
+    return Variable(name=token)
+
+  def __this(self) -> Expr:
+    token = self.tokens[self.current]
+    self.current += 1
+    return This(keyword=token)
+
+  def __super(self) -> Expr:
+    token = self.tokens[self.current]
+    self.current += 1
+    self.__consume(TokenType.DOT, "Expect '.' after 'super'.")
+    method = self.__consume(TokenType.IDENTIFIER, "Expect superclass method name.")
+    return Super(keyword=token, method=method)
+
+  # token type -> rule parsing a whole operand starting with that token
+  __prefix_rules = {
+    TokenType.NUMBER: __literal,
+    TokenType.STRING: __literal,
+    TokenType.TRUE: __true,
+    TokenType.FALSE: __false,
+    TokenType.NIL: __nil,
+    TokenType.IDENTIFIER: __variable,
+    TokenType.THIS: __this,
+    TokenType.SUPER: __super,
+  }
+
+  # token type -> prefix operator that wraps the operand following it
+  __prefix_operators = {
+    TokenType.BANG: Pending.UNARY,
+    TokenType.MINUS: Pending.UNARY,
+    TokenType.LEFT_PAREN: Pending.GROUPING,
+  }
+
+  # token type -> (precedence, infix operator continuing the operand on its left)
+  __infix_rules = {
+    TokenType.EQUAL: (Precedence.ASSIGNMENT, Pending.ASSIGNMENT),
+    TokenType.OR: (Precedence.OR, Pending.LOGICAL),
+    TokenType.AND: (Precedence.AND, Pending.LOGICAL),
+    TokenType.BANG_EQUAL: (Precedence.EQUALITY, Pending.BINARY),
+    TokenType.EQUAL_EQUAL: (Precedence.EQUALITY, Pending.BINARY),
+    TokenType.GREATER: (Precedence.COMPARISON, Pending.BINARY),
+    TokenType.GREATER_EQUAL: (Precedence.COMPARISON, Pending.BINARY),
+    TokenType.LESS: (Precedence.COMPARISON, Pending.BINARY),
+    TokenType.LESS_EQUAL: (Precedence.COMPARISON, Pending.BINARY),
+    TokenType.PLUS: (Precedence.ADDITION, Pending.BINARY),
+    TokenType.MINUS: (Precedence.ADDITION, Pending.BINARY),
+    TokenType.SLASH: (Precedence.MULTIPLICATION, Pending.BINARY),
+    TokenType.STAR: (Precedence.MULTIPLICATION, Pending.BINARY),
+    TokenType.LEFT_PAREN: (Precedence.CALL, Pending.CALL),
+    TokenType.DOT: (Precedence.CALL, Pending.GET),
+  }
 
   def __synchronize(self):
     """ synchronize parser to next statement to recover from panic(error) mode.
@@ -394,7 +662,8 @@ class Parser:
   def __match(self, *types) -> bool:
     """check whether current token match expected Token types
     """
-    return any([self.__check(t) for t in types])
+    token_type = self.tokens[self.current].type
+    return token_type != TokenType.EOF and token_type in types
 
   def __match_then_advance(self, *types) -> bool:
     """check whether current token match expected Token types. advance if match.
@@ -440,4 +709,49 @@ class Parser:
     """move to next token
     """
     if not self.__is_at_end():
-      self.current += 1
\ No newline at end of file
+      self.current += 1
+
+class LazyBody(object):
+  """stands for the body of a function declared by a lazy parser until the
+  function is first called. only the tokens of the body are kept, it is
+  parsed, and resolved against the scopes the resolver saved in it, on the
+  first call (see `Resolver.materialize`). the diagnostics of a body are
+  reported then, before any of its statements runs, or by `Resolver.check_bodies`
+  once the program ended for a function that was never called.
+  """
+  __slots__ = ("tokens", "pratt", "scopes", "free", "function_type", "class_type", "failed")
+
+  def __init__(self, tokens: List[Token], pratt: bool = True):
+    self.tokens = tokens
+    self.pratt = pratt
+    # resolver state at the function declaration
+    self.scopes = None
+    self.free = None
+    self.function_type = None
+    self.class_type = None
+    # parsing or resolving it reported errors
+    self.failed = False
+
+  def parse(self) -> Block:
+    return Parser(self.tokens, self.pratt).parse_block()
+
+def lazy_functions(stmts) -> List[Function]:
+  """the function declarations in stmts, nested in blocks, branches, loops or
+  classes, whose body is still a LazyBody, in source order
+  """
+  functions = []
+  stack = list(reversed(stmts))
+  while stack:
+    node = stack.pop()
+    if isinstance(node, Function) and isinstance(node.body, LazyBody):
+      functions.append(node)
+      continue
+    children = []
+    for field in node._fields:
+      value = getattr(node, field)
+      if isinstance(value, Stmt):
+        children.append(value)
+      elif isinstance(value, list):
+        children.extend(child for child in value if isinstance(child, Stmt))
+    stack.extend(reversed(children))
+  return functions
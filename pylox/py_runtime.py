@@ -0,0 +1,168 @@
+"""runtime of the python modules `Transpiler` generates. lox numbers, strings,
+booleans and nil are python floats, strs, bools and None, a lox function is a
+python function and a lox class a python class deriving from `Instance`, with
+its methods as `_m_<name>` attributes.
+"""
+import re
+import builtins
+import operator
+from types import FunctionType
+from pylox.error import RuntimeError
+from pylox.environment import Cell
+from pylox.lox_callable import LoxCallable, Clock
+
+# what is put before a lox name to make a python one, see `Transpiler.local_name`
+mangling = re.compile(r"_v\d+_|_m_")
+
+def lox_name(name: str) -> str:
+  """the lox name of a generated python name
+  """
+  match = mangling.match(name)
+  return name[match.end():] if match else name
+
+class Class(type):
+  """type of the lox classes
+  """
+
+  def __repr__(cls):
+    return lox_name(cls.__name__)
+
+class Instance(metaclass=Class):
+  """base of the lox classes, the fields of an instance are its `__dict__`
+  """
+
+  def __repr__(self):
+    return f"{self.__class__!r} Instance"
+
+class BoundMethod(object):
+  """a method bound to an instance. each binding is a value of its own like the
+  LoxFunction `bind` returns, where python bound methods compare by value
+  """
+  __slots__ = ("function", "this")
+
+  def __init__(self, function: FunctionType, this: Instance):
+    self.function = function
+    self.this = this
+
+  def __call__(self, *arguments):
+    return self.function(self.this, *arguments)
+
+def stringify(value) -> str:
+  if value.__class__ is FunctionType:
+    return f"<fn {lox_name(value.__name__)}>"
+  if value.__class__ is BoundMethod:
+    return f"<fn {lox_name(value.function.__name__)}>"
+  return str(value)
+
+def lox_print(value):
+  print(stringify(value))
+
+def is_truthy(value) -> bool:
+  return not (value is None or value is False)
+
+def bang(value) -> bool:
+  return value is None or value is False
+
+def add(left, right):
+  if left.__class__ is float and right.__class__ is float:
+    return left + right
+  # a string or number on the left concatenates with anything
+  if isinstance(left, (str, float)):
+    return stringify(left) + stringify(right)
+  raise RuntimeError("Operand must be number or string")
+
+def number_operator(function):
+  def apply(left, right):
+    if left.__class__ is float and right.__class__ is float:
+      return function(left, right)
+    raise RuntimeError("Operand must be a number")
+  return apply
+
+subtract = number_operator(operator.sub)
+multiply = number_operator(operator.mul)
+divide = number_operator(operator.truediv)
+greater = number_operator(operator.gt)
+greater_equal = number_operator(operator.ge)
+less = number_operator(operator.lt)
+less_equal = number_operator(operator.le)
+
+def negate(value):
+  if value.__class__ is float:
+    return -value
+  raise RuntimeError("Operand must be a number")
+
+def call(callee, paren, *arguments):
+  if callee.__class__ is FunctionType:
+    arity = callee.__code__.co_argcount
+    if arity == len(arguments):
+      return callee(*arguments)
+  elif callee.__class__ is BoundMethod:
+    arity = callee.function.__code__.co_argcount - 1
+    if arity == len(arguments):
+      return callee.function(callee.this, *arguments)
+  elif callee.__class__ is Class:
+    # like LoxClass, only an initializer of the class itself counts
+    initializer = callee.__dict__.get("_m_init")
+    arity = initializer.__code__.co_argcount - 1 if initializer else 0
+    if arity == len(arguments):
+      instance = callee()
+      if initializer:
+        initializer(instance, *arguments)
+      return instance
+  elif isinstance(callee, LoxCallable):
+    arity = callee.arity()
+    if arity == len(arguments):
+      return callee.call(None, list(arguments))
+  else:
+    raise RuntimeError(paren, "Can only call functions and classes.")
+  raise RuntimeError(paren, f"Expected {arity} arguments but got {len(arguments)}.")
+
+# marks a field lookup miss, fields can hold None (nil)
+missing = object()
+
+def get(instance, name):
+  if not isinstance(instance, Instance):
+    raise RuntimeError(name, "Only instances have properties.")
+  value = instance.__dict__.get(name.lexeme, missing)
+  if value is not missing:
+    return value
+  method = getattr(instance.__class__, "_m_" + name.lexeme, None)
+  if method is not None:
+    return BoundMethod(method, instance)
+  raise builtins.RuntimeError(f'Undefined property: {name.lexeme}')
+
+def fields(instance, name) -> dict:
+  """the fields of an instance to set one of
+  """
+  if not isinstance(instance, Instance):
+    raise RuntimeError(name, "Only instances have fields.")
+  return instance.__dict__
+
+def set_field(fields: dict, name: str, value):
+  fields[name] = value
+  return value
+
+def set_cell(cell: Cell, value):
+  cell.value = value
+  return value
+
+def superclass(value, name):
+  if value.__class__ is not Class:
+    raise RuntimeError(name, "Superclass must be a class.")
+  return value
+
+def super_method(superclass: Class, instance, method):
+  function = getattr(superclass, "_m_" + method.lexeme, None)
+  if function is None:
+    raise RuntimeError(method, f"Undefined property '{method.lexeme}'.")
+  return BoundMethod(function, instance)
+
+def global_setter(namespace: dict):
+  """a function assigning the globals of a generated module
+  """
+  def set_global(name: str, value):
+    if name not in namespace:
+      raise RuntimeError(f'Undefined variable: {lox_name(name)}')
+    namespace[name] = value
+    return value
+  return set_global
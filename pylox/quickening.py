@@ -0,0 +1,109 @@
+"""self specializing binary operators of the tree walker. the resolver numbers
+the Binary nodes, and an interpreter gives each one a `Site` at its number on
+its first evaluation, which watches the classes of the operands. once a site saw the same pair `warmup` times in a row it swaps in
+a variant for that pair, e.g. float < float, guarded by a class check falling
+back to the generic operator. a site whose guard failed `max_specializations`
+times stays generic.
+"""
+import operator
+import itertools
+from pylox.token import Token, TokenType
+from pylox.runtime import binary_operators
+
+# numbers of the Binary nodes, unique in the process so that an interpreter can
+# run trees from several resolvers
+site_indices = itertools.count()
+
+# operands of the same classes in a row before specializing
+warmup = 8
+# specializations before a site gives up on its guards
+max_specializations = 3
+
+# (TokenType, left class, right class) to the operator on operands of those classes
+variants = {
+  (TokenType.MINUS, float, float): operator.sub,
+  (TokenType.SLASH, float, float): operator.truediv,
+  (TokenType.STAR, float, float): operator.mul,
+  (TokenType.PLUS, float, float): operator.add,
+  (TokenType.PLUS, str, str): operator.add,
+  (TokenType.GREATER, float, float): operator.gt,
+  (TokenType.GREATER_EQUAL, float, float): operator.ge,
+  (TokenType.LESS, float, float): operator.lt,
+  (TokenType.LESS_EQUAL, float, float): operator.le,
+}
+specializable = {key[0] for key in variants}
+
+# lox names of the operand classes, for the diagnostics
+type_names = {float: "number", str: "string", bool: "boolean", type(None): "nil"}
+
+def guarded(site, function, left_class, right_class):
+  def specialized(left, right):
+    if left.__class__ is left_class and right.__class__ is right_class:
+      return function(left, right)
+    return site.miss(left, right)
+  return specialized
+
+class Site(object):
+  """a binary operator of the tree and the operands it saw. `apply(left, right)`
+  is the operator as currently specialized
+  """
+  __slots__ = ("operator", "generic", "apply", "state", "classes", "seen", "specializations", "misses")
+
+  def __init__(self, operator: Token):
+    self.operator = operator
+    self.generic = binary_operators[operator.type]
+    # classes of the last operands and how many times in a row they were seen
+    self.classes = None
+    self.seen = 0
+    self.specializations = 0
+    # guard failures of the specialized variants
+    self.misses = 0
+    if operator.type in specializable:
+      self.apply = self.observe
+      self.state = "observing"
+    else:
+      self.apply = self.generic
+      self.state = "generic"
+
+  def observe(self, left, right):
+    classes = (left.__class__, right.__class__)
+    if classes == self.classes:
+      self.seen += 1
+      if self.seen >= warmup:
+        self.specialize(classes)
+    else:
+      self.classes, self.seen = classes, 1
+    return self.generic(left, right)
+
+  def specialize(self, classes):
+    function = variants.get((self.operator.type,) + classes)
+    if function is None:
+      # e.g. concatenating a number and a string, left generic
+      self.apply = self.generic
+      self.state = "generic"
+      return
+    self.apply = guarded(self, function, *classes)
+    self.state = " ".join(type_names.get(c, c.__name__) for c in classes)
+    self.specializations += 1
+
+  def miss(self, left, right):
+    """operands the specialized variant is not for, evaluated generically
+    """
+    self.misses += 1
+    if self.specializations >= max_specializations:
+      self.apply = self.generic
+      self.state = "generic"
+    else:
+      self.apply = self.observe
+      self.state = "observing"
+      self.classes = None
+    return self.generic(left, right)
+
+def report(sites) -> str:
+  """a table of sites in source order
+  """
+  lines = [f"{'operator':<8} {'line':>5} {'state':<16} {'quickened':>9} {'misses':>6}"]
+  for site in sorted(sites, key=lambda s: s.operator.line):
+    lines.append(f"{site.operator.lexeme:<8} {site.operator.line:>5} {site.state:<16} "
+                 f"{site.specializations:>9} {site.misses:>6}")
+  return "\n".join(lines) + "\n"
@@ -1,81 +1,144 @@
 from typing import List
 from enum import IntEnum
 
-from pylox.expr import ExprVisitor
-from pylox.stmt import StmtVisitor
+from pylox.expr import ExprVisitor, This, Variable
+from pylox.stmt import StmtVisitor, Var
 from pylox.token import Token, TokenType
-from pylox.error import error_handler
+from pylox.error import ParseError, error_handler
+from pylox.parser import LazyBody, lazy_functions
+from pylox.environment import UPVALUE
+from pylox.quickening import site_indices
+
+class Local(object):
+  """a variable of a local scope
+  """
+  __slots__ = ("slot", "defined", "declaration", "captured", "assigned", "cell", "references")
+
+  def __init__(self, slot: int, declaration, defined: bool = False):
+    self.slot = slot
+    self.defined = defined
+    # Var, Function or Class declaring it, or the param Variable, None for
+    # this and super
+    self.declaration = declaration
+    # used by a function nested in the one declaring it
+    self.captured = False
+    self.assigned = False
+    # kept in a Cell, decided when its scope ends
+    self.cell = False
+    # nodes resolved to it, None once its scope ended
+    self.references = []
+
+class FunctionScope(object):
+  """the variables of enclosing functions a function uses, its upvalues
+  """
+  __slots__ = ("base", "upvalues", "indices")
+
+  def __init__(self, base: int):
+    # index of its outermost scope in Resolver.scopes
+    self.base = base
+    # (depth, slot) of each upvalue, see `environment.capture`
+    self.upvalues = []
+    # Local to its index in upvalues
+    self.indices = {}
 
 class Resolver(ExprVisitor, StmtVisitor):
   """A semantic analyzer to figure out how many hops between a variable's declaration and usage.
-  resolver will put those hops data into interpreter.
+  resolver will put those hops data into the `depth` of the using node.
+  visit methods of nodes with children are generators yielding the children to
+  resolve in order, `__resolve` walks them with an explicit stack so deeply
+  nested code does not recurse on the python stack.
+
+  a function keeps only the variables of enclosing functions it uses, in its
+  upvalues, so a closure does not keep the frames around it alive. such a
+  variable is kept in a Cell shared by its frame and the closures when it is
+  assigned, or may be used before it is defined, otherwise its value is copied.
+
+  closures never hold a frame, so a block in a function or in another block
+  keeps its variables in the frame around it, after the ones already there,
+  and runs without a frame of its own.
   """
 
-  def __init__(self, interpreter):
-    self.interpreter = interpreter
+  def __init__(self):
+    # variable name to its Local, for each local scope
     self.scopes: List[dict] = []
+    # index of the frame each scope keeps its variables in
+    self.frames: List[int] = []
+    # variables in each frame
+    self.sizes: List[int] = []
+    # the function being resolved, and the ones it is nested in
+    self.functions: List[FunctionScope] = [FunctionScope(0)]
+    # variables of enclosing functions of a LazyBody, by name
+    self.free = {}
     self.current_function = FunctionType.NONE
     self.current_class = ClassType.NONE
 
   def visit_block_stmt(self, stmt):
-    self.__begin_scope()
-    self.resolve(stmt.statements)
+    # a block in the global scope needs a frame for its variables
+    own_frame = not self.scopes
+    self.__begin_scope(own_frame)
+    stmt.base = None if own_frame else self.sizes[-1]
+    yield from stmt.statements
     self.__end_scope()
 
   def visit_var_stmt(self, stmt):
-    self.__declare(stmt.name)
+    self.__declare(stmt.name, stmt)
     if stmt.initializer:
-      self.__resolve(stmt.initializer)
+      yield stmt.initializer
     self.__define(stmt.name)
 
   def visit_variable_expr(self, expr):
-    if self.scopes and self.scopes[-1].get(expr.name.lexeme) == False:
-      error_handler.resolve_error(expr.name, "Cannot read local variable in its own initializer.")
-    self.__resolve_local(expr, expr.name)
+    if self.scopes:
+      local = self.scopes[-1].get(expr.name.lexeme)
+      if local is not None and not local.defined:
+        error_handler.resolve_error(expr.name, "Cannot read local variable in its own initializer.")
+    self.__resolve_local(expr, expr.name.lexeme)
 
   def visit_assign_expr(self, expr):
-    self.__resolve(expr.value)
-    self.__resolve_local(expr, expr.name)
+    yield expr.value
+    local = self.__resolve_local(expr, expr.name.lexeme)
+    if local is not None:
+      local.assigned = True
 
   def visit_class_stmt(self, stmt):
     enclosing_class = self.current_class
     self.current_class = ClassType.CLASS
-    self.__declare(stmt.name)
+    self.__declare(stmt.name, stmt)
     if stmt.superclass:
       self.current_class = ClassType.SUBCLASS
-      self.__resolve(stmt.superclass)
+      yield stmt.superclass
     self.__define(stmt.name)
     if stmt.superclass:
-      self.__begin_scope()
-      self.scopes[-1]["super"] = True
-    self.__begin_scope()
-    self.scopes[-1]["this"] = True
+      self.__begin_scope(True)
+      self.__declare_keyword("super")
+    self.__begin_scope(True)
+    self.__declare_keyword("this")
     for method in stmt.methods:
       func_type = FunctionType.METHOD
       if method.name.lexeme == "init":
         func_type = FunctionType.INITIALIZER
-      self.__resolve_function(method, func_type)
+      # a bound method's frames start at the one holding this
+      yield from self.__resolve_function(method, func_type, len(self.scopes) - 1)
     self.__end_scope()
     if stmt.superclass:
       self.__end_scope()
     self.current_class = enclosing_class
 
   def visit_function_stmt(self, stmt):
-    self.__declare(stmt.name)
+    self.__declare(stmt.name, stmt)
     self.__define(stmt.name)
-    self.__resolve_function(stmt, FunctionType.FUNCTION)
+    yield from self.__resolve_function(stmt, FunctionType.FUNCTION, len(self.scopes))
 
   def visit_expression_stmt(self, stmt):
-    self.__resolve(stmt.expression)
+    yield stmt.expression
 
   def visit_if_stmt(self, stmt):
-    self.__resolve(stmt.condition)
-    self.__resolve(stmt.thenBranch)
+    yield stmt.condition
+    yield stmt.thenBranch
     if stmt.elseBranch:
-      self.__resolve(stmt.elseBranch)
+      yield stmt.elseBranch
 
   def visit_print_stmt(self, stmt):
-    self.__resolve(stmt.expression)
+    yield stmt.expression
 
   def visit_return_stmt(self, stmt):
     if self.current_function == FunctionType.NONE:
@@ -83,95 +146,284 @@ class Resolver(ExprVisitor, StmtVisitor):
     if stmt.value:
       if self.current_function == FunctionType.INITIALIZER:
         error_handler.resolve_error(stmt.keyword, "Cannot return a value from an initializer.")
-      self.__resolve(stmt.value)
+      yield stmt.value
 
   def visit_while_stmt(self, stmt):
-    self.__resolve(stmt.condition)
-    self.__resolve(stmt.body)
+    yield stmt.condition
+    yield stmt.body
 
   def visit_binary_expr(self, expr):
-    self.__resolve(expr.left)
-    self.__resolve(expr.right)
+    if expr.site is None:
+      expr.site = next(site_indices)
+    yield expr.left
+    yield expr.right
 
   def visit_call_expr(self, expr):
-    self.__resolve(expr.callee)
-    for argument in expr.arguments:
-      self.__resolve(argument)
+    yield expr.callee
+    yield from expr.arguments
 
   def visit_get_expr(self, expr):
-    self.__resolve(expr.object)
+    yield expr.object
 
   def visit_grouping_expr(self, expr):
-    self.__resolve(expr.expression)
+    yield expr.expression
 
   def visit_literal_expr(self, expr):
     pass
 
   def visit_logical_expr(self, expr):
-    self.__resolve(expr.left)
-    self.__resolve(expr.right)
+    yield expr.left
+    yield expr.right
 
   def visit_set_expr(self, expr):
-    self.__resolve(expr.value)
-    self.__resolve(expr.object)
+    yield expr.value
+    yield expr.object
 
   def visit_super_expr(self, expr):
     if self.current_class == ClassType.NONE:
       error_handler.resolve_error(expr.keyword, "Cannot use 'super' outside of a class.")
     elif self.current_class != ClassType.SUBCLASS:
       error_handler.resolve_error(expr.keyword, "Cannot use 'super' in a class with no superclass.")
-    self.__resolve_local(expr, expr.keyword)
+    self.__resolve_local(expr, "super")
+    # the instance the method is bound to
+    if expr.this is None:
+      expr.this = This(Token(TokenType.THIS, "this", None, expr.keyword.line))
+    self.__resolve_local(expr.this, "this")
 
   def visit_this_expr(self, expr):
     if self.current_class == ClassType.NONE:
       error_handler.resolve_error(expr.keyword, "Cannot use 'this' outside of a class.")
       return
-    self.__resolve_local(expr, expr.keyword)
+    self.__resolve_local(expr, "this")
 
   def visit_unary_expr(self, expr):
-    self.__resolve(expr.right)
+    yield expr.right
 
-  def __resolve_function(self, func_stmt, func_type):
+  def __resolve_function(self, func_stmt, func_type, base: int):
+    """
+    :param base: index in scopes of the first scope of the function
+    """
     enclosing_function = self.current_function
     self.current_function = func_type
-    self.__begin_scope()
+    function = FunctionScope(base)
+    self.functions.append(function)
+    self.__begin_scope(True)
     for param in func_stmt.params:
-      self.__declare(param.name)
+      self.__declare(param.name, param)
       self.__define(param.name)
-    self.resolve(func_stmt.body.statements)
+    body = func_stmt.body
+    if isinstance(body, LazyBody):
+      body.free = self.__capture_free(body, function)
+      body.scopes = self.scopes[base:]
+      body.function_type = func_type
+      body.class_type = self.current_class
+    else:
+      yield from body.statements
     self.__end_scope()
+    self.functions.pop()
+    func_stmt.upvalues = tuple(function.upvalues)
     self.current_function = enclosing_function
 
-  def __resolve_local(self, expr, token):
-    for i in reversed(range(0, len(self.scopes))):
-      if self.scopes[i].__contains__(token.lexeme):
-        self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
-        return
-
-  def __declare(self, name: Token):
+  def __capture_free(self, body: LazyBody, function: FunctionScope) -> dict:
+    """capture every variable of enclosing functions named in a LazyBody, the
+    body is resolved after the scopes around it ended. a name the body
+    declares again is captured too, it only costs an unused upvalue.
+    return name to (Local, index in the upvalues).
+    """
+    free = {}
+    tokens = body.tokens
+    level = len(self.functions) - 1
+    for index, token in enumerate(tokens):
+      if token.type == TokenType.IDENTIFIER:
+        if index and tokens[index - 1].type == TokenType.DOT:
+          # a property
+          continue
+        names = (token.lexeme,)
+      elif token.type == TokenType.THIS:
+        names = ("this",)
+      elif token.type == TokenType.SUPER:
+        names = ("super", "this")
+      else:
+        continue
+      for name in names:
+        i, local = self.__find(name)
+        if local is None or i >= function.base:
+          continue
+        local.captured = True
+        if tokens[index + 1].type == TokenType.EQUAL:
+          local.assigned = True
+        free[name] = (local, self.__upvalue(level, local, i))
+    return free
+
+  def __find(self, name: str):
+    """the Local a name refers to and the index of its scope, -1 for a free
+    variable of a LazyBody. the Local is None for a global.
+    """
+    scopes = self.scopes
+    for i in range(len(scopes) - 1, -1, -1):
+      local = scopes[i].get(name)
+      if local is not None:
+        return i, local
+    free = self.free.get(name)
+    if free is not None:
+      return -1, free[0]
+    return -1, None
+
+  def __resolve_local(self, expr, name: str):
+    """set the depth and slot of a variable reference, return its Local
+    """
+    i, local = self.__find(name)
+    if local is None:
+      expr.depth = None
+      expr.slot = None
+      return None
+    function = self.functions[-1]
+    if i >= function.base:
+      expr.depth = self.frames[-1] - self.frames[i]
+      expr.slot = local.slot
+    else:
+      local.captured = True
+      expr.depth = UPVALUE
+      expr.slot = self.__upvalue(len(self.functions) - 1, local, i)
+    if local.references is None:
+      expr.cell = local.cell
+    else:
+      local.references.append(expr)
+    return local
+
+  def __upvalue(self, level: int, local: Local, i: int) -> int:
+    """index of a variable declared in scope i in the upvalues of
+    functions[level], added to them and to the ones of the functions between
+    if missing
+    """
+    function = self.functions[level]
+    index = function.indices.get(local)
+    if index is None:
+      enclosing = self.functions[level - 1]
+      if i >= enclosing.base:
+        # in the frames of the function creating this one
+        upvalue = (self.frames[function.base - 1] - self.frames[i], local.slot)
+      else:
+        upvalue = (UPVALUE, self.__upvalue(level - 1, local, i))
+      index = function.indices[local] = len(function.upvalues)
+      function.upvalues.append(upvalue)
+    return index
+
+  def __declare(self, name: Token, declaration):
     if self.scopes:
       scope = self.scopes[-1]
       if scope.__contains__(name.lexeme):
         error_handler.resolve_error(name, "Variable with this name already declared in this scope.")
-      scope[name.lexeme] = False
+      # slots are numbered in declaration order
+      scope[name.lexeme] = Local(self.sizes[-1], declaration)
+      self.sizes[-1] += 1
+
+  def __declare_keyword(self, name: str):
+    """declare this or super, the only variable of its scope
+    """
+    self.scopes[-1][name] = Local(self.sizes[-1], None, True)
+    self.sizes[-1] += 1
 
   def __define(self, name: Token):
     if self.scopes:
-      scope = self.scopes[-1]
-      scope[name.lexeme] = True
-
-  def __begin_scope(self):
+      self.scopes[-1][name.lexeme].defined = True
+
+  def __begin_scope(self, own_frame: bool):
+    """
+    :param own_frame: the scope has a frame of its own at runtime, or keeps its
+      variables in the frame of the scope around it
+    """
+    if own_frame:
+      self.frames.append(self.frames[-1] + 1 if self.frames else 0)
+      self.sizes.append(0)
+    else:
+      self.frames.append(self.frames[-1])
     self.scopes.append({})
 
   def __end_scope(self):
-    self.scopes.pop()
+    scope = self.scopes.pop()
+    frame = self.frames.pop()
+    if self.frames and self.frames[-1] == frame:
+      # the slots are free for the next block
+      self.sizes[-1] -= len(scope)
+    else:
+      self.sizes.pop()
+    for local in scope.values():
+      declaration = local.declaration
+      if declaration is not None:
+        # a function or class can be used by a closure before it is defined
+        local.cell = local.captured and (local.assigned or not isinstance(declaration, (Var, Variable)))
+        declaration.cell = local.cell
+        for reference in local.references:
+          reference.cell = local.cell
+      local.references = None
 
   def resolve(self, stmts):
     for stmt in stmts:
       self.__resolve(stmt)
 
+  @staticmethod
+  def materialize(func_stmt):
+    """parse and resolve the LazyBody of a function, replace it with the Block.
+    return None if that reported errors.
+    """
+    body: LazyBody = func_stmt.body
+    if body.failed:
+      return None
+    had_error, error_handler.had_error = error_handler.had_error, False
+    try:
+      block = body.parse()
+    except ParseError:
+      block = None
+    if not error_handler.had_error:
+      resolver = Resolver()
+      # locals of the function are resolved afresh, the ones of the
+      # enclosing functions are its upvalues
+      resolver.scopes = [{name: Local(local.slot, local.declaration, True) for name, local in scope.items()}
+                         for scope in body.scopes]
+      # the bound frame for a method and the call frame
+      resolver.frames = list(range(len(body.scopes)))
+      resolver.sizes = [len(scope) for scope in body.scopes]
+      resolver.free = body.free
+      resolver.functions[0].indices = {local: index for local, index in body.free.values()}
+      resolver.current_function = body.function_type
+      resolver.current_class = body.class_type
+      resolver.resolve(block.statements)
+      while resolver.scopes:
+        resolver.__end_scope()
+    body.failed = error_handler.had_error
+    error_handler.had_error = had_error or body.failed
+    if body.failed:
+      return None
+    func_stmt.body = block
+    return block
+
+  @staticmethod
+  def check_bodies(stmts):
+    """parse and resolve the lazy bodies in stmts no call materialized, so the
+    errors of every body are reported, called or not
+    """
+    for func_stmt in lazy_functions(stmts):
+      Resolver.materialize(func_stmt)
+
   def __resolve(self, stmt_or_expr):
-    stmt_or_expr.accept(self)
+    """resolve a node and, depth first, the children its visit method yields
+    """
+    dispatch = self.dispatch
+    children = dispatch[stmt_or_expr.__class__](self, stmt_or_expr)
+    if children is None:
+      return
+    stack = [children]
+    while stack:
+      child = next(stack[-1], stack)
+      if child is stack:
+        stack.pop()
+        continue
+      if child is None:
+        continue
+      children = dispatch[child.__class__](self, child)
+      if children is not None:
+        stack.append(children)
 
 class FunctionType(IntEnum):
   NONE = 0
@@ -0,0 +1,55 @@
+"""semantics of lox values shared by the evaluators other than `Interpreter`
+"""
+import operator
+from pylox.token import TokenType
+from pylox.error import RuntimeError
+
+def is_truthy(obj):
+  if obj == None: return False
+  if isinstance(obj, bool): return bool(obj)
+  return True
+
+def check_number_operands(*operands):
+  if (all(isinstance(o, float) for o in operands)): return
+  raise RuntimeError("Operand must be a number")
+
+def number_operator(function):
+  def apply(left, right):
+    check_number_operands(left, right)
+    return function(float(left), float(right))
+  return apply
+
+def add(left, right):
+  if isinstance(left, float) and isinstance(right, float):
+    return left + right
+  # a string or number on the left concatenates with anything
+  if isinstance(left, (str, float)):
+    return str(left) + str(right)
+  raise RuntimeError("Operand must be number or string")
+
+def negate(right):
+  check_number_operands(right)
+  return -float(right)
+
+def bang(right):
+  return not is_truthy(right)
+
+# TokenType to function(left, right) of the binary operator
+binary_operators = {
+  TokenType.MINUS: number_operator(operator.sub),
+  TokenType.SLASH: number_operator(operator.truediv),
+  TokenType.STAR: number_operator(operator.mul),
+  TokenType.PLUS: add,
+  TokenType.GREATER: number_operator(operator.gt),
+  TokenType.GREATER_EQUAL: number_operator(operator.ge),
+  TokenType.LESS: number_operator(operator.lt),
+  TokenType.LESS_EQUAL: number_operator(operator.le),
+  TokenType.BANG_EQUAL: lambda left, right: not left == right,
+  TokenType.EQUAL_EQUAL: lambda left, right: left == right,
+}
+
+# TokenType to function(right) of the unary operator
+unary_operators = {
+  TokenType.MINUS: negate,
+  TokenType.BANG: bang,
+}
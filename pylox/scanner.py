@@ -1,16 +1,22 @@
-from typing import List
-from pylox.token import Token, TokenType, lexeme_token_type_dict
+import re
+import codecs
+from typing import List, Iterator, Tuple
+from pylox.token import Token, TokenType, TokenBuffer, lexeme_token_type_dict, interned_token_types
 from pylox.error import error_handler
+from pylox.symbol_table import SymbolTable
 
 class Scanner(object):
   """scan source code to get a list of tokens
   """
 
-  def __init__(self, source: str):
+  def __init__(self, source: str, symbols: SymbolTable = None):
     """
     :param source: source code str
+    :param symbols: table to intern identifiers, keywords and string literals
+        through. a new one is created if not given, see `self.symbols`.
     """
     self.source = source
+    self.symbols = symbols if symbols is not None else SymbolTable()
     self.source_length = len(self.source)
     self.tokens = []
     self.start = 0
@@ -27,6 +33,17 @@ class Scanner(object):
     self.tokens.append(Token(TokenType.EOF, "", None, self.line))
     return self.tokens
 
+  def iter_tokens(self) -> Iterator[Token]:
+    """Lexing lazily, yield tokens as soon as they are scanned
+    """
+    while not self.is_at_end():
+      self.start = self.current
+      self.scan_token()
+      self.advance()
+      yield from self.tokens
+      self.tokens.clear()
+    yield Token(TokenType.EOF, "", None, self.line)
+
   def is_at_end(self):
     return self.current >= self.source_length
 
@@ -59,7 +76,7 @@ class Scanner(object):
         error_handler.error(self.line, message="Unterminated string.")
         return
       self.advance()
-      str_value = self.source[self.start+1: self.current]
+      str_value = self.symbols.intern(self.source[self.start+1: self.current])
       self.add_token(TokenType.STRING, str_value)
     elif c.isdigit():
       while self.look_ahead().isdigit(): self.advance()
@@ -109,4 +126,204 @@ class Scanner(object):
         token is number, string
     """
     text: str = self.source[self.start:self.current+1]
-    self.tokens.append(Token(token_type, text, literal, self.line))
\ No newline at end of file
+    if token_type in interned_token_types:
+      text = self.symbols.intern(text)
+    self.tokens.append(Token(token_type, text, literal, self.line))
+
+# one alternative per token class, each preceded by the blanks in front of it.
+# every char of the source is matched by some alternative, the trailing `error`
+# one catches anything unexpected.
+token_regex = re.compile(r"""
+  [ \t\r]*
+  (?:
+     (?P<identifier>(?:[^\W\d_]|_)[^\W_]*)
+    |(?P<operator>[!=<>]=?|[(){},.\-+;*]|/(?!/))
+    |(?P<newline>\n[ \t\r\n]*)
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<string>["'][^"']*["'])
+    |(?P<comment>//[^\n]*)
+    |(?P<unterminated>["'][^"']*)
+    |(?P<error>.)
+    |(?P<blank>\Z)
+  )
+""", re.VERBOSE | re.DOTALL)
+
+# how many chars after a match must be seen before the match is known to be
+# complete. e.g. identifier `ab` may continue with `c`, number `1` with `.5`.
+token_lookahead = {
+  "identifier": 1,
+  "operator": 1,
+  "newline": 0,
+  "number": 2,
+  "string": 0,
+  "comment": 1,
+  "unterminated": 1,
+  "error": 0,
+  "blank": 1,
+}
+
+# operators which can be the first char of a longer token, the other operators
+# are complete without any lookahead
+operator_prefixes = ("!", "=", "<", ">", "/")
+
+chunk_size = 1 << 16
+
+class RegexScanner(Scanner):
+  """scan source code with one compiled master regex.
+  whole runs of digits, identifier chars, blanks and comments are consumed
+  by a single match instead of one `advance` call per char. tokens and
+  error diagnostics are the same as `Scanner`'s.
+  """
+
+  def __init__(self, source, symbols: SymbolTable = None):
+    """
+    :param source: source code str, or a file object / mmap to read source code
+        from in chunks. bytes are decoded as utf-8.
+    :param symbols: see `Scanner`
+    """
+    if isinstance(source, str):
+      super().__init__(source, symbols)
+    else:
+      super().__init__("", symbols)
+      self.source = source
+
+  def iter_tokens(self, chunk_size: int = chunk_size) -> Iterator[Token]:
+    """Lexing lazily. a file object or mmap source is read chunk by chunk, only
+    the unscanned tail of the current chunk is kept in memory.
+    """
+    if isinstance(self.source, str):
+      matches, current = token_regex.finditer(self.source), [self.source]
+    else:
+      current = [""]
+      matches = self.__read_matches(chunk_size, current)
+    for token, _ in self.__tokens(matches, current):
+      yield token
+    yield Token(TokenType.EOF, "", None, self.line)
+
+  def __read_matches(self, chunk_size: int, current: list) -> Iterator:
+    """the master regex matches of a file object or mmap source, read chunk by
+    chunk into current[0]
+    """
+    chunks = self.__read_chunks(chunk_size)
+    buffer, at_eof = "", False
+    pos = 0
+    while True:
+      match = token_regex.match(buffer, pos)
+      kind = match.lastgroup
+      if not at_eof:
+        lookahead = token_lookahead[kind]
+        if kind == "operator" and match.group(kind) not in operator_prefixes:
+          lookahead = 0
+        elif kind == "number" and buffer[match.end():match.end() + 1] not in (".", ""):
+          # only a `.` can continue it
+          lookahead = 1
+        if match.end() + lookahead > len(buffer):
+          # the match may continue in next chunk, rescan it with more source
+          chunk = next(chunks, "")
+          at_eof = not chunk
+          buffer = current[0] = buffer[pos:] + chunk
+          pos = 0
+          continue
+      if kind == "blank":
+        return
+      pos = match.end()
+      yield match
+
+  def __token_spans(self, matches) -> Iterator[Tuple[TokenType, int, int, int]]:
+    """the tokens of master regex matches, as (type, start, end, line) with the
+    span of the lexeme in the string matched. lines are counted from `self.line`
+    on, and errors reported on the way
+    """
+    IDENTIFIER, NUMBER, STRING = TokenType.IDENTIFIER, TokenType.NUMBER, TokenType.STRING
+    token_types = lexeme_token_type_dict
+    line = self.line
+    for match in matches:
+      kind = match.lastgroup
+      if kind == "identifier":
+        start, end = match.span(kind)
+        yield token_types.get(match.group(kind), IDENTIFIER), start, end, line
+      elif kind == "operator":
+        start, end = match.span(kind)
+        yield token_types[match.group(kind)], start, end, line
+      elif kind == "number":
+        start, end = match.span(kind)
+        yield NUMBER, start, end, line
+      elif kind == "newline":
+        line += match.group(kind).count("\n")
+      elif kind == "string":
+        start, end = match.span(kind)
+        line += match.group(kind).count("\n")
+        yield STRING, start, end, line
+      elif kind == "unterminated":
+        line += match.group(kind).count("\n")
+        error_handler.error(line, message="Unterminated string.")
+      elif kind == "error":
+        error_handler.error(line, message="Unexpected character")
+    self.line = line
+
+  def __tokens(self, matches, current: list) -> Iterator[Tuple[Token, int]]:
+    """the Tokens of master regex matches with the offset they start at.
+    current[0] is the string the last match is of
+    """
+    IDENTIFIER, NUMBER, STRING = TokenType.IDENTIFIER, TokenType.NUMBER, TokenType.STRING
+    intern = self.symbols.intern
+    for token_type, start, end, line in self.__token_spans(matches):
+      text = current[0][start:end]
+      if token_type is NUMBER:
+        yield Token(token_type, text, float(text), line), start
+      elif token_type is STRING:
+        yield Token(token_type, intern(text), intern(text[1:-1]), line), start
+      elif token_type is IDENTIFIER or text.isalpha():
+        # identifiers and keywords, like `interned_token_types`
+        yield Token(token_type, intern(text), None, line), start
+      else:
+        yield Token(token_type, text, None, line), start
+
+  def __read_chunks(self, size: int) -> Iterator[str]:
+    """read source chunk by chunk. read1 is preferred so that a pipe yields what
+    is available instead of blocking until a whole chunk arrives.
+    """
+    read = getattr(self.source, "read1", None) or self.source.read
+    decoder = None
+    while True:
+      chunk = read(size)
+      if isinstance(chunk, bytes):
+        decoder = decoder or codecs.getincrementaldecoder("utf-8")()
+        text = decoder.decode(chunk, final=not chunk)
+      else:
+        text = chunk
+      if text:
+        yield text
+      elif not chunk:
+        return
+
+  def scan_tokens(self) -> List[Token]:
+    """Lexing
+    """
+    self.tokens.extend(self.iter_tokens())
+    return self.tokens
+
+  def iter_token_spans(self, pos: int = 0) -> Iterator[Tuple[Token, int]]:
+    """Lexing a str source lazily from offset pos on, whose line is `self.line`.
+    yield each token with the offset it starts at, EOF at the end of the source.
+    """
+    source = self.source
+    yield from self.__tokens(token_regex.finditer(source, pos), [source])
+    yield Token(TokenType.EOF, "", None, self.line), len(source)
+
+  def scan_token_buffer(self) -> TokenBuffer:
+    """Lexing into a compact TokenBuffer, only for a str source.
+    """
+    source = self.source
+    tokens = TokenBuffer(source, self.symbols)
+    append = tokens.append
+    for token_type, start, end, line in self.__token_spans(token_regex.finditer(source)):
+      append(token_type, start, end, line)
+    tokens.append(TokenType.EOF, len(source), len(source), self.line)
+    return tokens
+
+# lexer engines selectable by name
+scanners = {
+  "char": Scanner,
+  "regex": RegexScanner,
+}
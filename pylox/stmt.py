@@ -1,51 +1,46 @@
 from abc import abstractmethod
-from pylox.meta import StmtMeta, make_signature, add_signature
+from pylox.meta import StmtMeta, Visitor
 
 class Stmt(metaclass=StmtMeta):
-  __signature__ = make_signature([])
+  _fields = ()
 
-  def __init__(self, *args, **kwargs):
-    bound = self.__signature__.bind(*args, **kwargs)
-    for name, val in bound.arguments.items():
-      setattr(self, name, val)
-
-@add_signature('statements')
 class Block(Stmt):
-  pass
+  _fields = ('statements',)
+  # slot of its first variable in the frame around it, None if it needs a
+  # frame of its own
+  _attributes = ('base',)
 
-@add_signature('name', 'superclass', 'methods')
 class Class(Stmt):
-  pass
+  _fields = ('name', 'superclass', 'methods')
+  # the local it declares is captured by a closure and kept in a Cell
+  _attributes = ('cell',)
 
-@add_signature('expression')
 class Expression(Stmt):
-  pass
+  _fields = ('expression',)
 
-@add_signature('name', 'params', 'body')
 class Function(Stmt):
-  pass
+  _fields = ('name', 'params', 'body')
+  # (depth, slot) of each variable of enclosing functions it captures, see
+  # `environment.capture`
+  _attributes = ('cell', 'upvalues')
 
-@add_signature('condition', 'thenBranch', 'elseBranch')
 class If(Stmt):
-  pass
+  _fields = ('condition', 'thenBranch', 'elseBranch')
 
-@add_signature('expression')
 class Print(Stmt):
-  pass
+  _fields = ('expression',)
 
-@add_signature('keyword', 'value')
 class Return(Stmt):
-  pass
+  _fields = ('keyword', 'value')
 
-@add_signature('name', 'initializer')
 class Var(Stmt):
-  pass
+  _fields = ('name', 'initializer')
+  _attributes = ('cell',)
 
-@add_signature('condition', 'body')
 class While(Stmt):
-  pass
+  _fields = ('condition', 'body')
 
-class StmtVisitor:
+class StmtVisitor(Visitor):
   @abstractmethod
   def visit_expression_stmt(self, expr):
     raise NotImplementedError()
@@ -0,0 +1,31 @@
+import sys
+
+class SymbolTable(object):
+  """per-program table of interned identifiers, keywords and string literals.
+  every occurrence of a name in the program maps to one str object, so the
+  dict lookups keyed by names (environments, fields, methods) hit the identity
+  fast path instead of comparing chars. symbols are also `sys.intern`ed so they
+  are identical to names the runtime spells as literals, e.g. "this" or "init".
+  a scanner makes one for the program it scans unless given one, so the table
+  lives as long as that program's tokens, not as long as an interpreter.
+  """
+
+  def __init__(self):
+    self.symbols = {}
+
+  def intern(self, text: str) -> str:
+    """the one symbol equal to text
+    """
+    symbol = self.symbols.get(text)
+    if symbol is None:
+      symbol = self.symbols[text] = sys.intern(text)
+    return symbol
+
+  def __contains__(self, text: str):
+    return text in self.symbols
+
+  def __iter__(self):
+    return iter(self.symbols)
+
+  def __len__(self):
+    return len(self.symbols)
@@ -0,0 +1,205 @@
+"""tiered execution: every function starts on the tree walker, which counts
+its calls and the loop iterations it runs. once that count crosses a threshold
+the function, and only that one, is compiled to closures by `TierCompiler`. a
+loop crossing it in the middle of a call goes on compiled, over the frame the
+tree walker built so far.
+the functions and methods it declares are tiered on their own, starting on the
+tree walker too.
+
+calls of global functions in compiled code are speculated to keep calling the
+function the global held when compiling. a call finding another function in the
+global deoptimizes the caller back to the tree walker, and it is not speculated
+on again.
+"""
+from functools import partial
+from pylox.expr import Variable
+from pylox.environment import Cell, new_frame, free_frame
+from pylox.lox_function import LoxFunction
+from pylox.interpreter import Interpreter
+from pylox.closure_compiler import ClosureCompiler, FunctionCode, returned_nil
+from pylox.error import ReturnValue
+from pylox.runtime import is_truthy
+
+class Profile(object):
+  """what a function declaration did so far
+  """
+  __slots__ = ("declaration", "is_initializer", "name", "line", "calls", "back_edges", "heat", "code",
+               "tier_ups", "deopts", "reasons", "unstable")
+
+  def __init__(self, declaration, is_initializer: bool):
+    self.declaration = declaration
+    self.is_initializer = is_initializer
+    self.name = declaration.name.lexeme
+    self.line = declaration.name.line
+    self.calls = 0
+    # iterations of the loops the function ran on the tree walker
+    self.back_edges = 0
+    # calls and iterations since the function last left the compiled tier
+    self.heat = 0
+    # FunctionCode of the function while compiled, None while on the tree walker
+    self.code = None
+    self.tier_ups = 0
+    self.deopts = 0
+    self.reasons = []
+    # globals whose calls are not speculated on anymore
+    self.unstable = set()
+
+class TierCompiler(ClosureCompiler):
+  """compile a hot function, speculating the global functions it calls are not
+  reassigned
+  """
+
+  def __init__(self, interpreter):
+    super().__init__(interpreter)
+    # profile of the function being tiered up
+    self.profile = None
+
+  def compile_function(self, profile: Profile) -> FunctionCode:
+    self.profile = profile
+    try:
+      code = FunctionCode(self, profile.declaration, profile.is_initializer)
+      if code.body is None:
+        code.compile_body()
+      return code
+    finally:
+      self.profile = None
+
+  def compile_loop(self, profile: Profile, stmt):
+    """a function(frame) running the While stmt of the function profile is of
+    """
+    self.profile, self.local = profile, True
+    try:
+      return self.compile(stmt)
+    finally:
+      self.profile, self.local = None, False
+
+  def function_factory(self, declaration, is_initializer: bool):
+    # nested declarations get profiles of their own, instead of compiled code
+    # outliving a deoptimization of the function declaring them
+    return partial(TieredFunction, declaration, None, is_initializer)
+
+  def visit_call_expr(self, expr):
+    generic = super().visit_call_expr(expr)
+    profile, callee = self.profile, expr.callee
+    if profile is None or not isinstance(callee, Variable) or callee.depth is not None:
+      return generic
+    name = callee.name.lexeme
+    cell = self.globals.cell(name)
+    target = cell.value
+    if name in profile.unstable or not isinstance(target, LoxFunction) or target.arity() != len(expr.arguments):
+      return generic
+    arguments = [self.compile(argument) for argument in expr.arguments]
+    interpreter = self.interpreter
+    def speculated_call(frame):
+      if cell.value is not target:
+        interpreter.deoptimize(profile, name)
+        return generic(frame)
+      return target.call(interpreter, [argument(frame) for argument in arguments])
+    return speculated_call
+
+class TieredFunction(LoxFunction):
+  """a LoxFunction running on the tree walker until its declaration gets hot
+  """
+
+  def call(self, interpreter, arguments):
+    profile = interpreter.profile_of(self.declaration, self.is_initializer)
+    profile.calls += 1
+    code = profile.code
+    if code is None:
+      profile.heat += 1
+      if profile.heat < interpreter.threshold:
+        caller, interpreter.profile = interpreter.profile, profile
+        try:
+          return super().call(interpreter, arguments)
+        finally:
+          interpreter.profile = caller
+      code = interpreter.tier_up(profile)
+    # like CompiledFunction.invoke
+    arguments = list(arguments)
+    for i, name in code.cells:
+      arguments[i] = Cell(name, arguments[i])
+    frame = new_frame(self.closure, self.upvalues)
+    frame.values = arguments
+    result = code.body(frame)
+    free_frame(frame)
+    if self.is_initializer:
+      return self.closure.values[0]
+    if result is returned_nil:
+      return None
+    return result
+
+class TieredInterpreter(Interpreter):
+  """`Interpreter` compiling the functions called or looping the most
+  """
+
+  function_class = TieredFunction
+
+  def __init__(self, threshold: int = 1000):
+    """
+    :param threshold: calls and loop iterations of a function before compiling it
+    """
+    super().__init__()
+    self.threshold = threshold
+    self.profiles = {}
+    # profile of the function the tree walker runs, None at the top level
+    self.profile = None
+    self.compiler = TierCompiler(self)
+
+  def profile_of(self, declaration, is_initializer: bool) -> Profile:
+    profile = self.profiles.get(declaration)
+    if profile is None:
+      profile = self.profiles[declaration] = Profile(declaration, is_initializer)
+    return profile
+
+  def tier_up(self, profile: Profile) -> FunctionCode:
+    profile.code = self.compiler.compile_function(profile)
+    profile.tier_ups += 1
+    return profile.code
+
+  def deoptimize(self, profile: Profile, name: str):
+    """send a function back to the tree walker after the global function `name`
+    it called changed. the running compiled code goes on with generic calls
+    """
+    if name in profile.unstable:
+      return
+    profile.unstable.add(name)
+    profile.code = None
+    profile.heat = 0
+    profile.deopts += 1
+    profile.reasons.append(f"{name} reassigned")
+
+  def visit_while_stmt(self, stmt):
+    profile = self.profile
+    if profile is None:
+      return super().visit_while_stmt(stmt)
+    threshold = self.threshold
+    while is_truthy(self.evaluate(stmt.condition)):
+      self.execute(stmt.body)
+      profile.back_edges += 1
+      profile.heat += 1
+      if profile.heat >= threshold:
+        return self.enter_compiled_loop(profile, stmt)
+
+  def enter_compiled_loop(self, profile: Profile, stmt):
+    """tier up the function in the middle of the While stmt and run the rest of
+    the loop compiled. both tiers lay frames out the same, the compiled loop
+    takes over the one of the tree walker
+    """
+    if profile.code is None:
+      self.tier_up(profile)
+    result = self.compiler.compile_loop(profile, stmt)(self.environment)
+    if result is not None:
+      raise ReturnValue(None if result is returned_nil else result)
+
+  def stats(self) -> str:
+    """a table of the functions called, the hottest first, then the operator sites
+    """
+    lines = [f"{'function':<16} {'line':>5} {'calls':>8} {'loops':>8} {'tier':<7} {'ups':>4} {'deopts':>6}"]
+    profiles = sorted(self.profiles.values(), key=lambda p: p.calls + p.back_edges, reverse=True)
+    for p in profiles:
+      tier = "closure" if p.code is not None else "tree"
+      line = f"{p.name:<16} {p.line:>5} {p.calls:>8} {p.back_edges:>8} {tier:<7} {p.tier_ups:>4} {p.deopts:>6}"
+      if p.reasons:
+        line += "  " + ", ".join(p.reasons)
+      lines.append(line)
+    return "\n".join(lines) + "\n\n" + super().stats()
@@ -1,4 +1,6 @@
 from enum import Enum, auto
+from array import array
+from collections import deque
 
 class TokenType(Enum):
   # Single-character tokens.
@@ -59,7 +61,13 @@ class TokenType(Enum):
 # value to TokenType dict
 lexeme_token_type_dict = { member.value: member for name, member in TokenType.__members__.items() }
 
+# identifiers, keywords and strings, whose lexemes are interned by the scanner
+interned_token_types = { TokenType.IDENTIFIER, TokenType.STRING } | {
+  member for member in TokenType if isinstance(member.value, str) and member.value.isalpha() }
+
 class Token(object):
+  __slots__ = ("type", "lexeme", "literal", "line")
+
   def __init__(self, token_type: TokenType, lexeme: str, literal, line: int):
     self.type = token_type
     self.lexeme = lexeme
@@ -69,4 +77,95 @@ class Token(object):
   def __str__(self):
     return f"line: {self.line}, type: {self.type}, lexeme: {self.lexeme}, literal: {self.literal}"
   def __repr__(self):
-    return f"line: {self.line}, type: {self.type}, lexeme: {self.lexeme}, literal: {self.literal}"
\ No newline at end of file
+    return f"line: {self.line}, type: {self.type}, lexeme: {self.lexeme}, literal: {self.literal}"
+
+# TokenType to its small int code in TokenBuffer and back
+token_types = list(TokenType)
+token_type_codes = { member: code for code, member in enumerate(token_types) }
+
+class TokenBuffer(object):
+  """a compact struct-of-arrays token list.
+  a token is a type code, start/end offsets into the source and a line number
+  in four typed arrays, 13 bytes in total. lexeme and literal are only sliced
+  out of the source when the token is read as a `Token`, which the parser does
+  one token at a time, so it can run directly on a buffer.
+  """
+
+  def __init__(self, source: str, symbols=None):
+    """
+    :param source: source code str the offsets point into
+    :param symbols: SymbolTable to intern materialized lexemes through, if any
+    """
+    self.source = source
+    self.symbols = symbols
+    self.types = array("B")
+    self.starts = array("I")
+    self.ends = array("I")
+    self.lines = array("I")
+    # the parser reads the current token over and over
+    self.cached_index = -1
+    self.cached_token = None
+
+  def append(self, token_type: TokenType, start: int, end: int, line: int):
+    self.types.append(token_type_codes[token_type])
+    self.starts.append(start)
+    self.ends.append(end)
+    self.lines.append(line)
+
+  def type(self, index: int) -> TokenType:
+    return token_types[self.types[index]]
+
+  def lexeme(self, index: int) -> str:
+    return self.source[self.starts[index]:self.ends[index]]
+
+  def __len__(self):
+    return len(self.types)
+
+  def __getitem__(self, index: int) -> Token:
+    """materialize the token at index
+    """
+    if index == self.cached_index:
+      return self.cached_token
+    if index < 0:
+      index += len(self.types)
+    token_type = token_types[self.types[index]]
+    lexeme = self.source[self.starts[index]:self.ends[index]]
+    literal = None
+    if token_type == TokenType.NUMBER:
+      literal = float(lexeme)
+    elif self.symbols is not None and token_type in interned_token_types:
+      lexeme = self.symbols.intern(lexeme)
+      if token_type == TokenType.STRING:
+        literal = self.symbols.intern(lexeme[1:-1])
+    elif token_type == TokenType.STRING:
+      literal = lexeme[1:-1]
+    token = Token(token_type, lexeme, literal, self.lines[index])
+    self.cached_index = index
+    self.cached_token = token
+    return token
+
+  def __iter__(self):
+    return (self[index] for index in range(len(self.types)))
+
+class TokenStream(object):
+  """a list-like view over a token iterator with bounded lookahead.
+  tokens are pulled from the iterator on demand and dropped once an index two
+  past them has been read, so only a few tokens are held at once. reading
+  `stream[i + 1]` then `stream[i]` is fine, going further back is not.
+  """
+
+  def __init__(self, tokens):
+    self.tokens = iter(tokens)
+    self.window = deque()
+    # index of window[0]
+    self.offset = 0
+
+  def __getitem__(self, index: int) -> Token:
+    window = self.window
+    while self.offset + len(window) <= index:
+      # past the end of the iterator, keep answering EOF
+      window.append(next(self.tokens, None) or window[-1])
+    while self.offset < index - 1:
+      window.popleft()
+      self.offset += 1
+    return window[index - self.offset]
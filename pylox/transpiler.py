@@ -0,0 +1,579 @@
+import re
+import math
+import keyword
+import builtins
+from pylox.expr import ExprVisitor, Expr, Variable, Assign
+from pylox.stmt import StmtVisitor, Stmt, Function
+from pylox.token import TokenType
+from pylox.error import RuntimeError
+from pylox.environment import UPVALUE
+from pylox.lox_callable import Clock
+from pylox.parser import LazyBody
+from pylox.resolver import Resolver
+from pylox.py_runtime import lox_name
+
+header = """\
+from pylox.token import Token as _Token, TokenType as _TokenType
+from pylox.py_runtime import (Cell as _Cell, Clock as _Clock, Instance as _Instance, lox_print as _print,
+  bang as _bang, add as _add, subtract as _subtract, multiply as _multiply,
+  divide as _divide, greater as _greater, greater_equal as _greater_equal, less as _less,
+  less_equal as _less_equal, negate as _negate, call as _call, get as _get, fields as _fields,
+  set_field as _set_field, set_cell as _set_cell, superclass as _superclass,
+  super_method as _super_method, global_setter as _global_setter)
+_set_global = _global_setter(globals())
+"""
+
+# helper of each binary operator on operands that may not be numbers
+binary_helpers = {
+  TokenType.PLUS: "_add",
+  TokenType.MINUS: "_subtract",
+  TokenType.STAR: "_multiply",
+  TokenType.SLASH: "_divide",
+  TokenType.GREATER: "_greater",
+  TokenType.GREATER_EQUAL: "_greater_equal",
+  TokenType.LESS: "_less",
+  TokenType.LESS_EQUAL: "_less_equal",
+}
+
+comparisons = {TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL}
+
+# python code without side effects, which can be evaluated twice
+simple_code = re.compile(r"[A-Za-z_]\w*(\.value)?\Z|-?[\d.]+(e[+-]?\d+)?\Z|'.*'\Z|\".*\"\Z")
+# python code whose value no assignment changes
+constant_code = re.compile(r"None\Z|True\Z|False\Z|-?[\d.]+(e[+-]?\d+)?\Z|'.*'\Z|\".*\"\Z")
+
+class Context(object):
+  """a python function being generated: a function body, or a block at the top
+  level, which runs in a def of its own so its variables stay local
+  """
+
+  def __init__(self, upvalues, taken, is_initializer=False):
+    # python name of each upvalue, the parameters of the factory of a function
+    self.upvalues = upvalues
+    # python names the variables of the frame must not take
+    self.taken = taken
+    self.is_initializer = is_initializer
+
+class Transpiler(ExprVisitor, StmtVisitor):
+  """translate resolved statements into python source run with a module
+  namespace. globals are module globals, variables of functions python locals.
+
+  the frames the other engines create are mirrored while translating: each
+  slot of a frame is a python variable, and a variable reference picks the
+  python variable from the depth and slot it resolved to. a function capturing
+  variables is created by a factory taking their values, or the Cell of an
+  assigned one, so each run of a declaration in a loop gets its own binding
+  like in the other engines. lox expressions that python evaluates the same
+  way, e.g. arithmetic on numbers known statically, become python operators,
+  the others calls into `pylox.py_runtime`.
+  """
+
+  def __init__(self):
+    # numbers the helper names of the generated code, across translations so
+    # that the modules of a session can share a namespace
+    self.counter = 0
+    self.lines = []
+    self.indent = 0
+    # one list of (python name, boxed) per frame, by slot
+    self.frames = []
+    self.contexts = []
+    # python names of the globals the code reads or writes
+    self.globals = set()
+    # definitions of the tokens and factories the code refers to
+    self.definitions = []
+    self.token_names = {}
+
+  def transpile(self, stmts) -> str:
+    """python source running stmts, in a namespace `header` ran in
+    """
+    self.lines, self.definitions, self.token_names = [], [], {}
+    self.globals = {self.global_name(name) for name in self.global_names(stmts)}
+    for stmt in stmts:
+      self.statement(stmt)
+    return "".join(line + "\n" for line in self.definitions + self.lines)
+
+  def module(self, stmts) -> str:
+    """a python module running stmts
+    """
+    return header + "clock = _Clock()\n" + self.transpile(stmts)
+
+  def global_names(self, nodes):
+    """lox names of the globals referenced in nodes
+    """
+    for node in nodes:
+      if isinstance(node, (Variable, Assign)) and node.depth is None:
+        yield node.name.lexeme
+      if isinstance(node, Function):
+        self.materialize(node)
+        yield from self.global_names(node.body.statements)
+        continue
+      for field in node._fields:
+        value = getattr(node, field)
+        if isinstance(value, (Expr, Stmt)):
+          yield from self.global_names([value])
+        elif isinstance(value, list):
+          yield from self.global_names(value)
+
+  def materialize(self, declaration):
+    if isinstance(declaration.body, LazyBody):
+      if Resolver.materialize(declaration) is None:
+        raise RuntimeError(declaration.name, "Function body has errors.")
+
+  @staticmethod
+  def global_name(name: str) -> str:
+    """python names of lox globals are the lox name, unless it is a python
+    keyword or starts with _, which is reserved to the generated code
+    """
+    if keyword.iskeyword(name) or name.startswith("_"):
+      return f"_v0_{name}"
+    return name
+
+  def local_name(self, name: str, taken) -> str:
+    """a python name for a lox local, other than the ones taken
+    """
+    if name not in taken and self.global_name(name) == name:
+      return name
+    version = 1
+    while f"_v{version}_{name}" in taken:
+      version += 1
+    return f"_v{version}_{name}"
+
+  def unique(self, prefix: str) -> str:
+    self.counter += 1
+    return f"_{prefix}{self.counter}"
+
+  def token(self, token) -> str:
+    name = self.token_names.get(id(token))
+    if name is None:
+      name = self.token_names[id(token)] = self.unique("tok")
+      self.definitions.append(
+        f"{name} = _Token(_TokenType.{token.type.name}, {token.lexeme!r}, {token.literal!r}, {token.line})")
+    return name
+
+  def emit(self, line: str):
+    self.lines.append("  " * self.indent + line)
+
+  def suite(self, stmts):
+    """the indented statements of a python compound statement
+    """
+    self.indent += 1
+    start = len(self.lines)
+    for stmt in stmts:
+      self.statement(stmt)
+    if len(self.lines) == start:
+      self.emit("pass")
+    self.indent -= 1
+
+  def statement(self, stmt):
+    if isinstance(stmt, Expr):
+      # the increment of a desugared for loop
+      self.expression_statement(stmt)
+      return
+    self.dispatch[stmt.__class__](self, stmt)
+
+  def expression(self, expr):
+    """(python code, static type) of expr. the type is "number", "str", "bool"
+    or None if unknown. code it needs to run first, e.g. an assignment in an
+    expression, is emitted before.
+    """
+    return self.dispatch[expr.__class__](self, expr)
+
+  def buffered(self, compile):
+    """the lines compile emits and what it returns
+    """
+    lines, self.lines = self.lines, []
+    try:
+      result = compile()
+      return self.lines, result
+    finally:
+      self.lines = lines
+
+  def operands(self, *compiles):
+    """compile operands in order. the ones before an operand emitting lines
+    are saved in temporaries first, so they are still evaluated before it.
+    """
+    compiled = [self.buffered(compile) for compile in compiles]
+    results = []
+    for i, (lines, (code, kind)) in enumerate(compiled):
+      self.lines.extend(lines)
+      if not constant_code.match(code) and any(later for later, _ in compiled[i + 1:]):
+        code = self.temporary(code)
+      results.append((code, kind))
+    return results
+
+  def temporary(self, code: str) -> str:
+    name = self.unique("tmp")
+    self.emit(f"{name} = {code}")
+    return name
+
+  def truth(self, code: str, kind) -> str:
+    """python condition true if the lox value of code is truthy
+    """
+    if kind == "bool":
+      return code
+    if constant_code.match(code):
+      return repr(code not in ("None", "False"))
+    if not simple_code.match(code):
+      code = self.temporary(code)
+    return f"{code} is not None and {code} is not False"
+
+  def variable(self, expr):
+    """python code of the variable expr resolved to
+    """
+    depth, slot = expr.depth, expr.slot
+    if depth is None:
+      return self.global_name(expr.name.lexeme)
+    if depth == UPVALUE:
+      name = self.contexts[-1].upvalues[slot]
+    else:
+      name = self.frames[-1 - depth][slot][0]
+    return f"{name}.value" if expr.cell else name
+
+  def declare(self, name: str, boxed: bool) -> str:
+    """python name of a variable declared in the current frame
+    """
+    if not self.frames:
+      return self.global_name(name)
+    frame = self.frames[-1]
+    python_name = self.local_name(name, self.contexts[-1].taken | {local for local, _ in frame})
+    frame.append((python_name, boxed))
+    return python_name
+
+  def assign(self, expr, value: str, statement: bool) -> str:
+    """assign value to the variable of expr, return the code of the assigned
+    value if statement is False
+    """
+    depth = expr.depth
+    if depth is None:
+      code = f"_set_global({self.global_name(expr.name.lexeme)!r}, {value})"
+    elif expr.cell:
+      cell = self.variable(expr)[:-len(".value")]
+      if statement:
+        self.emit(f"{cell}.value = {value}")
+        return None
+      code = f"_set_cell({cell}, {value})"
+    else:
+      name = self.variable(expr)
+      self.emit(f"{name} = {value}")
+      return name
+    if statement:
+      self.emit(code)
+      return None
+    return code
+
+  def expression_statement(self, expr):
+    if isinstance(expr, Assign):
+      value, _ = self.expression(expr.value)
+      self.assign(expr, value, True)
+      return
+    code, _ = self.expression(expr)
+    if isinstance(expr, Variable) or not simple_code.match(code):
+      # a variable is still read, it can be undefined
+      self.emit(code)
+
+  def function(self, declaration, name: str, is_method: bool, is_initializer: bool, upvalues):
+    """emit the def of a function whose upvalues are the python variables
+    upvalues
+    """
+    self.materialize(declaration)
+    if is_method:
+      # the frame of the bound method
+      self.frames.append([("this", False)])
+    frame = []
+    self.frames.append(frame)
+    context = Context(upvalues, self.globals | set(upvalues), is_initializer)
+    self.contexts.append(context)
+    params = [self.declare(param.name.lexeme, param.cell) for param in declaration.params]
+    self.emit(f"def {name}({', '.join((['this'] if is_method else []) + params)}):")
+    self.indent += 1
+    for param, python_name in zip(declaration.params, params):
+      if param.cell:
+        self.emit(f"{python_name} = _Cell({param.name.lexeme!r}, {python_name})")
+    self.indent -= 1
+    body = declaration.body.statements
+    self.suite(body)
+    if is_initializer:
+      self.indent += 1
+      self.emit("return this")
+      self.indent -= 1
+    self.contexts.pop()
+    self.frames.pop()
+    if is_method:
+      self.frames.pop()
+
+  def closure(self, declaration, lox_name: str, is_method: bool, is_initializer: bool) -> str:
+    """emit a factory of the functions a declaration in a frame creates,
+    return the code calling it
+    """
+    upvalues = []
+    for depth, slot in declaration.upvalues:
+      if depth == UPVALUE:
+        upvalues.append(self.contexts[-1].upvalues[slot])
+      else:
+        upvalues.append(self.frames[-1 - depth][slot][0])
+    factory = self.unique("make")
+    if is_method:
+      name = f"_m_{lox_name}"
+    else:
+      name = self.local_name(lox_name, self.globals | set(upvalues))
+    lines, indent = self.lines, self.indent
+    self.lines, self.indent = [], 0
+    frames, self.frames = self.frames, []
+    try:
+      self.emit(f"def {factory}({', '.join(upvalues)}):")
+      self.indent += 1
+      self.function(declaration, name, is_method, is_initializer, upvalues)
+      self.emit(f"return {name}")
+      self.definitions.extend(self.lines)
+    finally:
+      self.lines, self.indent, self.frames = lines, indent, frames
+    return f"{factory}({', '.join(upvalues)})"
+
+  def visit_assign_expr(self, expr):
+    value, kind = self.expression(expr.value)
+    return self.assign(expr, value, False), kind
+
+  def visit_binary_expr(self, expr):
+    (left, left_kind), (right, right_kind) = self.operands(
+      lambda: self.expression(expr.left), lambda: self.expression(expr.right))
+    operator_type = expr.operator.type
+    numbers = left_kind == right_kind == "number"
+    if operator_type == TokenType.EQUAL_EQUAL:
+      return f"({left} == {right})", "bool"
+    if operator_type == TokenType.BANG_EQUAL:
+      return f"({left} != {right})", "bool"
+    if operator_type in comparisons:
+      kind = "bool"
+    elif operator_type == TokenType.PLUS:
+      if numbers:
+        kind = "number"
+      elif left_kind == "str" or (left_kind == "number" and right_kind == "str"):
+        kind = "str"
+      else:
+        kind = None
+      if left_kind == right_kind == "str":
+        return f"({left} + {right})", kind
+    else:
+      kind = "number"
+    if numbers:
+      return f"({left} {expr.operator.lexeme} {right})", kind
+    return f"{binary_helpers[operator_type]}({left}, {right})", kind
+
+  def visit_call_expr(self, expr):
+    operands = self.operands(lambda: self.expression(expr.callee),
+      *[lambda argument=argument: self.expression(argument) for argument in expr.arguments])
+    codes = [operands[0][0], self.token(expr.paren)] + [code for code, _ in operands[1:]]
+    return f"_call({', '.join(codes)})", None
+
+  def visit_get_expr(self, expr):
+    instance, _ = self.expression(expr.object)
+    return f"_get({instance}, {self.token(expr.name)})", None
+
+  def visit_grouping_expr(self, expr):
+    return self.expression(expr.expression)
+
+  def visit_literal_expr(self, expr):
+    value = expr.value
+    if value.__class__ is float:
+      return ("1e999" if value > 0 else "-1e999") if math.isinf(value) else repr(value), "number"
+    if isinstance(value, str):
+      return repr(value), "str"
+    if isinstance(value, bool):
+      return repr(value), "bool"
+    return repr(value), None
+
+  def visit_logical_expr(self, expr):
+    left, left_kind = self.expression(expr.left)
+    self.indent += 1
+    lines, (right, right_kind) = self.buffered(lambda: self.expression(expr.right))
+    self.indent -= 1
+    kind = "bool" if left_kind == right_kind == "bool" else None
+    is_or = expr.operator.type == TokenType.OR
+    if left_kind == "bool" and not lines:
+      return f"({left} {'or' if is_or else 'and'} {right})", kind
+    result = self.temporary(left)
+    condition = self.truth(result, left_kind)
+    self.emit(f"if not ({condition}):" if is_or else f"if {condition}:")
+    self.lines.extend(lines)
+    self.indent += 1
+    self.emit(f"{result} = {right}")
+    self.indent -= 1
+    return result, kind
+
+  def visit_set_expr(self, expr):
+    def instance():
+      code, _ = self.expression(expr.object)
+      return f"_fields({code}, {self.token(expr.name)})", None
+    (fields, _), (value, kind) = self.operands(instance, lambda: self.expression(expr.value))
+    return f"_set_field({fields}, {expr.name.lexeme!r}, {value})", kind
+
+  def visit_super_expr(self, expr):
+    return f"_super_method({self.variable(expr)}, {self.variable(expr.this)}, {self.token(expr.method)})", None
+
+  def visit_this_expr(self, expr):
+    return self.variable(expr), None
+
+  def visit_unary_expr(self, expr):
+    right, kind = self.expression(expr.right)
+    if expr.operator.type == TokenType.BANG:
+      if kind == "bool":
+        return f"(not {right})", "bool"
+      if constant_code.match(right):
+        return repr(right in ("None", "False")), "bool"
+      if simple_code.match(right):
+        return f"({right} is None or {right} is False)", "bool"
+      return f"_bang({right})", "bool"
+    if kind == "number":
+      return f"(-{right})", "number"
+    return f"_negate({right})", "number"
+
+  def visit_variable_expr(self, expr):
+    return self.variable(expr), None
+
+  def visit_block_stmt(self, stmt):
+    if stmt.base is not None:
+      for s in stmt.statements:
+        self.statement(s)
+      # the next declarations take the slots of the ones of the block
+      del self.frames[-1][stmt.base:]
+      return
+    # a block at the top level, its variables are locals of a def
+    name = self.unique("block")
+    self.emit(f"def {name}():")
+    self.frames.append([])
+    self.contexts.append(Context([], self.globals))
+    self.suite(stmt.statements)
+    self.contexts.pop()
+    self.frames.pop()
+    self.emit(f"{name}()")
+
+  def visit_class_stmt(self, stmt):
+    lox_class = stmt.name.lexeme
+    boxed = bool(self.frames) and stmt.cell
+    if boxed:
+      # methods capture the cell before the class is in it
+      cell = self.declare(lox_class, True)
+      self.emit(f"{cell} = _Cell({lox_class!r})")
+    base = "_Instance"
+    if stmt.superclass:
+      superclass, _ = self.expression(stmt.superclass)
+      base = self.unique("super")
+      self.emit(f"{base} = _superclass({superclass}, {self.token(stmt.superclass.name)})")
+      self.frames.append([(base, False)])
+    methods = [(method.name.lexeme, self.closure(method, method.name.lexeme, True, method.name.lexeme == "init"))
+               for method in stmt.methods]
+    if stmt.superclass:
+      self.frames.pop()
+    if boxed:
+      name = self.local_name(lox_class, self.contexts[-1].taken | {local for local, _ in self.frames[-1]})
+    else:
+      name = self.declare(lox_class, False)
+    self.emit(f"class {name}({base}):")
+    self.indent += 1
+    for method, factory in methods:
+      self.emit(f"_m_{method} = {factory}")
+    if not methods:
+      self.emit("pass")
+    self.indent -= 1
+    if boxed:
+      self.emit(f"{cell}.value = {name}")
+
+  def visit_expression_stmt(self, stmt):
+    self.expression_statement(stmt.expression)
+
+  def visit_function_stmt(self, stmt):
+    lox_function = stmt.name.lexeme
+    if not self.frames:
+      self.function(stmt, self.global_name(lox_function), False, False, [])
+      return
+    if stmt.cell:
+      # the function can call itself through the cell
+      cell = self.declare(lox_function, True)
+      self.emit(f"{cell} = _Cell({lox_function!r})")
+      self.emit(f"{cell}.value = {self.closure(stmt, lox_function, False, False)}")
+      return
+    factory = self.closure(stmt, lox_function, False, False)
+    self.emit(f"{self.declare(lox_function, False)} = {factory}")
+
+  def visit_if_stmt(self, stmt):
+    condition = self.truth(*self.expression(stmt.condition))
+    self.emit(f"if {condition}:")
+    self.suite([stmt.thenBranch])
+    if stmt.elseBranch:
+      self.emit("else:")
+      self.suite([stmt.elseBranch])
+
+  def visit_print_stmt(self, stmt):
+    code, _ = self.expression(stmt.expression)
+    self.emit(f"_print({code})")
+
+  def visit_return_stmt(self, stmt):
+    if self.contexts[-1].is_initializer:
+      self.emit("return this")
+    elif stmt.value:
+      code, _ = self.expression(stmt.value)
+      self.emit(f"return {code}")
+    else:
+      self.emit("return")
+
+  def visit_var_stmt(self, stmt):
+    value = "None"
+    if stmt.initializer:
+      value, _ = self.expression(stmt.initializer)
+    boxed = bool(self.frames) and stmt.cell
+    name = self.declare(stmt.name.lexeme, boxed)
+    if boxed:
+      value = f"_Cell({stmt.name.lexeme!r}, {value})"
+    self.emit(f"{name} = {value}")
+
+  def visit_while_stmt(self, stmt):
+    self.indent += 1
+    lines, condition = self.buffered(lambda: self.truth(*self.expression(stmt.condition)))
+    self.indent -= 1
+    if not lines:
+      self.emit(f"while {condition}:")
+    else:
+      # the condition needs statements, run them on every iteration
+      self.emit("while True:")
+      self.lines.extend(lines)
+      self.indent += 1
+      self.emit(f"if not ({condition}): break")
+      self.indent -= 1
+    self.suite([stmt.body])
+
+class PyInterpreter(object):
+  """translate resolved programs into python with `Transpiler` and run them
+  with exec, with the same semantics as `Interpreter`.
+  """
+
+  def __init__(self):
+    self.namespace = {"__name__": "lox"}
+    exec(compile(header, "<pylox>", "exec"), self.namespace)
+    # the lox programs only see their globals, the generated classes need
+    # __build_class__
+    self.namespace["__builtins__"] = {"__build_class__": builtins.__build_class__}
+    self.namespace["clock"] = Clock()
+    self.transpiler = Transpiler()
+
+  def compile(self, stmts):
+    """a code object running stmts
+    """
+    return compile(self.transpiler.transpile(stmts), "<pylox>", "exec")
+
+  def interprete(self, program):
+    """
+    :param program: resolved statements, or a code object `compile` returned
+    """
+    if isinstance(program, list):
+      program = self.compile(program)
+    try:
+      exec(program, self.namespace)
+    except RuntimeError as e:
+      print(e)
+      return False
+    except NameError as e:
+      # an undefined global
+      name = getattr(e, "name", None) or re.search(r"'(.*)'", str(e)).group(1)
+      print(RuntimeError(f"Undefined variable: {lox_name(name)}"))
+      return False
+    return True
@@ -0,0 +1,360 @@
+from pylox.error import RuntimeError
+from pylox.environment import Environment, Frame, Cell, undefined, capture, new_frame, free_frame
+from pylox.lox_callable import LoxCallable, Clock
+from pylox.lox_class import LoxClass, LoxInstance
+from pylox.token import TokenType
+from pylox.runtime import binary_operators, unary_operators
+from pylox.bytecode import OpCode, Compiler, FunctionProto
+
+class VMFunction(LoxCallable):
+  """a closure over a FunctionProto
+  """
+
+  def __init__(self, proto: FunctionProto, closure, upvalues):
+    self.proto = proto
+    # the frame holding this for a bound method
+    self.closure = closure
+    self.upvalues = upvalues
+
+  def call(self, interpreter, arguments):
+    return interpreter.run_function(self, list(arguments))
+
+  def bind(self, instance):
+    frame = Frame(None)
+    frame.values.append(instance)
+    return VMFunction(self.proto, frame, self.upvalues)
+
+  def arity(self):
+    return self.proto.arity
+
+  def __repr__(self):
+    return f"<fn {self.proto.name}>"
+
+class VM(object):
+  """compile resolved programs into bytecode with `Compiler` and run it on a
+  stack machine, with the same semantics as `Interpreter`.
+
+  calls between Lox functions push a call frame instead of recursing in
+  python, so the depth of Lox recursion is only bound by `max_calls`.
+  """
+
+  # nested calls before a runaway recursion is a "Stack overflow." error
+  max_calls = 100000
+
+  def __init__(self):
+    self.globals = Environment()
+    self.globals.define("clock", Clock())
+    self.compiler = Compiler(self)
+
+  def compile(self, stmts) -> list:
+    """one Chunk per statement
+    """
+    return [self.compiler.compile_statement(stmt) for stmt in stmts]
+
+  def interprete(self, program):
+    """
+    :param program: resolved statements, or a list `compile` returned
+    """
+    if program and not hasattr(program[0], "code"):
+      program = self.compile(program)
+    try:
+      for chunk in program:
+        self.run(chunk, self.globals, None)
+    except RuntimeError as e:
+      print(e)
+      return False
+    return True
+
+  def run_function(self, function: VMFunction, arguments: list):
+    proto = function.proto
+    if proto.chunk is None:
+      proto.compile()
+    for i, name in proto.cells:
+      arguments[i] = Cell(name, arguments[i])
+    frame = new_frame(function.closure, function.upvalues)
+    frame.values = arguments
+    return self.run(proto.chunk, frame, function)
+
+  def run(self, chunk, frame, function):
+    """run chunk in frame until it returns, function is the one running, None
+    for a top level statement. return the result.
+    """
+    (CONSTANT, NIL, TRUE, FALSE, POP, GET_LOCAL, SET_LOCAL, GET_CELL, SET_CELL,
+     GET_LOCAL_AT, SET_LOCAL_AT, GET_CELL_AT, SET_CELL_AT, GET_UPVALUE, GET_UPVALUE_CELL,
+     SET_UPVALUE_CELL, GET_GLOBAL, SET_GLOBAL, DEFINE_GLOBAL, DEFINE_LOCAL, DEFINE_LOCAL_CELL,
+     NEW_CELL, FILL_CELL, TRUNCATE, PUSH_FRAME, POP_FRAME, GET_PROPERTY, CHECK_FIELDS,
+     SET_PROPERTY, GET_SUPER, EQUAL, NOT_EQUAL, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL,
+     ADD, SUBTRACT, MULTIPLY, DIVIDE, NOT, NEGATE, PRINT, JUMP, JUMP_IF_FALSE,
+     JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, CALL, FUNCTION, CLASS, RETURN) = range(len(OpCode))
+    # code, constants, ip, frame and function of the callers
+    calls = []
+    max_calls = self.max_calls
+    stack = []
+    push, pop = stack.append, stack.pop
+    code, constants, ip = chunk.code, chunk.constants, 0
+    while True:
+      op = code[ip]
+      # hot instructions first, a chain of ifs is the dispatch
+      if op == GET_LOCAL:
+        push(frame.values[code[ip + 1]])
+        ip += 2
+      elif op == CONSTANT:
+        push(constants[code[ip + 1]])
+        ip += 2
+      elif op == GET_GLOBAL:
+        cell = constants[code[ip + 1]]
+        value = cell.value
+        if value is undefined:
+          raise RuntimeError(f'Undefined variable: {cell.name}')
+        push(value)
+        ip += 2
+      elif op == JUMP_IF_FALSE:
+        value = pop()
+        if value is None or value is False:
+          ip = code[ip + 1]
+        else:
+          ip += 2
+      elif GREATER <= op <= DIVIDE:
+        right = pop()
+        left = stack[-1]
+        if left.__class__ is float and right.__class__ is float:
+          if op == ADD:
+            stack[-1] = left + right
+          elif op == SUBTRACT:
+            stack[-1] = left - right
+          elif op == LESS:
+            stack[-1] = left < right
+          elif op == MULTIPLY:
+            stack[-1] = left * right
+          elif op == LESS_EQUAL:
+            stack[-1] = left <= right
+          elif op == GREATER:
+            stack[-1] = left > right
+          elif op == GREATER_EQUAL:
+            stack[-1] = left >= right
+          else:
+            stack[-1] = left / right
+        else:
+          stack[-1] = binary_operators[binary_tokens[op]](left, right)
+        ip += 1
+      elif op == JUMP:
+        ip = code[ip + 1]
+      elif op == SET_LOCAL:
+        frame.values[code[ip + 1]] = stack[-1]
+        ip += 2
+      elif op == POP:
+        pop()
+        ip += 1
+      elif op == CALL:
+        count = code[ip + 1]
+        callee = stack[-1 - count]
+        ip += 3
+        if callee.__class__ is VMFunction:
+          proto = callee.proto
+        elif callee.__class__ is LoxClass:
+          instance = LoxInstance(callee)
+          initializer = callee.methods.get("init")
+          if initializer is None:
+            if count:
+              raise RuntimeError(constants[code[ip - 1]], f"Expected 0 arguments but got {count}.")
+            stack[-1] = instance
+            continue
+          callee = initializer.bind(instance)
+          proto = callee.proto
+        else:
+          arguments = stack[len(stack) - count:]
+          del stack[len(stack) - count - 1:]
+          push(self.call_native(callee, arguments, constants[code[ip - 1]]))
+          continue
+        if proto.arity != count:
+          raise RuntimeError(constants[code[ip - 1]], f"Expected {proto.arity} arguments but got {count}.")
+        if proto.chunk is None:
+          proto.compile()
+        arguments = stack[len(stack) - count:]
+        del stack[len(stack) - count - 1:]
+        for i, name in proto.cells:
+          arguments[i] = Cell(name, arguments[i])
+        if len(calls) >= max_calls:
+          raise RuntimeError(constants[code[ip - 1]], "Stack overflow.")
+        calls.append((code, constants, ip, frame, function))
+        frame = new_frame(callee.closure, callee.upvalues)
+        frame.values = arguments
+        function = callee
+        chunk = proto.chunk
+        code, constants, ip = chunk.code, chunk.constants, 0
+      elif op == RETURN:
+        result = pop()
+        if function is not None:
+          if function.proto.is_initializer:
+            result = function.closure.values[0]
+          free_frame(frame)
+        if not calls:
+          return result
+        code, constants, ip, frame, function = calls.pop()
+        push(result)
+      elif op == GET_UPVALUE:
+        push(frame.upvalues[code[ip + 1]])
+        ip += 2
+      elif op == GET_CELL:
+        push(frame.values[code[ip + 1]].value)
+        ip += 2
+      elif op == GET_UPVALUE_CELL:
+        push(frame.upvalues[code[ip + 1]].value)
+        ip += 2
+      elif op == DEFINE_LOCAL:
+        frame.values.append(pop())
+        ip += 1
+      elif op == TRUNCATE:
+        # the next run of the block defines its variables in the same slots
+        del frame.values[code[ip + 1]:]
+        ip += 2
+      elif op == GET_PROPERTY:
+        instance = stack[-1]
+        name = constants[code[ip + 1]]
+        if not isinstance(instance, LoxInstance):
+          raise RuntimeError(name, "Only instances have properties.")
+        stack[-1] = instance.get(name)
+        ip += 2
+      elif op == EQUAL:
+        right = pop()
+        stack[-1] = stack[-1] == right
+        ip += 1
+      elif op == NOT_EQUAL:
+        right = pop()
+        stack[-1] = not stack[-1] == right
+        ip += 1
+      elif op == JUMP_IF_FALSE_OR_POP:
+        value = stack[-1]
+        if value is None or value is False:
+          ip = code[ip + 1]
+        else:
+          pop()
+          ip += 2
+      elif op == JUMP_IF_TRUE_OR_POP:
+        value = stack[-1]
+        if value is None or value is False:
+          pop()
+          ip += 2
+        else:
+          ip = code[ip + 1]
+      elif op == SET_GLOBAL:
+        cell = constants[code[ip + 1]]
+        if cell.value is undefined:
+          raise RuntimeError(f'Undefined variable: {cell.name}')
+        cell.value = stack[-1]
+        ip += 2
+      elif op == SET_CELL:
+        frame.values[code[ip + 1]].value = stack[-1]
+        ip += 2
+      elif op == SET_UPVALUE_CELL:
+        frame.upvalues[code[ip + 1]].value = stack[-1]
+        ip += 2
+      elif op == NIL:
+        push(None)
+        ip += 1
+      elif op == TRUE:
+        push(True)
+        ip += 1
+      elif op == FALSE:
+        push(False)
+        ip += 1
+      elif op == NOT:
+        value = stack[-1]
+        stack[-1] = value is None or value is False
+        ip += 1
+      elif op == NEGATE:
+        value = stack[-1]
+        stack[-1] = -value if value.__class__ is float else unary_operators[TokenType.MINUS](value)
+        ip += 1
+      elif op == PRINT:
+        print(pop())
+        ip += 1
+      elif op == CHECK_FIELDS:
+        if not isinstance(stack[-1], LoxInstance):
+          raise RuntimeError(constants[code[ip + 1]], "Only instances have fields.")
+        ip += 2
+      elif op == SET_PROPERTY:
+        value = pop()
+        stack[-1].set(constants[code[ip + 1]].lexeme, value)
+        stack[-1] = value
+        ip += 2
+      elif op == GET_SUPER:
+        this = pop()
+        method = constants[code[ip + 1]]
+        bound = stack[-1].find_method(this, method.lexeme)
+        if not bound:
+          raise RuntimeError(method, f"Undefined property '{method.lexeme}'.")
+        stack[-1] = bound
+        ip += 2
+      elif op == GET_LOCAL_AT:
+        push(frame.get_at(code[ip + 1], code[ip + 2]))
+        ip += 3
+      elif op == SET_LOCAL_AT:
+        frame.assign_at(code[ip + 1], code[ip + 2], stack[-1])
+        ip += 3
+      elif op == GET_CELL_AT:
+        push(frame.get_at(code[ip + 1], code[ip + 2]).value)
+        ip += 3
+      elif op == SET_CELL_AT:
+        frame.get_at(code[ip + 1], code[ip + 2]).value = stack[-1]
+        ip += 3
+      elif op == DEFINE_GLOBAL:
+        constants[code[ip + 1]].value = pop()
+        ip += 2
+      elif op == DEFINE_LOCAL_CELL:
+        frame.values.append(Cell(constants[code[ip + 1]], pop()))
+        ip += 2
+      elif op == NEW_CELL:
+        cell = Cell(constants[code[ip + 1]])
+        frame.values.append(cell)
+        push(cell)
+        ip += 2
+      elif op == FILL_CELL:
+        value = pop()
+        pop().value = value
+        ip += 1
+      elif op == FUNCTION:
+        proto = constants[code[ip + 1]]
+        push(VMFunction(proto, None, capture(proto.upvalues, frame)))
+        ip += 2
+      elif op == CLASS:
+        proto = constants[code[ip + 1]]
+        parent, environment = None, frame
+        if proto.superclass is not None:
+          parent = pop()
+          if not isinstance(parent, LoxClass):
+            raise RuntimeError(proto.superclass, "Superclass must be a class.")
+          environment = Frame(frame, frame.upvalues)
+          environment.values.append(parent)
+        methods = {method.name: VMFunction(method, None, capture(method.upvalues, environment))
+                   for method in proto.methods}
+        push(LoxClass(proto.name, parent, methods))
+        ip += 2
+      elif op == PUSH_FRAME:
+        frame = new_frame(frame, frame.upvalues)
+        ip += 1
+      elif op == POP_FRAME:
+        block_frame, frame = frame, frame.enclosing
+        free_frame(block_frame)
+        ip += 1
+      else:
+        raise ValueError(f"unknown opcode {op} at {ip}")
+
+  def call_native(self, callee, arguments, paren):
+    if not isinstance(callee, LoxCallable):
+      raise RuntimeError(paren, "Can only call functions and classes.")
+    if len(arguments) != callee.arity():
+      raise RuntimeError(paren, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+    return callee.call(self, arguments)
+
+# operator token of each binary opcode, for the generic operators
+binary_tokens = {
+  OpCode.GREATER: TokenType.GREATER,
+  OpCode.GREATER_EQUAL: TokenType.GREATER_EQUAL,
+  OpCode.LESS: TokenType.LESS,
+  OpCode.LESS_EQUAL: TokenType.LESS_EQUAL,
+  OpCode.ADD: TokenType.PLUS,
+  OpCode.SUBTRACT: TokenType.MINUS,
+  OpCode.MULTIPLY: TokenType.STAR,
+  OpCode.DIVIDE: TokenType.SLASH,
+}
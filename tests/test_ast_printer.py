@@ -1,8 +1,9 @@
+import io
 from tests.test_base import LoxTestBase
 from pylox.expr import Assign, Binary, Unary, Literal, Grouping
 from pylox.token import Token, TokenType
 from pylox.ast_printer import AstPrinter
-from pylox.scanner import Scanner
+from pylox.scanner import Scanner, RegexScanner
 from pylox.parser import Parser
 
 
@@ -19,4 +20,39 @@ class TestAstPrinter(LoxTestBase):
     with open("tests/data/test_ast_printer.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       output = [printer.print(stmt) for stmt in stmts]
-      self.assertTrue(len(output) > 0)
\ No newline at end of file
+      self.assertTrue(len(output) > 0)
+
+  def test_statements(self):
+    source = """
+    class A < B { m(x) { return x; } }
+    fun f() { while (a) { print f(1, nil); } }
+    var v = a.b = 2;
+    if (v) {} else v = 1;
+    """
+    stmts = Parser(Scanner(source).scan_tokens()).parse()
+    out = io.StringIO()
+    AstPrinter().dump(stmts, out)
+    self.assertEqual("(class A < B (func m(x)(return x)))\n"
+                     "(func f()(while a (block (print (call f [1.0 nil])))))\n"
+                     "(var v = (= a b 2.0))\n"
+                     "(if-else v (block ) (; (= v 1.0)))\n", out.getvalue())
+
+  def test_indented(self):
+    stmts = Parser(Scanner("fun f(a) { print -a + 1; return; }").scan_tokens()).parse()
+    self.assertEqual("(func f(a)\n"
+                     "  (print\n"
+                     "    (+\n"
+                     "      (- a) 1.0))\n"
+                     "  (return))", AstPrinter(indent="  ").print(stmts[0]))
+
+  def test_deep_tree_streamed(self):
+    depth = 100000
+    source = "print " + "-" * depth + "1;"
+    stmts = Parser(RegexScanner(source).scan_tokens()).parse()
+    writes = []
+    class Out(object):
+      def write(self, text):
+        writes.append(len(text))
+    AstPrinter(buffer_size=100).write(stmts[0], Out())
+    self.assertEqual(len("(print ") + 3 * depth + len("1.0") + depth + 1, sum(writes))
+    self.assertLessEqual(max(writes), 100 * 4)
@@ -1,8 +1,18 @@
 import sys
 import io
+import glob
+import contextlib
 from unittest import mock
 from unittest import TestCase
 from contextlib import contextmanager
+from pylox.expr import Expr
+from pylox.stmt import Stmt
+from pylox.token import Token
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.error import error_handler
 
 class LoxTestBase(TestCase):
   @contextmanager
@@ -13,4 +23,129 @@ class LoxTestBase(TestCase):
       yield captured
     finally:
       sys.stdout = sys.__stdout__
-      captured.close()
\ No newline at end of file
+      captured.close()
+
+  def assertSameTree(self, expected, actual):
+    """assert two ast (lists of) nodes have the same shape, fields and tokens
+    """
+    self.assertEqual(dump_tree(expected), dump_tree(actual))
+
+class EngineParity(object):
+  """tests of an engine running lox like `Interpreter`, mixed into the
+  LoxTestBase of the engine. `engines` creates the interpreters to check
+  """
+  engines = ()
+  # lazy values of Parser the engines run
+  lazy = (False, True)
+
+  runtime_errors = [
+    "var a = 1; a();",
+    "fun f(a) {} f(1, 2);",
+    "class A { init(a) {} } A();",
+    "class A {} A(1);",
+    "print -\"a\";",
+    "print 1 < nil;",
+    "print true + 1;",
+    "print b;",
+    "fun f() { print b; } f();",
+    "b = 1;",
+    "var a = 1; print a.b;",
+    "var a = 1; a.b = 2;",
+    "var a = 1; a.b = f();",
+    "var a = 1; class B < a {}",
+    "class A {} class B < A { m() { return super.m; } } B().m();",
+    "fun broken() { var a; var a; } print 1; broken();",
+  ]
+
+  def test_same_output_as_interpreter(self):
+    for path in sorted(glob.glob("tests/data/interpreter/*.lox")):
+      with open(path) as f:
+        source = f.read()
+      expected = run(Interpreter(), source)
+      for engine in self.engines:
+        for lazy in self.lazy:
+          self.assertEqual(expected, run(engine(), source, lazy), path)
+
+  def test_runtime_errors(self):
+    for source in self.runtime_errors:
+      for lazy in self.lazy:
+        expected = run(Interpreter(), source, lazy)
+        for engine in self.engines:
+          self.assertEqual(expected, run(engine(), source, lazy), source)
+
+  def test_errors_in_functions_never_called(self):
+    sources = [
+      "fun f() { var a = 1 +; } print \"ok\";",
+      "fun f() { print this; } print \"ok\";",
+      "class A { m() { return super.m(); } } print \"ok\";",
+    ]
+    for source in sources:
+      for lazy in self.lazy:
+        expected = run(Interpreter(), source, lazy)
+        for engine in self.engines:
+          self.assertEqual(expected, run(engine(), source, lazy), source)
+
+  def test_return_nil(self):
+    source = """
+    fun f(n) { while (true) { if (n > 2) return; n = n + 1; } }
+    fun g() { return nil; }
+    class A { init() { this.a = 1; return; } }
+    print f(0); print g(); print A().a; print A().init().a;
+    """
+    for engine in self.engines:
+      self.assertEqual("None\nNone\n1.0\n1.0\n", run(engine(), source))
+
+def run(interpreter, source, lazy=False) -> str:
+  """what interpreter prints running source, or the errors parsing and
+  resolving it reported like the cli
+  """
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    with error_handler.capture() as diagnostics:
+      stmts = Parser(Scanner(source).scan_tokens(), lazy=lazy).parse()
+      if not diagnostics:
+        Resolver().resolve(stmts)
+    for diagnostic in diagnostics:
+      print(diagnostic)
+    if not diagnostics:
+      interpreter.interprete(stmts)
+  return output.getvalue()
+
+def dump_tree(node):
+  """comparable form of ast node, token or a list of them
+  """
+  if isinstance(node, (Expr, Stmt)):
+    fields = node.__signature__.parameters
+    return (type(node).__name__,) + tuple(dump_tree(getattr(node, f)) for f in fields)
+  if isinstance(node, Token):
+    return (node.type, node.lexeme, node.literal, node.line)
+  if isinstance(node, list):
+    return [dump_tree(n) for n in node]
+  return node
+
+def count_nested(node, node_type):
+  """count node_type nodes on the path through the first child of that type,
+  without recursion
+  """
+  count = 0
+  while node is not None:
+    if isinstance(node, node_type):
+      count += 1
+    children = [getattr(node, f) for f in node.__signature__.parameters]
+    children = [c for child in children for c in (child if isinstance(child, list) else [child])]
+    node = next((c for c in children if isinstance(c, node_type)),
+                next((c for c in children if isinstance(c, (Expr, Stmt))), None))
+  return count
+
+def iter_nodes(node):
+  """every ast node in node, a list of them or a list of lists, depth first,
+  without recursion
+  """
+  stack = [node]
+  while stack:
+    node = stack.pop()
+    if isinstance(node, list):
+      stack.extend(reversed(node))
+    elif isinstance(node, (Expr, Stmt)):
+      yield node
+      stack.extend(reversed([getattr(node, f) for f in node.__signature__.parameters]))
@@ -0,0 +1,78 @@
+import os
+import tempfile
+from click.testing import CliRunner
+from tests.test_base import LoxTestBase, iter_nodes
+from pylox.cli import main, interpreter
+from pylox.cache import Cache
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.interpreter import Interpreter
+from pylox.resolver import Resolver
+from pylox.expr import Binary
+
+source = """
+fun counter() {
+  var i = 0;
+  fun count() { i = i + 1; return i; }
+  return count;
+}
+var c = counter();
+c();
+print c();
+"""
+
+class TestCache(LoxTestBase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.cache = Cache(self.directory.name)
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def test_store_and_load(self):
+    stmts = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(stmts)
+    key = self.cache.key(source)
+    self.assertTrue(self.cache.store(key, stmts))
+    self.assertEqual(key, self.cache.key(source.encode("utf-8")))
+    self.assertNotEqual(key, self.cache.key(source + " "))
+
+    loaded = self.cache.load(key)
+    self.assertSameTree(stmts, loaded)
+    self.assertEqual([getattr(node, "depth", None) for node in iter_nodes(stmts)],
+                     [getattr(node, "depth", None) for node in iter_nodes(loaded)])
+    # loaded trees get site indices no tree of the process has
+    sites = {node.site for node in iter_nodes(stmts) if isinstance(node, Binary)}
+    loaded_sites = {node.site for node in iter_nodes(loaded) if isinstance(node, Binary)}
+    self.assertEqual(len(sites), len(loaded_sites))
+    self.assertFalse(sites & loaded_sites)
+    interpreter = Interpreter()
+    with self.assertStdout() as output:
+      interpreter.interprete(loaded)
+      self.assertEqual("2.0\n", output.getvalue())
+
+  def test_missing_and_broken_entries(self):
+    self.assertIsNone(self.cache.load(self.cache.key(source)))
+    key = self.cache.key(source)
+    os.makedirs(self.directory.name, exist_ok=True)
+    with open(self.cache.path(key), "wb") as f:
+      f.write(b"\x80\x05broken")
+    self.assertIsNone(self.cache.load(key))
+    self.assertEqual(1, self.cache.prune())
+    self.assertEqual([], os.listdir(self.directory.name))
+
+  def test_cli_cache(self):
+    file = os.path.join(self.directory.name, "counter.lox")
+    with open(file, "w") as f:
+      f.write(source)
+    runner = CliRunner()
+    args = ["--cache", "--cache-dir", self.directory.name, file]
+    for _ in range(2):
+      result = runner.invoke(main, args)
+      self.assertEqual(0, result.exit_code, result.output)
+      self.assertEqual("2.0\n", result.output)
+      interpreter.__init__()
+    self.assertEqual(1, len([name for name in os.listdir(self.directory.name) if name.endswith(".loxc")]))
+    result = runner.invoke(main, ["--prune-cache", "--cache-dir", self.directory.name])
+    self.assertEqual("removed 1 cached programs\n", result.output)
@@ -1,5 +1,11 @@
+import io
+import contextlib
+import gc
 from tests.test_base import LoxTestBase
-from pylox.cli import main, interpreter
+from pylox import cli
+from pylox.cli import main, interpreter, run_pipeline
+from pylox.error import error_handler
+from pylox.stmt import Block
 from click.testing import CliRunner
 class TestCLI(LoxTestBase):
 
@@ -17,3 +23,91 @@ class TestCLI(LoxTestBase):
     # self.assertEqual("> 1.0", result.output.splitlines()[0])
     interpreter.__init__()
 
+  def test_engines(self):
+    runner = CliRunner()
+    try:
+      for args in (["--engine", "closure"], ["--engine", "closure", "--lazy"], ["--engine", "flat"],
+                   ["--engine", "vm"], ["--engine", "vm", "--lazy"], ["--engine", "py"],
+                   ["--engine", "tiered"], ["--engine", "tiered", "--lazy"]):
+        result = runner.invoke(main, args + ["tests/data/interpreter/fibonacci.lox"])
+        self.assertEqual(0, result.exit_code, args)
+        self.assertEqual("0.0\n1.0\n1.0\n2.0\n3.0\n", result.output, args)
+      result = runner.invoke(main, ["--engine", "flat", "--lazy", "tests/data/interpreter/fibonacci.lox"])
+      self.assertNotEqual(0, result.exit_code)
+      self.assertIn("--lazy needs the tree, closure, vm or tiered engine.", result.output)
+      result = runner.invoke(main, ["--disassemble", "tests/data/interpreter/fibonacci.lox"])
+      self.assertEqual(0, result.exit_code)
+      self.assertIn("== script ==\n", result.output)
+      self.assertNotIn("0.0\n1.0\n", result.output)
+      result = runner.invoke(main, ["run", "--engine", "py", "tests/data/interpreter/fibonacci.lox"])
+      self.assertEqual("0.0\n1.0\n1.0\n2.0\n3.0\n", result.output)
+      result = runner.invoke(main, ["--engine", "tiered", "--stats", "tests/data/interpreter/fibonacci.lox"])
+      self.assertEqual(0, result.exit_code)
+      self.assertIn("function", result.output)
+      result = runner.invoke(main, ["--stats", "tests/data/interpreter/fibonacci.lox"])
+      self.assertIn("operator", result.output)
+      result = runner.invoke(main, ["--engine", "vm", "--stats", "tests/data/interpreter/fibonacci.lox"])
+      self.assertNotEqual(0, result.exit_code)
+    finally:
+      cli.interpreter = interpreter
+
+
+  def test_transpile(self):
+    runner = CliRunner()
+    result = runner.invoke(main, ["transpile", "tests/data/interpreter/fibonacci.lox"])
+    self.assertEqual(0, result.exit_code)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+      exec(compile(result.output, "fibonacci.py", "exec"), {})
+    self.assertEqual("0.0\n1.0\n1.0\n2.0\n3.0\n", output.getvalue())
+
+
+class Pipe(object):
+  """a pipe delivering chunks one read at a time, recording what had been
+  printed before each read
+  """
+  def __init__(self, chunks, output):
+    self.chunks = list(chunks)
+    self.output = output
+    self.printed = []
+
+  def read1(self, size):
+    self.printed.append(self.output.getvalue())
+    return self.chunks.pop(0).encode("utf-8") if self.chunks else b""
+
+class TestPipeline(LoxTestBase):
+
+  def setUp(self):
+    error_handler.had_error = False
+    interpreter.__init__()
+
+  def test_statements_run_before_the_rest_is_read(self):
+    with self.assertStdout() as output:
+      pipe = Pipe(["print 1;\n", "fun f() { return 2; }\nprint f();\n", "print 3;"], output)
+      run_pipeline(pipe)
+      self.assertEqual("1.0\n2.0\n3.0\n", output.getvalue())
+    self.assertEqual(["", "1.0\n", "1.0\n2.0\n", "1.0\n2.0\n3.0\n"], pipe.printed)
+
+  def test_top_level_code_is_dropped(self):
+    source = "var a = 0;\n" + "{ var b = 1; a = a + b; }\n" * 1000 + \
+             "fun f() { var c = 1; return c; }\nprint a + f();"
+    gc.collect()
+    blocks = sum(isinstance(o, Block) for o in gc.get_objects())
+    with self.assertStdout() as output:
+      run_pipeline(source)
+      self.assertEqual("1001.0\n", output.getvalue())
+    # only the body of `f` is kept, with the depths resolved on its nodes
+    gc.collect()
+    self.assertEqual(blocks + 1, sum(isinstance(o, Block) for o in gc.get_objects()))
+
+  def test_stop_at_first_error(self):
+    with self.assertStdout() as output:
+      run_pipeline("print 1;\nvar a = 1 print 2;\nprint 3;\nprint 4")
+      self.assertEqual("1.0\n[line2] Error.  at 'print': Expect ';' after variable declaration.\n"
+                       "[line4] Error.  at end: Expect ';' after statement.\n", output.getvalue())
+
+  def test_resolve_after_error(self):
+    with self.assertStdout() as output:
+      run_pipeline('print 1; print -"a"; return 1;\nprint 2;')
+      self.assertEqual("1.0\nOperand must be a number\n"
+                       "[line1] Error.  at 'return': Cannot return from top-level code.\n", output.getvalue())
@@ -0,0 +1,5 @@
+from tests.test_base import LoxTestBase, EngineParity
+from pylox.closure_compiler import ClosureInterpreter
+
+class TestClosureCompiler(EngineParity, LoxTestBase):
+  engines = (ClosureInterpreter,)
@@ -0,0 +1,58 @@
+import glob
+import io
+import contextlib
+from tests.test_base import LoxTestBase
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.flat_ast import FlatAst, FlatInterpreter, kind_codes, NONE
+from pylox.expr import Binary, Literal, Variable
+from pylox.stmt import Print, Var
+
+def run(interpreter, source):
+  stmts = Parser(Scanner(source).scan_tokens()).parse()
+  Resolver().resolve(stmts)
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    interpreter.interprete(stmts)
+  return output.getvalue()
+
+class TestFlatAst(LoxTestBase):
+
+  def test_flatten(self):
+    stmts = Parser(Scanner("var a = 1; print a + 2;").scan_tokens()).parse()
+    ast = FlatAst()
+    program = ast.flatten(stmts)
+    var, print_ = [ast.lists[item] for item in ast.items(program)]
+    self.assertEqual(kind_codes[Var], ast.kind[var])
+    self.assertEqual("a", ast.name(ast.token[var]))
+    self.assertEqual(1.0, ast.constants[ast.a[ast.a[var]]])
+    self.assertEqual(kind_codes[Print], ast.kind[print_])
+    binary = ast.a[print_]
+    self.assertEqual(kind_codes[Binary], ast.kind[binary])
+    self.assertEqual("+", ast.token_at(ast.token[binary]).lexeme)
+    self.assertEqual(kind_codes[Variable], ast.kind[ast.a[binary]])
+    self.assertEqual(NONE, ast.depth[ast.a[binary]])
+    self.assertEqual(kind_codes[Literal], ast.kind[ast.b[binary]])
+    self.assertEqual(6, len(ast))
+
+  def test_flatten_deep_tree(self):
+    source = "print " + "(" * 100000 + "1" + ")" * 100000 + ";"
+    ast = FlatAst()
+    ast.flatten(Parser(Scanner(source).scan_tokens()).parse())
+    self.assertEqual(100002, len(ast))
+
+  def test_same_output_as_interpreter(self):
+    for path in sorted(glob.glob("tests/data/interpreter/*.lox")):
+      with open(path) as f:
+        source = f.read()
+      self.assertEqual(run(Interpreter(), source), run(FlatInterpreter(), source), path)
+
+  def test_resolved_depths(self):
+    source = "var a = 0; { var b = 1; b = b + 1; fun f() { a = a + b; } f(); print a; }"
+    interpreter = FlatInterpreter()
+    self.assertEqual("2.0\n", run(interpreter, source))
+
+  def test_runtime_error(self):
+    self.assertIn("Can only call functions and classes.", run(FlatInterpreter(), "var a = 1; a();"))
@@ -0,0 +1,80 @@
+import os
+import glob
+import random
+from tests.test_base import LoxTestBase, dump_tree, iter_nodes
+from pylox.incremental import Document
+
+source = """var a = 1;
+fun f(x) {
+  var y = x;
+  return y + a;
+}
+print f(2);
+"""
+
+class TestIncremental(LoxTestBase):
+
+  def assertSameAnalysis(self, expected, actual):
+    self.assertEqual(expected.starts, actual.starts)
+    self.assertEqual(expected.lines, actual.lines)
+    self.assertSameTree(expected.statements, actual.statements)
+    self.assertEqual([str(d) for d in expected.diagnostics], [str(d) for d in actual.diagnostics])
+    self.assertEqual([getattr(node, "depth", None) for node in iter_nodes(expected.statements)],
+                     [getattr(node, "depth", None) for node in iter_nodes(actual.statements)])
+
+  def test_reuse(self):
+    document = Document(source)
+    segments = list(document.segments)
+    self.assertEqual(3, len(segments))
+    self.assertEqual([1, 2, 6], document.lines)
+    position = source.index("y + a")
+    self.assertEqual(range(1, 2), document.edit(position, position + 1, "x"))
+    self.assertIs(segments[0], document.segments[0])
+    self.assertIs(segments[2], document.segments[2])
+    self.assertIsNot(segments[1], document.segments[1])
+    self.assertSameAnalysis(Document(document.source), document)
+    # lines added before a segment shift it without analyzing it again, the
+    # first segment starts at the start of the document
+    document.edit(0, 0, "\n\n")
+    self.assertIs(segments[2], document.segments[2])
+    self.assertEqual([1, 4, 8], document.lines)
+    self.assertSameAnalysis(Document(document.source), document)
+
+  def test_statement_lines(self):
+    document = Document(source)
+    segments = list(document.segments)
+    document.edit(0, 0, "\n\n")
+    # print f(2); is reused, its tokens are on their new line
+    self.assertIs(segments[2], document.segments[2])
+    self.assertEqual(8, document.statements[2].expression.paren.line)
+    self.assertEqual(8, document.statements[2].expression.callee.name.line)
+    document.edit(0, 1, "")
+    self.assertEqual(7, document.statements[2].expression.paren.line)
+    self.assertEqual(3, document.statements[1].name.line)
+
+  def test_diagnostics(self):
+    document = Document(source)
+    self.assertEqual([], document.diagnostics)
+    position = source.index("return")
+    document.edit(position, position + len("return"), "return return")
+    self.assertEqual(["[line4] Error.  at 'return': Expect expression."],
+                     [str(d) for d in document.diagnostics])
+    document.edit(0, 0, "\n")
+    self.assertEqual(["[line5] Error.  at 'return': Expect expression."],
+                     [str(d) for d in document.diagnostics])
+    document.edit(position + 1, position + 1 + len("return "), "")
+    self.assertEqual([], document.diagnostics)
+
+  def test_random_edits(self):
+    directory = os.path.join(os.path.dirname(__file__), "data", "interpreter")
+    text = "\n".join(open(path).read() for path in sorted(glob.glob(os.path.join(directory, "*.lox"))))
+    pieces = ["", "x", "}", "{", ";", "\n", "var q = 1;", "fun g() { return 1; }", "\"", "@", "1.5", "// c\n"]
+    document = Document(text)
+    rnd = random.Random(1)
+    for i in range(200):
+      start = rnd.randrange(len(document.source) + 1)
+      end = min(len(document.source), start + rnd.choice([0, 0, 1, 2, 5, 20]))
+      document.edit(start, end, rnd.choice(pieces))
+      if i % 10 == 0:
+        self.assertSameAnalysis(Document(document.source), document)
+    self.assertSameAnalysis(Document(document.source), document)
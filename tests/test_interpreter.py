@@ -1,3 +1,5 @@
+import gc
+import tracemalloc
 from typing import List
 from tests.test_base import LoxTestBase
 from pylox.scanner import Scanner
@@ -5,13 +7,14 @@ from pylox.parser import Parser
 from pylox.ast_printer import AstPrinter
 from pylox.interpreter import Interpreter
 from pylox.resolver import Resolver
+from pylox.environment import free_frames
 
 class TestInterpreter(LoxTestBase):
 
   def test_interpret_stmts(self):
     stmts = Parser(Scanner("var a=1;var b=2;print a+b;").scan_tokens()).parse()
     interpreter = Interpreter()
-    Resolver(interpreter).resolve(stmts)
+    Resolver().resolve(stmts)
     with self.assertStdout() as output:
       interpreter.interprete(stmts)
       self.assertEqual("3.0\n", output.getvalue())
@@ -19,7 +22,7 @@ class TestInterpreter(LoxTestBase):
   def test_interpret_assign_stmt(self):
     stmts = Parser(Scanner("var a=1;a=2;print a;").scan_tokens()).parse()
     interpreter = Interpreter()
-    Resolver(interpreter).resolve(stmts)
+    Resolver().resolve(stmts)
     with self.assertStdout() as output:
       interpreter.interprete(stmts)
       self.assertEqual("2.0\n", output.getvalue())
@@ -28,7 +31,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/scope.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("inner a\nouter b\nglobal c\nouter a\nouter b\nglobal c\nglobal a\nglobal b\nglobal c\n", output.getvalue())
@@ -37,7 +40,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/while.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("0.0\n1.0\n1.0\n2.0\n3.0\n5.0\n8.0\n", output.getvalue())
@@ -46,7 +49,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/for.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("0.0\n1.0\n2.0\n3.0\n4.0\n", output.getvalue())
@@ -55,7 +58,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/function.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("Hi, Dear Reader!\n", output.getvalue())
@@ -64,7 +67,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/fibonacci.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("0.0\n1.0\n1.0\n2.0\n3.0\n", output.getvalue())
@@ -73,7 +76,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/closure.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("1.0\n2.0\n", output.getvalue())
@@ -82,7 +85,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/class.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("Thing Instance\n", output.getvalue())
@@ -91,7 +94,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/super.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("A method\n", output.getvalue())
@@ -100,7 +103,7 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/visitor_pattern_in_lox.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual("a=1\n", output.getvalue())
@@ -109,7 +112,99 @@ class TestInterpreter(LoxTestBase):
     with open("tests/data/interpreter/misc.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
-        self.assertEqual("False\n2.0\n", output.getvalue())
\ No newline at end of file
+        self.assertEqual("False\n2.0\n", output.getvalue())
+  def test_interpret_assign_innermost_local(self):
+    stmts = Parser(Scanner("{ var a = 1; a = 2; print a; }").scan_tokens()).parse()
+    interpreter = Interpreter()
+    Resolver().resolve(stmts)
+    with self.assertStdout() as output:
+      interpreter.interprete(stmts)
+      self.assertEqual("2.0\n", output.getvalue())
+
+  def test_global_cells(self):
+    source = """
+    fun f() { return g(); }
+    fun g() { return "first"; }
+    print f();
+    fun g() { return "second"; }
+    print f();
+    print h;
+    """
+    stmts = Parser(Scanner(source).scan_tokens()).parse()
+    interpreter = Interpreter()
+    Resolver().resolve(stmts)
+    with self.assertStdout() as output:
+      interpreter.interprete(stmts)
+      self.assertEqual("first\nsecond\nUndefined variable: h\n", output.getvalue())
+    # the reference to g in f reads the cell g is defined in, not kept on the node
+    call = stmts[0].body.statements[0].value
+    self.assertIsNone(call.callee.slot)
+    with self.assertStdout() as output:
+      interpreter.interprete(Parser(Scanner("h = 1;").scan_tokens()).parse())
+      self.assertEqual("Undefined variable: h\n", output.getvalue())
+
+  def test_interpreters_share_a_tree(self):
+    stmts = Parser(Scanner("var a = 1; fun f() { a = a + 1; return a; } print f();").scan_tokens()).parse()
+    Resolver().resolve(stmts)
+    first, second = Interpreter(), Interpreter()
+    with self.assertStdout() as output:
+      first.interprete(stmts)
+      second.interprete(stmts)
+      self.assertEqual("2.0\n2.0\n", output.getvalue())
+    self.assertEqual(2.0, first.globals.cell("a").value)
+    self.assertEqual(2.0, second.globals.cell("a").value)
+
+  def test_closures(self):
+    with open("tests/data/interpreter/upvalues.lox") as f:
+      stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
+    interpreter = Interpreter()
+    Resolver().resolve(stmts)
+    with self.assertStdout() as output:
+      interpreter.interprete(stmts)
+      self.assertEqual("1.0\n3.0\n55.0\nA Instance\n3.0\n8.0\n16.0\n21.0\n4.0\n10.0\n11.0\nl\n", output.getvalue())
+
+  def test_closure_frees_unused_locals(self):
+    source = """
+    fun make() {
+      var big = "x";
+      for (var i = 0; i < 20; i = i + 1) big = big + big;
+      var n = 0;
+      fun count() { n = n + 1; return n; }
+      return count;
+    }
+    var count = make();
+    """
+    stmts = Parser(Scanner(source).scan_tokens()).parse()
+    interpreter = Interpreter()
+    Resolver().resolve(stmts)
+    tracemalloc.start()
+    try:
+      interpreter.interprete(stmts)
+      gc.collect()
+      retained, peak = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+    # the megabyte string was freed with make's frame, count keeps only n
+    self.assertGreater(peak, 1 << 20)
+    self.assertLess(retained, 1 << 18)
+    count = interpreter.globals.cell("count").value
+    self.assertEqual(1, len(count.upvalues))
+    with self.assertStdout() as output:
+      interpreter.interprete(Parser(Scanner("count(); print count();").scan_tokens()).parse())
+      self.assertEqual("2.0\n", output.getvalue())
+
+  def test_call_frames_are_recycled(self):
+    stmts = Parser(Scanner("fun f(a) { var b = a; return b; } print f(1); print f(2);").scan_tokens()).parse()
+    interpreter = Interpreter()
+    Resolver().resolve(stmts)
+    free_frames.clear()
+    with self.assertStdout() as output:
+      interpreter.interprete(stmts)
+      self.assertEqual("1.0\n2.0\n", output.getvalue())
+    # the second call ran in the frame of the first, neither keeps a value
+    self.assertEqual(1, len(free_frames))
+    self.assertEqual([], free_frames[0].values)
+    self.assertIsNone(free_frames[0].enclosing)
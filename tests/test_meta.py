@@ -0,0 +1,51 @@
+from tests.test_base import LoxTestBase
+from pylox.meta import ExprMeta, add_signature
+from pylox.expr import Expr, ExprVisitor, Binary, Literal, Variable
+from pylox.interpreter import Interpreter
+from pylox.token import Token, TokenType
+
+class TestMeta(LoxTestBase):
+
+  def test_fields_become_slots_and_init(self):
+    plus = Token(TokenType.PLUS, "+", None, 1)
+    expr = Binary(Literal(1.0), plus, right=Literal(2.0))
+    self.assertEqual(("left", "operator", "right", "site"), Binary.__slots__)
+    self.assertFalse(hasattr(expr, "__dict__"))
+    self.assertIs(plus, expr.operator)
+    self.assertEqual(2.0, expr.right.value)
+    self.assertEqual(["left", "operator", "right"], list(Binary.__signature__.parameters))
+    with self.assertRaises(TypeError):
+      Binary(Literal(1.0), plus)
+
+  def test_attributes_are_slots_outside_the_signature(self):
+    name = Token(TokenType.IDENTIFIER, "a", None, 1)
+    variable = Variable(name)
+    self.assertEqual(("name", "depth", "slot", "cell"), Variable.__slots__)
+    self.assertEqual(["name"], list(Variable.__signature__.parameters))
+    self.assertIsNone(variable.depth)
+    variable.depth = 1
+    self.assertFalse(hasattr(variable, "__dict__"))
+
+  def test_add_signature(self):
+    @add_signature("name", "value")
+    class Pair(Expr):
+      pass
+    pair = Pair("a", value=1)
+    self.assertIsInstance(type(pair), ExprMeta)
+    self.assertEqual(("a", 1), (pair.name, pair.value))
+    self.assertFalse(hasattr(pair, "__dict__"))
+
+  def test_dispatch_table(self):
+    self.assertIs(Interpreter.visit_binary_expr, Interpreter.dispatch[Binary])
+    self.assertEqual("visit_literal_expr", Literal.visit_name)
+    class Double(ExprVisitor):
+      def visit_literal_expr(self, expr):
+        return expr.value * 2
+    self.assertEqual(4.0, Double().dispatch[Literal](Double(), Literal(2.0)))
+    self.assertEqual(4.0, Literal(2.0).accept(Double()))
+
+  def test_dispatch_node_class_created_later(self):
+    class Constant(Literal):
+      pass
+    self.assertEqual(1.0, Interpreter().evaluate(Constant(1.0)))
+    self.assertIn(Constant, Interpreter.dispatch)
@@ -1,6 +1,10 @@
+import glob
+import io
 from typing import List
-from tests.test_base import LoxTestBase
-from pylox.scanner import Scanner
+from tests.test_base import LoxTestBase, count_nested
+from pylox.expr import Binary, Grouping, Unary, Assign, Call
+from pylox.stmt import Block, If
+from pylox.scanner import Scanner, RegexScanner
 from pylox.parser import Parser
 from pylox.ast_printer import AstPrinter
 
@@ -18,4 +22,57 @@ class TestParser(LoxTestBase):
       Parser(Scanner("var a=1;var b=2;print a+b").scan_tokens()).parse()
       self.assertEqual("[line1] Error.  at end: Expect ';' after statement.\n", output.getvalue())
 
+  def test_parse_error_missing_expression(self):
+    for pratt in (False, True):
+      with self.assertStdout() as output:
+        Parser(Scanner("fun f() { var a = 1 +; }").scan_tokens(), pratt=pratt).parse()
+        self.assertEqual("[line1] Error.  at ';': Expect expression.\n", output.getvalue())
 
+  def test_parse_token_iterator(self):
+    with open("tests/data/test_ast_printer.lox") as f:
+      source = f.read()
+    expected = Parser(Scanner(source).scan_tokens()).parse()
+    stream = RegexScanner(io.StringIO(source)).iter_tokens(chunk_size=4)
+    self.assertSameTree(expected, Parser(stream).parse())
+    parser = Parser(RegexScanner(io.StringIO(source * 10)).iter_tokens())
+    parser.parse()
+    self.assertLessEqual(len(parser.tokens.window), 2)
+
+  def test_parse_token_buffer(self):
+    with open("tests/data/test_ast_printer.lox") as f:
+      source = f.read()
+    expected = Parser(Scanner(source).scan_tokens()).parse()
+    self.assertSameTree(expected, Parser(RegexScanner(source).scan_token_buffer()).parse())
+
+  def test_pratt_parser_builds_same_trees(self):
+    sources = ["a = b.c = 1 + 2 * -3 - f(x, y)(z).w / (4 >= 5 == !true or nil and this);",
+               "a + b = c; -a = 1; super.m(1).n = 2;", "print; var a = 1 + ; f(1, ) = -;"]
+    for path in ["tests/data/test_ast_printer.lox"] + glob.glob("tests/data/interpreter/*.lox"):
+      with open(path) as f:
+        sources.append(f.read())
+    for source in sources:
+      with self.assertStdout() as output:
+        expected = Parser(Scanner(source).scan_tokens(), pratt=False).parse()
+        expected_errors = output.getvalue()
+      with self.assertStdout() as output:
+        actual = Parser(Scanner(source).scan_tokens(), pratt=True).parse()
+        self.assertEqual(expected_errors, output.getvalue())
+      self.assertSameTree(expected, actual)
+
+  def test_parse_deeply_nested_code(self):
+    depth = 100000
+    sources = {
+      Block: "{" * depth + "}" * depth,
+      If: "if (a) " * depth + "print 1;",
+      Binary: "print " + " + ".join(["a"] * depth) + ";",
+      Grouping: "print " + "(" * depth + "1" + ")" * depth + ";",
+      Unary: "print " + "-" * depth + "1;",
+      Assign: "print " + " = ".join(["a"] * depth) + ";",
+      Call: "print f" + "()" * depth + ";",
+    }
+    for node_type, source in sources.items():
+      with self.assertStdout() as output:
+        stmts = Parser(RegexScanner(source).scan_tokens()).parse()
+        self.assertEqual("", output.getvalue())
+      self.assertEqual(1, len(stmts))
+      self.assertGreaterEqual(count_nested(stmts[0], node_type), depth - 1)
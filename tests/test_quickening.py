@@ -0,0 +1,79 @@
+from tests.test_base import LoxTestBase
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.error import RuntimeError
+from pylox.quickening import Site, warmup, max_specializations
+
+def run(source) -> Interpreter:
+  interpreter = Interpreter()
+  stmts = Parser(Scanner(source).scan_tokens()).parse()
+  Resolver().resolve(stmts)
+  interpreter.interprete(stmts)
+  return interpreter
+
+def sites(interpreter) -> dict:
+  return {(site.operator.lexeme, site.operator.line): site for site in interpreter.sites if site is not None}
+
+class TestQuickening(LoxTestBase):
+
+  def test_specialize_on_operand_classes(self):
+    with self.assertStdout() as output:
+      interpreter = run("""
+        var s = "";
+        for (var i = 0; i < 20; i = i + 1)
+          s = s + "x";
+        print s;
+        print 1 == 1;
+      """)
+      self.assertEqual("x" * 20 + "\nTrue\n", output.getvalue())
+    quickened = sites(interpreter)
+    self.assertEqual("number number", quickened["<", 3].state)
+    self.assertEqual("number number", quickened["+", 3].state)
+    self.assertEqual("string string", quickened["+", 4].state)
+    self.assertEqual(1, quickened["+", 4].specializations)
+    self.assertEqual(0, quickened["+", 4].misses)
+    # nothing to specialize equality on
+    self.assertEqual("generic", quickened["==", 6].state)
+    self.assertIn("string string", interpreter.stats())
+
+  def test_guard_falls_back_to_generic(self):
+    with self.assertStdout() as output:
+      interpreter = run("""
+        fun add(a, b) { return a + b; }
+        for (var i = 0; i < %d; i = i + 1) add(i, i);
+        print add("a", "b");
+        print add(1, "b");
+        print add(nil, 1);
+      """ % warmup)
+      self.assertEqual("ab\n1.0b\nOperand must be number or string\n", output.getvalue())
+    add = sites(interpreter)["+", 2]
+    self.assertEqual(1, add.specializations)
+    self.assertEqual(1, add.misses)
+    self.assertEqual("observing", add.state)
+
+  def test_unstable_site_stays_generic(self):
+    site = Site(Scanner("1 < 2").scan_tokens()[1])
+    for _ in range(max_specializations):
+      for _ in range(warmup):
+        self.assertTrue(site.apply(1.0, 2.0))
+      self.assertEqual("number number", site.state)
+      with self.assertRaises(RuntimeError):
+        site.apply(1.0, "b")
+    self.assertEqual("generic", site.state)
+    self.assertEqual(max_specializations, site.misses)
+
+  def test_interpreters_keep_their_sites(self):
+    stmts = Parser(Scanner("fun add(a, b) { return a + b; }").scan_tokens()).parse()
+    Resolver().resolve(stmts)
+    numbers, strings = Interpreter(), Interpreter()
+    numbers.interprete(stmts)
+    strings.interprete(stmts)
+    add_numbers, add_strings = numbers.globals.get(stmts[0].name), strings.globals.get(stmts[0].name)
+    for i in range(warmup):
+      add_numbers.call(numbers, [float(i), 1.0])
+      add_strings.call(strings, ["a", "b"])
+    self.assertEqual("number number", sites(numbers)["+", 1].state)
+    self.assertEqual("string string", sites(strings)["+", 1].state)
+    self.assertEqual(0, sites(numbers)["+", 1].misses)
@@ -1,8 +1,11 @@
-from tests.test_base import LoxTestBase
-from pylox.scanner import Scanner
-from pylox.parser import Parser
+import glob
+from tests.test_base import LoxTestBase, iter_nodes
+from pylox.scanner import Scanner, RegexScanner
+from pylox.parser import Parser, LazyBody
 from pylox.resolver import Resolver
 from pylox.interpreter import Interpreter
+from pylox.expr import Variable
+from pylox.environment import UPVALUE
 
 class TestResolver(LoxTestBase):
 
@@ -10,7 +13,7 @@ class TestResolver(LoxTestBase):
     with open("tests/data/test_resolver.lox") as f:
       stmts = Parser(Scanner(f.read()).scan_tokens()).parse()
       interpreter = Interpreter()
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       with self.assertStdout() as output:
         interpreter.interprete(stmts)
         self.assertEqual('global\nglobal\n', output.getvalue())
@@ -19,5 +22,94 @@ class TestResolver(LoxTestBase):
     stmts = Parser(Scanner("var a=1;var b=2;return a+b;").scan_tokens()).parse()
     interpreter = Interpreter()
     with self.assertStdout() as output:
-      Resolver(interpreter).resolve(stmts)
+      Resolver().resolve(stmts)
       self.assertEqual('[line1] Error.  at \'return\': Cannot return from top-level code.\n', output.getvalue())
+
+  def test_resolve_deeply_nested_code(self):
+    depth = 100000
+    source = "{ var a = 1;" * depth + "print a + " + " + ".join(["a"] * depth) + ";" + "}" * depth
+    stmts = Parser(RegexScanner(source).scan_tokens()).parse()
+    interpreter = Interpreter()
+    with self.assertStdout() as output:
+      Resolver().resolve(stmts)
+      self.assertEqual("", output.getvalue())
+    # every `a` is resolved to the innermost block
+    depths = [node.depth for node in iter_nodes(stmts) if isinstance(node, Variable)]
+    self.assertEqual([0] * (depth + 1), depths)
+
+  def test_resolve_lazy_bodies(self):
+    for path in sorted(glob.glob("tests/data/interpreter/*.lox")):
+      with open(path) as f:
+        source = f.read()
+      outputs = []
+      for lazy in (False, True):
+        stmts = Parser(Scanner(source).scan_tokens(), lazy=lazy).parse()
+        interpreter = Interpreter()
+        with self.assertStdout() as output:
+          Resolver().resolve(stmts)
+          interpreter.interprete(stmts)
+          outputs.append(output.getvalue())
+      self.assertEqual(outputs[0], outputs[1], path)
+
+  def test_lazy_body_diagnostics(self):
+    source = """
+    var a = "global";
+    fun broken() { var a = 1; var a = 2; }
+    fun unused() { print this; }
+    fun f() { print a; }
+    { var a = "local"; f(); }
+    print "before";
+    broken();
+    print "after";
+    """
+    stmts = Parser(Scanner(source).scan_tokens(), lazy=True).parse()
+    self.assertIsInstance(stmts[1].body, LazyBody)
+    interpreter = Interpreter()
+    with self.assertStdout() as output:
+      Resolver().resolve(stmts)
+      self.assertEqual("", output.getvalue())
+      interpreter.interprete(stmts)
+      lines = output.getvalue().splitlines()
+      # the body never called is checked once the program ended
+      Resolver.check_bodies(stmts)
+      checked = output.getvalue().splitlines()[len(lines):]
+    self.assertEqual(["global", "before"], lines[:2])
+    self.assertEqual("[line3] Error.  at 'a': Variable with this name already declared in this scope.", lines[2])
+    self.assertIn("Function body has errors.", lines[3])
+    self.assertEqual(4, len(lines))
+    # the broken body is not reported again
+    self.assertEqual(["[line4] Error.  at 'this': Cannot use 'this' outside of a class."], checked)
+
+  def test_slots(self):
+    source = """
+    fun f(a, b) {
+      var c = a;
+      {
+        var d = b;
+        class E < F { m() { return super.m(this, d); } }
+        print c + d;
+      }
+      { var g = 1; print g; }
+    }
+    """
+    stmts = Parser(Scanner(source).scan_tokens()).parse()
+    with self.assertStdout() as output:
+      Resolver().resolve(stmts)
+      self.assertEqual("", output.getvalue())
+    resolved = [(node.name.lexeme if isinstance(node, Variable) else type(node).__name__, node.depth, node.slot)
+                for node in iter_nodes(stmts) if getattr(node, "depth", None) is not None]
+    # super and d are upvalues of the method, this is in its bound frame. the
+    # blocks keep their variables in the frame of f, g reuses the slot of d
+    self.assertEqual([("a", 0, 0), ("b", 0, 1), ("Super", UPVALUE, 0), ("This", 1, 0),
+                      ("d", UPVALUE, 1), ("c", 0, 2), ("d", 0, 3), ("g", 0, 3)], resolved)
+    method = stmts[0].body.statements[1].statements[1].methods[0]
+    self.assertEqual(((0, 0), (1, 3)), method.upvalues)
+    self.assertEqual([3, 3], [stmt.base for stmt in stmts[0].body.statements[1:]])
+    self.assertEqual((), stmts[0].upvalues)
+
+  def test_read_in_own_initializer(self):
+    stmts = Parser(Scanner("{ var a = 1; { var b = 2; var a = a; } }").scan_tokens()).parse()
+    with self.assertStdout() as output:
+      Resolver().resolve(stmts)
+      self.assertEqual("[line1] Error.  at 'a': Cannot read local variable in its own initializer.\n",
+                       output.getvalue())
@@ -1,7 +1,12 @@
+import io
+import glob
+import mmap
+import tempfile
 from typing import List
 from tests.test_base import LoxTestBase
-from pylox.scanner import Scanner
+from pylox.scanner import Scanner, RegexScanner
 from pylox.token import Token, TokenType
+from pylox.symbol_table import SymbolTable
 
 class TestScanner(LoxTestBase):
   def setUp(self):
@@ -16,4 +21,100 @@ class TestScanner(LoxTestBase):
     self.assertEqual(";", tokens[117].lexeme)
 
   def tearDown(self):
-    self.scanner = None
\ No newline at end of file
+    self.scanner = None
+
+class TestRegexScanner(LoxTestBase):
+  def assertSameTokens(self, source):
+    expected = [(t.type, t.lexeme, t.literal, t.line) for t in Scanner(source).scan_tokens()]
+    actual = [(t.type, t.lexeme, t.literal, t.line) for t in RegexScanner(source).scan_tokens()]
+    self.assertEqual(expected, actual)
+
+  def test_same_tokens_as_scanner(self):
+    for path in ["tests/data/test_scanner.lox"] + glob.glob("tests/data/interpreter/*.lox"):
+      with open(path) as f:
+        self.assertSameTokens(f.read())
+    self.assertSameTokens("a_b 1.5.x 2. !== <= // c\n'multi\nline' \"mixed'")
+
+  def test_same_errors_as_scanner(self):
+    for source in ("var a = 1;\n#", "print 'unterminated\n\n"):
+      with self.assertStdout() as output:
+        Scanner(source).scan_tokens()
+        expected = output.getvalue()
+      with self.assertStdout() as output:
+        RegexScanner(source).scan_tokens()
+        self.assertEqual(expected, output.getvalue())
+
+  def test_same_tokens_and_errors_on_every_path(self):
+    source = "var a = 'multi\nline';\n#\nprint a + 1.5; 'unterminated\n\nb"
+    with self.assertStdout() as output:
+      expected = [(t.type, t.lexeme, t.literal, t.line) for t in Scanner(source).scan_tokens()]
+      errors = output.getvalue()
+    paths = [
+      lambda: RegexScanner(source).iter_tokens(),
+      lambda: RegexScanner(io.StringIO(source)).iter_tokens(chunk_size=3),
+      lambda: [token for token, _ in RegexScanner(source).iter_token_spans()],
+      lambda: RegexScanner(source).scan_token_buffer(),
+    ]
+    for path in paths:
+      with self.assertStdout() as output:
+        self.assertEqual(expected, [(t.type, t.lexeme, t.literal, t.line) for t in path()])
+        self.assertEqual(errors, output.getvalue())
+
+
+class TestIterTokens(LoxTestBase):
+  def setUp(self):
+    with open("tests/data/test_scanner.lox") as f:
+      self.source = f.read() + "\n'straddling\nstring' 12.5 a//comment\n"
+    self.expected = [(t.type, t.lexeme, t.literal, t.line) for t in Scanner(self.source).scan_tokens()]
+
+  def assertTokens(self, tokens):
+    self.assertEqual(self.expected, [(t.type, t.lexeme, t.literal, t.line) for t in tokens])
+
+  def test_iter_str(self):
+    self.assertTokens(Scanner(self.source).iter_tokens())
+    self.assertTokens(RegexScanner(self.source).iter_tokens())
+
+  def test_iter_file_object_in_small_chunks(self):
+    for chunk_size in (1, 2, 3, 7):
+      self.assertTokens(RegexScanner(io.StringIO(self.source)).iter_tokens(chunk_size))
+      self.assertTokens(RegexScanner(io.BytesIO(self.source.encode())).iter_tokens(chunk_size))
+
+  def test_iter_mmap(self):
+    with tempfile.TemporaryFile() as f:
+      f.write(self.source.encode())
+      f.flush()
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        self.assertTokens(RegexScanner(source).iter_tokens(5))
+
+
+class TestTokenBuffer(LoxTestBase):
+  def test_same_tokens_as_scanner(self):
+    with open("tests/data/test_scanner.lox") as f:
+      source = f.read() + "\n'multi\nline' 12.5"
+    expected = [(t.type, t.lexeme, t.literal, t.line) for t in Scanner(source).scan_tokens()]
+    buffer = RegexScanner(source).scan_token_buffer()
+    self.assertEqual(len(expected), len(buffer))
+    self.assertEqual(expected, [(t.type, t.lexeme, t.literal, t.line) for t in buffer])
+    self.assertEqual(TokenType.EOF, buffer[-1].type)
+    self.assertEqual("a", buffer.lexeme(0))
+
+  def test_token_has_no_dict(self):
+    self.assertFalse(hasattr(Token(TokenType.EOF, "", None, 1), "__dict__"))
+
+
+class TestSymbolTable(LoxTestBase):
+  def test_names_and_strings_are_interned(self):
+    source = "var name = 'text'; name = 'text'; print name;"
+    for scanner in (Scanner(source), RegexScanner(source)):
+      tokens = scanner.scan_tokens()
+      self.assertIs(tokens[1].lexeme, tokens[5].lexeme)
+      self.assertIs(tokens[3].literal, tokens[7].literal)
+      self.assertIn("name", scanner.symbols)
+      self.assertIn("print", scanner.symbols)
+
+  def test_shared_table(self):
+    symbols = SymbolTable()
+    first = RegexScanner("this.init;", symbols).scan_tokens()
+    second = RegexScanner("init", symbols).scan_token_buffer()
+    self.assertIs(first[2].lexeme, second[0].lexeme)
+    self.assertIs("init", second[0].lexeme)
@@ -0,0 +1,100 @@
+from functools import partial
+from tests.test_base import LoxTestBase, EngineParity, run
+from pylox.tiering import TieredInterpreter
+
+def profiles(interpreter) -> dict:
+  return {profile.name: profile for profile in interpreter.profiles.values()}
+
+class TestTiering(EngineParity, LoxTestBase):
+  # compiled from the first call, and after a few with tree walked calls mixed in
+  engines = (partial(TieredInterpreter, 0), partial(TieredInterpreter, 3))
+
+  def test_only_hot_functions_tier_up(self):
+    interpreter = TieredInterpreter(10)
+    output = run(interpreter, """
+      fun hot(n) { return n + 1; }
+      fun cold(n) { return n - 1; }
+      fun spin(n) { var i = 0; while (i < n) i = i + 1; return i; }
+      var s = 0;
+      for (var i = 0; i < 20; i = i + 1) s = hot(s);
+      print cold(s);
+      spin(100);
+      print spin(3);
+    """)
+    self.assertEqual("19.0\n3.0\n", output)
+    stats = profiles(interpreter)
+    self.assertEqual(20, stats["hot"].calls)
+    self.assertEqual(1, stats["hot"].tier_ups)
+    self.assertIsNotNone(stats["hot"].code)
+    self.assertIsNone(stats["cold"].code)
+    # the call and 9 iterations reach the threshold, the rest of the loop and
+    # the second call run compiled and are not counted
+    self.assertEqual(9, stats["spin"].back_edges)
+    self.assertEqual(1, stats["spin"].tier_ups)
+    self.assertIn("hot", interpreter.stats())
+
+  def test_tier_up_in_a_loop(self):
+    interpreter = TieredInterpreter(1000)
+    output = run(interpreter, """
+      fun loop(n) {
+        var sum = 0;
+        for (var i = 0; i < n; i = i + 1) {
+          var j = i;
+          if (j == 4000) return sum;
+          sum = sum + j;
+        }
+        return -1;
+      }
+      class A { init(n) { this.n = 0; while (this.n < n) this.n = this.n + 1; } }
+      print loop(5000);
+      print A(2000).n;
+    """)
+    self.assertEqual("7998000.0\n2000.0\n", output)
+    stats = profiles(interpreter)
+    self.assertEqual(1, stats["loop"].calls)
+    self.assertEqual(1, stats["loop"].tier_ups)
+    self.assertEqual(999, stats["loop"].back_edges)
+    self.assertEqual(1, stats["init"].tier_ups)
+
+  def test_deoptimize_on_reassigned_global(self):
+    interpreter = TieredInterpreter(5)
+    output = run(interpreter, """
+      fun one() { return 1; }
+      fun two() { return 2; }
+      fun f() { return one(); }
+      for (var i = 0; i < 10; i = i + 1) f();
+      one = two;
+      print f();
+      for (var i = 0; i < 10; i = i + 1) f();
+      print f();
+    """)
+    self.assertEqual("2.0\n2.0\n", output)
+    f = profiles(interpreter)["f"]
+    self.assertEqual(1, f.deopts)
+    self.assertEqual(["one reassigned"], f.reasons)
+    # compiled again, without speculating on one
+    self.assertEqual(2, f.tier_ups)
+    self.assertIsNotNone(f.code)
+
+  def test_nested_functions_tier_on_their_own(self):
+    interpreter = TieredInterpreter(5)
+    output = run(interpreter, """
+      fun one() { return 1; }
+      fun two() { return 2; }
+      fun outer() {
+        fun inner() { return one(); }
+        class A { m() { return 3; } }
+        return inner() + A().m();
+      }
+      for (var i = 0; i < 10; i = i + 1) outer();
+      one = two;
+      print outer();
+    """)
+    self.assertEqual("5.0\n", output)
+    stats = profiles(interpreter)
+    # counted when called from the compiled outer too
+    self.assertEqual(11, stats["inner"].calls)
+    self.assertEqual(11, stats["m"].calls)
+    self.assertEqual(["one reassigned"], stats["inner"].reasons)
+    self.assertEqual(0, stats["outer"].deopts)
+    self.assertIsNotNone(stats["outer"].code)
@@ -0,0 +1,59 @@
+import io
+import contextlib
+from tests.test_base import LoxTestBase, EngineParity, run
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.interpreter import Interpreter
+from pylox.transpiler import PyInterpreter, Transpiler
+
+class TestTranspiler(EngineParity, LoxTestBase):
+  engines = (PyInterpreter,)
+  lazy = (False,)
+  # python builtins are not lox globals
+  runtime_errors = EngineParity.runtime_errors + ["print len;", "print str;"]
+
+  def test_lox_semantics(self):
+    source = """
+    var in = 1; var _x = 2; var None = 3;
+    print in + _x + None;
+    var a = 1;
+    print a + (a = 5);
+    var b; var c;
+    b = c = 3;
+    print b + c;
+    print nil or "x"; print 0 and "y"; print "" or 1; print !0;
+    fun shadow() {
+      var a = 10;
+      { var a = 20; print a; }
+      print a;
+      var x = 1;
+      print (x = x + 1) * (x = x + 1);
+    }
+    shadow();
+    var f; var g;
+    for (var i = 0; i < 3; i = i + 1) {
+      var j = i;
+      fun get() { return j; }
+      fun add() { j = j + 10; return j; }
+      if (i == 1) { f = get; g = add; }
+    }
+    print f(); print g(); print f();
+    var w = 0;
+    while ((w = w + 1) < 3) print w;
+    print "a" + 1; print 1 + "b"; print f;
+    class A { m() {} }
+    var i = A(); var m = i.m;
+    print i.m == i.m; print m == m; print i.m;
+    """
+    self.assertEqual(run(Interpreter(), source), run(PyInterpreter(), source))
+
+  def test_module(self):
+    stmts = Parser(Scanner("fun f(n) { return n * 2; } print f(2);").scan_tokens()).parse()
+    Resolver().resolve(stmts)
+    module = Transpiler().module(stmts)
+    self.assertIn("def f(n):\n  return _multiply(n, 2.0)\n", module)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+      exec(compile(module, "f.py", "exec"), {})
+    self.assertEqual("4.0\n", output.getvalue())
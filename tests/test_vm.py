@@ -0,0 +1,45 @@
+from tests.test_base import LoxTestBase, EngineParity, run
+from pylox.scanner import Scanner
+from pylox.parser import Parser
+from pylox.resolver import Resolver
+from pylox.vm import VM
+from pylox.bytecode import disassemble
+
+class TestVM(EngineParity, LoxTestBase):
+  engines = (VM,)
+
+  def test_deep_recursion(self):
+    # calls do not recurse in python
+    source = "fun f(n) { if (n == 0) return 0; return f(n - 1) + 1; } print f(5000);"
+    self.assertEqual("5000.0\n", run(VM(), source))
+
+  def test_stack_overflow(self):
+    source = "fun r(n) { return r(n + 1); } r(0);"
+    self.assertIn("'Stack overflow.'", run(VM(), source))
+
+  def test_disassemble(self):
+    vm = VM()
+    stmts = Parser(Scanner("fun f(a) {\n  return a and -a;\n}\nprint f(1);").scan_tokens()).parse()
+    Resolver().resolve(stmts)
+    listing = "".join(disassemble(chunk) for chunk in vm.compile(stmts))
+    self.assertEqual(
+      "== script ==\n"
+      "0000    1 FUNCTION             0 '<fn f>'\n"
+      "0002    | DEFINE_GLOBAL        1 'f'\n"
+      "0004    | NIL\n"
+      "0005    | RETURN\n"
+      "== f ==\n"
+      "0000    2 GET_LOCAL            0\n"
+      "0002    | JUMP_IF_FALSE_OR_POP 7\n"
+      "0004    | GET_LOCAL            0\n"
+      "0006    | NEGATE\n"
+      "0007    | RETURN\n"
+      "0008    | NIL\n"
+      "0009    | RETURN\n"
+      "== script ==\n"
+      "0000    4 GET_GLOBAL           0 'f'\n"
+      "0002    | CONSTANT             1 '1.0'\n"
+      "0004    | CALL                 1 2 ')'\n"
+      "0007    | PRINT\n"
+      "0008    | NIL\n"
+      "0009    | RETURN\n", listing)